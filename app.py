@@ -1,22 +1,392 @@
-from flask import Flask, render_template, request, send_file, jsonify, redirect, url_for
+from flask import Flask, render_template, request, send_file, jsonify, redirect, url_for, g, Response
 from werkzeug.utils import secure_filename
-from PIL import Image
+from PIL import Image, UnidentifiedImageError, features
 import os
+import abc
 import tempfile
 import uuid
 import shutil
 import io
+import contextlib
 import time
-from datetime import datetime, timedelta
+import bisect
+import glob
+import logging
+import math
+import multiprocessing
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: 호스트 전역 슬롯 대신 프로세스 내부 제한만 사용
+    fcntl = None
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size (압축 전 원본 고려)
+# 업로드 이미지 최대 픽셀 수 (헤더 검사 단계에서 거절 - 압축 폭탄 방지)
+app.config['MAX_IMAGE_PIXELS'] = int(os.environ.get('MAX_IMAGE_PIXELS', 90_000_000))
 app.config['UPLOAD_FOLDER'] = 'temp_uploads'
+# 업로드 원본 저장소 (내용 SHA-256 이름으로 한 번만 저장, 요청별 원본 파일은 하드 링크)
+app.config['BLOB_FOLDER'] = os.path.join(app.config['UPLOAD_FOLDER'], 'blobs')
 app.config['PROCESSED_FOLDER'] = 'temp_processed'
+app.config['OUTPUTS_FOLDER'] = 'static/outputs'
+# 파일 보관 정책 (백그라운드 정리): 최대 보관 시간, 세 폴더 합계 용량 한도 (0이면 무제한), 실행 주기
+app.config['RETENTION_MAX_AGE_HOURS'] = float(os.environ.get('RETENTION_MAX_AGE_HOURS', 24))
+app.config['RETENTION_MAX_BYTES'] = int(os.environ.get('RETENTION_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+app.config['RETENTION_INTERVAL_SECONDS'] = int(os.environ.get('RETENTION_INTERVAL_SECONDS', 300))
+# 배치/작업 레코드 저장소 (sqlite: 모든 워커가 공유, memory: 프로세스 내부 전용)
+app.config['LAYOUT_STORE'] = os.environ.get('LAYOUT_STORE', 'sqlite')
+app.config['LAYOUT_DB_PATH'] = os.environ.get('LAYOUT_DB_PATH', os.path.join('data', 'layouts.db'))
+app.config['LAYOUT_TTL_SECONDS'] = int(os.environ.get('LAYOUT_TTL_SECONDS', 24 * 60 * 60))
+# 디코딩된 타일 캐시 최대 크기 (프로세스별, 바이트)
+app.config['TILE_CACHE_MAX_BYTES'] = int(os.environ.get('TILE_CACHE_MAX_BYTES', 128 * 1024 * 1024))
+# 타일 렌더링 프로세스 풀 크기 (워커 프로세스별, 0이면 요청 스레드에서 순차 처리)
+app.config['TILE_WORKERS'] = int(os.environ.get('TILE_WORKERS', 2))
+# 호스트 전체 타일 렌더링 동시 실행 상한 (모든 gunicorn 워커가 공유)
+app.config['TILE_GLOBAL_CONCURRENCY'] = int(os.environ.get('TILE_GLOBAL_CONCURRENCY', os.cpu_count() or 1))
+app.config['TILE_SLOTS_FOLDER'] = os.environ.get(
+    'TILE_SLOTS_FOLDER', os.path.join(tempfile.gettempdir(), 'printlh_tile_slots')
+)
+# 혼합 배치 빈패킹 엔진 (maxrects: MaxRects, guillotine: 기존 BinPacker)과 MaxRects 배치 기준 (bssf, baf, bl)
+app.config['LAYOUT_PACKER'] = os.environ.get('LAYOUT_PACKER', 'maxrects')
+app.config['LAYOUT_PACKER_HEURISTIC'] = os.environ.get('LAYOUT_PACKER_HEURISTIC', 'bssf')
+# 배치 결과 메모 크기 (종류별 개수 조합 수)와 시작할 때 미리 채울지 여부
+app.config['PACKING_MEMO_MAX_ENTRIES'] = int(os.environ.get('PACKING_MEMO_MAX_ENTRIES', 1024))
+app.config['PACKING_MEMO_WARMUP'] = os.environ.get('PACKING_MEMO_WARMUP', 'true').lower() in ('1', 'true', 'yes')
+# 페이지 배치 방식 (global: 전체 사진 기준 최소 페이지 수, greedy: 기존 페이지별 순차 배치)과 최적화 시간 예산
+app.config['LAYOUT_OPTIMIZER'] = os.environ.get('LAYOUT_OPTIMIZER', 'global')
+app.config['LAYOUT_OPTIMIZER_BUDGET_MS'] = int(os.environ.get('LAYOUT_OPTIMIZER_BUDGET_MS', 200))
+# 기본(A4, 300 DPI)이 아닌 용지/DPI의 배치 템플릿 표 계산 시간 예산 - 넘으면 페이지별 순차 빈패킹으로 계획
+app.config['LAYOUT_TEMPLATE_BUDGET_MS'] = int(os.environ.get('LAYOUT_TEMPLATE_BUDGET_MS', 2000))
+# 페이지 한 장의 최대 픽셀 수 (용지 면적 × dpi², 기본값은 A3 600 DPI가 들어가는 크기 - RGB 캔버스 약 210MB)
+app.config['MAX_PAGE_PIXELS'] = int(os.environ.get('MAX_PAGE_PIXELS', 70_000_000))
+# (시공사진 수, 대문사진 수) 조합별 페이지 배치 템플릿 표 저장 경로 (없으면 시작할 때 계산해서 저장)
+app.config['LAYOUT_TEMPLATES_PATH'] = os.environ.get(
+    'LAYOUT_TEMPLATES_PATH', os.path.join('data', 'layout_templates.json')
+)
+# 미리보기(preview=true) 페이지 해상도 - 확정하면 같은 배치로 요청한 DPI 렌더링
+app.config['PREVIEW_DPI'] = int(os.environ.get('PREVIEW_DPI', 72))
+# 비동기 배치 작업을 처리하는 백그라운드 스레드 수 (워커 프로세스별)
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 1))
+# 업로드 요청 수락 제어: 호스트 전체 예상 메모리 예산(MB, 0이면 cgroup 한도의 60% 또는 2048MB),
+# 예산 초과 시 대기열 최대 길이와 최대 대기 시간(초) - 넘으면 429 + Retry-After
+app.config['ADMISSION_MEMORY_BUDGET_MB'] = int(os.environ.get('ADMISSION_MEMORY_BUDGET_MB', 0))
+app.config['ADMISSION_QUEUE_MAX'] = int(os.environ.get('ADMISSION_QUEUE_MAX', 8))
+app.config['ADMISSION_QUEUE_TIMEOUT_SECONDS'] = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT_SECONDS', 15))
+app.config['ADMISSION_STATE_PATH'] = os.environ.get(
+    'ADMISSION_STATE_PATH', os.path.join('data', 'admission.json')
+)
+# 로그 수준 (사진/타일/페이지별 배치 로그는 DEBUG)
+app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# 워커 프로세스별 계측 스냅샷 폴더 (/metrics가 합산)와 스냅샷 기록 주기
+app.config['METRICS_FOLDER'] = os.environ.get('METRICS_FOLDER', os.path.join('data', 'metrics'))
+app.config['METRICS_FLUSH_SECONDS'] = float(os.environ.get('METRICS_FLUSH_SECONDS', 2))
+# 이 시간 동안 갱신되지 않은 스냅샷은 종료된 워커로 보고 누적 파일(retired.json)에 합친 뒤 삭제
+app.config['METRICS_STALE_SECONDS'] = float(os.environ.get('METRICS_STALE_SECONDS', 120))
+
+# 타일 프로세스 풀의 자식 프로세스인지 - 이 모듈을 새로 import하지만 타일만 렌더링하므로
+# 폴더 생성, 배치 저장소(SQLite), 요청 수락 장부, 템플릿 표 같은 시작 작업은 모두 건너뜀
+TILE_POOL_CHILD = multiprocessing.parent_process() is not None
 
 # 임시 폴더 생성
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs(app.config['PROCESSED_FOLDER'], exist_ok=True)
+if not TILE_POOL_CHILD:
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['BLOB_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['PROCESSED_FOLDER'], exist_ok=True)
+
+# 로그: LOG_LEVEL보다 낮은 수준의 로그는 메시지를 만들지도 않음 (% 인자는 기록할 때만 포맷팅)
+logger = logging.getLogger('printlh')
+if not logger.handlers:
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(process)d] %(message)s'))
+    logger.addHandler(_log_handler)
+    logger.propagate = False
+logger.setLevel(app.config['LOG_LEVEL'])
+
+# 계측: 카운터와 히스토그램 (/metrics에서 Prometheus 텍스트 형식으로 노출)
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+BYTES_BUCKETS = (64e3, 256e3, 1e6, 4e6, 16e6, 64e6, 256e6)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+METRIC_DEFINITIONS = {
+    # 이름: (종류, 설명, 히스토그램 구간)
+    'printlh_stage_seconds': ('histogram', '배치 단계별 소요 시간 (ingest, decode, packing, tile_resize, paste, encode, write)', SECONDS_BUCKETS),
+    'printlh_jobs_total': ('counter', '완료/실패한 혼합 배치 작업 수', None),
+    'printlh_job_seconds': ('histogram', '혼합 배치 작업 전체 소요 시간', SECONDS_BUCKETS),
+    'printlh_job_pages': ('histogram', '작업별 페이지 수', COUNT_BUCKETS),
+    'printlh_pages_total': ('counter', '출력한 페이지 수', None),
+    'printlh_page_bytes': ('histogram', '페이지별 출력 크기', BYTES_BUCKETS),
+    'printlh_photos_placed_total': ('counter', '배치한 사진 수', None),
+    'printlh_uploads_total': ('counter', '받은 업로드 파일 수 (결과별)', None),
+    'printlh_ingested_bytes_total': ('counter', '디스크에 스풀한 업로드 바이트', None),
+    'printlh_blob_uploads_total': ('counter', '원본 저장소에 넣은 업로드 파일 수 (stored: 새로 기록, duplicate: 같은 내용의 blob 참조)', None),
+    'printlh_blob_bytes_total': ('counter', '원본 저장소에 넣은 업로드 바이트 (stored, duplicate)', None),
+    'printlh_tile_cache_requests_total': ('counter', '타일 캐시 조회 수 (hit, miss)', None),
+    'printlh_http_requests_total': ('counter', 'HTTP 요청 수', None),
+    'printlh_http_request_seconds': ('histogram', 'HTTP 요청 처리 시간', SECONDS_BUCKETS),
+    'printlh_admission_total': ('counter', '요청 수락 제어 결과 (admitted, queued, rejected)', None),
+    'printlh_admission_wait_seconds': ('histogram', '메모리 예산 대기 시간', SECONDS_BUCKETS),
+    'printlh_janitor_evicted_total': ('counter', '백그라운드 정리로 지운 파일 수 (age: 보관 기간 초과, quota: 용량 한도 초과)', None),
+    'printlh_janitor_bytes_reclaimed_total': ('counter', '백그라운드 정리로 확보한 바이트 (같은 blob의 하드 링크는 마지막 링크를 지울 때 한 번)', None),
+    'printlh_janitor_blobs_removed_total': ('counter', '참조가 모두 사라져서 지운 원본 저장소 blob 수', None),
+}
+
+class Metrics:
+    """카운터/히스토그램 계측 저장소 (프로세스별, 스레드 안전)
+    
+    워커 프로세스마다 주기적으로 스냅샷 파일(metrics_<pid>_<시작 시각>.json)을 남기고 /metrics에서 전부 합산.
+    스냅샷은 값이 바뀌지 않아도 기록 주기마다 갱신 시각을 남기고, stale_seconds 동안 갱신되지 않은
+    (종료된 워커의) 스냅샷은 /metrics를 처리할 때 retired.json에 합친 뒤 삭제 - 워커가 계속 교체되어도 파일 수가 늘지 않고 합계도 줄지 않음.
+    span(stage)으로 감싼 구간은 printlh_stage_seconds에 기록되고, job_timings() 안이면 작업별 합계에도 더해짐
+    """
+
+    def __init__(self, folder, flush_interval, stale_seconds=120):
+        self.folder = folder
+        self.flush_interval = flush_interval
+        self.stale_seconds = stale_seconds
+        self._pid = os.getpid()
+        self._path = self._snapshot_path()
+        self._counters = {}
+        self._histograms = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._thread = None
+
+    def _check_fork(self):
+        # fork된 프로세스(gunicorn 워커, 타일 프로세스 풀)는 부모 값을 물려받지 않고 0부터 시작
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._path = self._snapshot_path()
+            self._counters = {}
+            self._histograms = {}
+            self._thread = None
+
+    def _snapshot_path(self):
+        # 컨테이너를 다시 시작하면 PID가 재사용되므로 시작 시각도 이름에 넣어 이전 워커의 스냅샷을 덮어쓰지 않음
+        return os.path.join(self.folder, f'metrics_{self._pid}_{time.time_ns() // 1_000_000}.json')
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        """카운터 증가"""
+        key = self._key(name, labels)
+        with self._lock:
+            self._check_fork()
+            self._counters[key] = self._counters.get(key, 0) + value
+            self._dirty = True
+
+    def observe(self, name, value, **labels):
+        """히스토그램에 값 기록 (구간별 개수 + 합계)"""
+        buckets = METRIC_DEFINITIONS[name][2]
+        key = self._key(name, labels)
+        with self._lock:
+            self._check_fork()
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # 구간별 개수(마지막은 +Inf)와 합계
+                histogram = self._histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+            histogram[bisect.bisect_left(buckets, value)] += 1
+            histogram[-1] += value
+            self._dirty = True
+
+    def record_stage(self, stage, seconds):
+        """단계 소요 시간 기록 (타일 프로세스 풀처럼 다른 곳에서 잰 시간도 이걸로 기록)"""
+        self.observe('printlh_stage_seconds', seconds, stage=stage)
+        timings = getattr(self._local, 'timings', None)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def span(self, stage):
+        """구간 소요 시간을 단계 시간으로 기록"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(stage, time.perf_counter() - start)
+
+    @contextlib.contextmanager
+    def job_timings(self):
+        """이 스레드에서 기록되는 단계 시간을 작업 하나 단위로 합산한 dict"""
+        previous = getattr(self._local, 'timings', None)
+        timings = self._local.timings = {}
+        try:
+            yield timings
+        finally:
+            self._local.timings = previous
+
+    def start(self):
+        """스냅샷 기록 스레드 시작 (프로세스당 한 번)"""
+        with self._lock:
+            self._check_fork()
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name='metrics-flush', daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError as e:
+                logger.warning("계측 스냅샷 기록 실패: %s", e)
+
+    def flush(self):
+        """이 프로세스의 값을 스냅샷 파일로 기록 (바뀐 것이 없으면 갱신 시각만 남김)"""
+        with self._lock:
+            self._check_fork()
+            path = self._path
+            if not self._dirty:
+                snapshot = None
+            else:
+                self._dirty = False
+                snapshot = {
+                    'counters': [[name, labels, value] for (name, labels), value in self._counters.items()],
+                    'histograms': [[name, labels, values] for (name, labels), values in self._histograms.items()]
+                }
+        if snapshot is None:
+            # 살아 있는 워커 표시 (stale_seconds 동안 갱신이 없으면 종료된 워커로 보고 정리)
+            with contextlib.suppress(FileNotFoundError):
+                os.utime(path)
+            return
+        os.makedirs(self.folder, exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def _merge(snapshot, counters, histograms):
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                merged[i] += value
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @contextlib.contextmanager
+    def _folder_lock(self):
+        # 여러 워커가 동시에 /metrics를 처리해도 같은 스냅샷을 두 번 합치거나 합치는 도중에 읽지 않도록 잠금
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.folder, exist_ok=True)
+        lock_fd = os.open(os.path.join(self.folder, 'retired.lock'), os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+            os.close(lock_fd)
+
+    def _retire_stale(self):
+        """갱신이 끊긴(종료된 워커의) 스냅샷을 retired.json에 합치고 삭제 (_folder_lock 안에서 호출) → 정리한 파일 수"""
+        cutoff = time.time() - self.stale_seconds
+        stale = []
+        for path in glob.glob(os.path.join(self.folder, 'metrics_*.json')):
+            with contextlib.suppress(FileNotFoundError):
+                if path != self._path and os.path.getmtime(path) < cutoff:
+                    stale.append(path)
+        if not stale:
+            return 0
+        
+        retired_path = os.path.join(self.folder, 'retired.json')
+        counters, histograms = {}, {}
+        self._merge(self._read(retired_path) or {'counters': [], 'histograms': []}, counters, histograms)
+        retired = []
+        for path in stale:
+            snapshot = self._read(path)
+            if snapshot is not None:
+                self._merge(snapshot, counters, histograms)
+                retired.append(path)
+        if not retired:
+            return 0
+        with open(retired_path + '.tmp', 'w') as f:
+            json.dump({
+                'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+                'histograms': [[name, list(labels), values] for (name, labels), values in histograms.items()]
+            }, f)
+        os.replace(retired_path + '.tmp', retired_path)
+        for path in retired:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+        return len(retired)
+
+    def collect(self):
+        """모든 워커 프로세스의 스냅샷과 종료된 워커의 누적값 합산 → (카운터, 히스토그램)"""
+        self.flush()
+        counters = {}
+        histograms = {}
+        with self._folder_lock():
+            self._retire_stale()
+            paths = glob.glob(os.path.join(self.folder, 'metrics_*.json'))
+            for path in paths + [os.path.join(self.folder, 'retired.json')]:
+                snapshot = self._read(path)
+                if snapshot is not None:
+                    self._merge(snapshot, counters, histograms)
+        return counters, histograms
+
+    def render(self, gauges=()):
+        """Prometheus 텍스트 형식 (gauges: [(이름, 설명, 값), ...] - 조회 시점 값)"""
+        counters, histograms = self.collect()
+        lines = []
+        for name, (kind, help_text, buckets) in METRIC_DEFINITIONS.items():
+            series = counters if kind == 'counter' else histograms
+            keys = sorted(key for key in series if key[0] == name)
+            if not keys:
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for key in keys:
+                labels = key[1]
+                if kind == 'counter':
+                    lines.append(f'{name}{format_metric_labels(labels)} {series[key]}')
+                    continue
+                values = series[key]
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ['+Inf'], values[:-1]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{format_metric_labels(labels + (("le", str(bound)),))} {cumulative}')
+                lines.append(f'{name}_sum{format_metric_labels(labels)} {values[-1]}')
+                lines.append(f'{name}_count{format_metric_labels(labels)} {cumulative}')
+        for name, help_text, value in gauges:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+def format_metric_labels(labels):
+    """Prometheus 레이블 표기 ({key="value",...}, 없으면 빈 문자열)"""
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels:
+        value = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+metrics = Metrics(app.config['METRICS_FOLDER'], app.config['METRICS_FLUSH_SECONDS'],
+                  app.config['METRICS_STALE_SECONDS'])
 
 # A4 용지 크기 (300 DPI 기준)
 A4_WIDTH = 2480  # 픽셀
@@ -27,26 +397,456 @@ A4_LANDSCAPE_SIZE = (A4_HEIGHT, A4_WIDTH)  # 가로
 # 허용된 파일 확장자
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff'}
 
-# 업로드된 파일들을 저장할 전역 변수
-uploaded_files = {}
 UPLOAD_FOLDER = app.config['UPLOAD_FOLDER']
 
+# 배치/작업 레코드 저장소 (layout_id로 조회, TTL이 지나면 만료)
+class LayoutStore(abc.ABC):
+    """배치 레코드 저장소 인터페이스
+    
+    배치 작업 레코드는 layout_id 그대로, 결과 파일 인덱스와 내부 상태는 접두사를 붙인 키로 같은 저장소에 둠
+    (/jobs 조회에 섞이지 않고 count()에서도 제외)
+    """
+    backend = None
+    ARTIFACT_PREFIX = 'artifact:'  # 결과 파일 인덱스 (/upload, /upload_multiple)
+    INTERNAL_PREFIX = 'internal:'  # 인덱스 재구성 여부, 정리 통계 등
+    SEPARATE_PREFIXES = (ARTIFACT_PREFIX, INTERNAL_PREFIX)
+
+    @abc.abstractmethod
+    def get(self, layout_id):
+        """레코드 조회 (없거나 만료되었으면 None)"""
+
+    @abc.abstractmethod
+    def put(self, layout_id, record, ttl=None):
+        """레코드 저장 (같은 ID가 있으면 교체, TTL 갱신)"""
+
+    @abc.abstractmethod
+    def compare_and_set(self, layout_id, expected_status, updates):
+        """레코드의 status가 expected_status일 때만 updates를 반영 (원자적) → 바뀐 레코드, 아니면 None
+        
+        같은 작업을 여러 요청/워커가 동시에 확정하거나 제출하지 않도록 상태 전이에 사용
+        """
+
+    @abc.abstractmethod
+    def delete(self, layout_id):
+        """레코드 삭제"""
+
+    @abc.abstractmethod
+    def purge_expired(self):
+        """만료된 레코드 정리 후 삭제된 개수 반환"""
+
+    @abc.abstractmethod
+    def count(self):
+        """만료되지 않은 배치 작업 레코드 수 (결과 파일 인덱스와 내부 상태 제외)"""
+
+    def stats(self):
+        """저장소 통계 (헬스 체크용)"""
+        return {'backend': self.backend, 'records': self.count()}
+
+class MemoryLayoutStore(LayoutStore):
+    """프로세스 내부 dict 저장소 (단일 프로세스 실행용)"""
+    backend = 'memory'
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def get(self, layout_id):
+        with self._lock:
+            entry = self._records.get(layout_id)
+            if entry is None or entry[1] <= time.time():
+                return None
+            return json.loads(entry[0])
+
+    def put(self, layout_id, record, ttl=None):
+        expires_at = time.time() + (ttl or self.ttl)
+        with self._lock:
+            self._records[layout_id] = (json.dumps(record), expires_at)
+
+    def compare_and_set(self, layout_id, expected_status, updates):
+        with self._lock:
+            entry = self._records.get(layout_id)
+            if entry is None or entry[1] <= time.time():
+                return None
+            record = json.loads(entry[0])
+            if record.get('status') != expected_status:
+                return None
+            record.update(updates)
+            self._records[layout_id] = (json.dumps(record), entry[1])
+            return record
+
+    def delete(self, layout_id):
+        with self._lock:
+            self._records.pop(layout_id, None)
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (_, expires_at) in self._records.items() if expires_at <= now]
+            for key in expired:
+                del self._records[key]
+        return len(expired)
+
+    def count(self):
+        now = time.time()
+        with self._lock:
+            return sum(1 for key, (_, expires_at) in self._records.items()
+                       if expires_at > now and not key.startswith(self.SEPARATE_PREFIXES))
+
+class SQLiteLayoutStore(LayoutStore):
+    """SQLite(WAL) 저장소 - 같은 호스트의 모든 gunicorn 워커가 공유"""
+    backend = 'sqlite'
+    PURGE_INTERVAL = 60  # 만료 레코드 정리 주기 (초)
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._last_purge = 0
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS layouts ('
+            'layout_id TEXT PRIMARY KEY, record TEXT NOT NULL, '
+            'updated_at REAL NOT NULL, expires_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS layouts_expires_at ON layouts (expires_at)')
+
+    def _connect(self):
+        """스레드별 연결 (sqlite3 연결은 스레드 간 공유 불가)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, layout_id):
+        row = self._connect().execute(
+            'SELECT record FROM layouts WHERE layout_id = ? AND expires_at > ?',
+            (layout_id, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, layout_id, record, ttl=None):
+        now = time.time()
+        self._connect().execute(
+            'INSERT OR REPLACE INTO layouts (layout_id, record, updated_at, expires_at) VALUES (?, ?, ?, ?)',
+            (layout_id, json.dumps(record), now, now + (ttl or self.ttl))
+        )
+        if now - self._last_purge > self.PURGE_INTERVAL:
+            self.purge_expired()
+
+    def compare_and_set(self, layout_id, expected_status, updates):
+        # BEGIN IMMEDIATE로 쓰기 잠금을 먼저 잡아서 다른 워커가 읽고-비교하고-쓰는 사이에 끼어들지 못하게 함
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT record FROM layouts WHERE layout_id = ? AND expires_at > ?',
+                (layout_id, time.time())
+            ).fetchone()
+            record = json.loads(row[0]) if row else None
+            if record is None or record.get('status') != expected_status:
+                conn.execute('ROLLBACK')
+                return None
+            record.update(updates)
+            conn.execute(
+                'UPDATE layouts SET record = ?, updated_at = ? WHERE layout_id = ?',
+                (json.dumps(record), time.time(), layout_id)
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return record
+
+    def delete(self, layout_id):
+        self._connect().execute('DELETE FROM layouts WHERE layout_id = ?', (layout_id,))
+
+    def purge_expired(self):
+        self._last_purge = time.time()
+        cursor = self._connect().execute('DELETE FROM layouts WHERE expires_at <= ?', (self._last_purge,))
+        return cursor.rowcount
+
+    def count(self):
+        # 접두사에는 LIKE 와일드카드(%, _)가 없음
+        return self._connect().execute(
+            'SELECT COUNT(*) FROM layouts WHERE expires_at > ? AND layout_id NOT LIKE ? AND layout_id NOT LIKE ?',
+            (time.time(), *(prefix + '%' for prefix in self.SEPARATE_PREFIXES))
+        ).fetchone()[0]
+
+def create_layout_store():
+    """설정(LAYOUT_STORE)에 맞는 배치 레코드 저장소 생성"""
+    if app.config['LAYOUT_STORE'] == 'memory':
+        return MemoryLayoutStore(app.config['LAYOUT_TTL_SECONDS'])
+    return SQLiteLayoutStore(app.config['LAYOUT_DB_PATH'], app.config['LAYOUT_TTL_SECONDS'])
+
+layout_store = None if TILE_POOL_CHILD else create_layout_store()
+
+# 처리 결과 파일 인덱스 (file_id → 파일 경로/메타데이터, 폴더 스캔 없이 조회)
+def artifact_entry(filename, download_name=None, mimetype='image/jpeg'):
+    """처리 폴더에 저장된 결과 파일의 인덱스 항목 생성"""
+    path = os.path.join(app.config['PROCESSED_FOLDER'], filename)
+    return {
+        'filename': filename,
+        'size': os.path.getsize(path),
+        'mimetype': mimetype,
+        'download_name': download_name or filename
+    }
+
+def artifact_key(file_id):
+    """결과 파일 인덱스 레코드의 저장소 키"""
+    return LayoutStore.ARTIFACT_PREFIX + file_id
+
+def internal_key(name):
+    """내부 상태 레코드의 저장소 키"""
+    return LayoutStore.INTERNAL_PREFIX + name
+
+def register_artifacts(file_id, record, artifacts, ttl=None):
+    """결과 파일 인덱스를 배치 레코드와 함께 저장"""
+    record = dict(record, file_id=file_id, artifacts=artifacts)
+    record.setdefault('upload_time', time.time())
+    layout_store.put(artifact_key(file_id), record, ttl)
+
+def get_artifact_record(file_id):
+    """결과 파일 인덱스 레코드 (없거나 만료되었으면 None)"""
+    return layout_store.get(artifact_key(file_id))
+
+def find_artifact(file_id, name):
+    """인덱스에서 결과 파일 조회 (없거나 파일이 지워졌으면 None)"""
+    record = get_artifact_record(file_id)
+    artifact = (record or {}).get('artifacts', {}).get(name)
+    if artifact is None:
+        return None
+    # send_file은 상대 경로를 앱 루트 기준으로 해석하므로 절대 경로로 반환
+    path = os.path.abspath(os.path.join(app.config['PROCESSED_FOLDER'], artifact['filename']))
+    if not os.path.exists(path):
+        return None
+    return dict(artifact, path=path)
+
+def parse_legacy_artifact(filename):
+    """인덱스 이전에 만들어진 결과 파일명 해석 → (file_id, 항목 이름, 다운로드 파일명, 레코드 정보)"""
+    name, ext = os.path.splitext(filename)
+    if ext.lower() != '.jpg':
+        return None
+    parts = name.split('_')
+    file_id = parts[0]
+    if len(parts) == 2 and parts[1] == 'processed':
+        return file_id, 'processed', f"resized_photo_{file_id}.jpg", {'kind': 'single'}
+    if len(parts) == 2 and parts[1] == 'thumb':
+        return file_id, 'thumbnail', filename, {}
+    if len(parts) >= 4 and parts[3] == 'layout':
+        # {id}_{type}_{orientation}_layout.jpg / {id}_{type}_{orientation}_layout_{n}.jpg
+        type_name = '시공사진' if parts[1] == 'construction' else '대문사진'
+        orientation_name = '가로' if parts[2] == 'landscape' else '세로'
+        info = {'kind': 'batch', 'photo_type': parts[1], 'paper_orientation': parts[2]}
+        if len(parts) == 5 and parts[4].isdigit():
+            return (file_id, f'page_{parts[4]}',
+                    f"A4_{type_name}_{orientation_name}_{file_id}_{parts[4]}.jpg", info)
+        return file_id, 'processed', f"A4_{type_name}_{orientation_name}_{file_id}.jpg", info
+    return None
+
+def rebuild_artifact_index():
+    """인덱스 항목이 없는 이전 결과 파일을 한 번 스캔해서 인덱스에 등록"""
+    folder = app.config['PROCESSED_FOLDER']
+    if layout_store.get(internal_key('artifact_index_rebuilt')) is not None:
+        return 0
+    
+    legacy = {}
+    for filename in os.listdir(folder):
+        parsed = parse_legacy_artifact(filename)
+        if parsed is None or not os.path.isfile(os.path.join(folder, filename)):
+            continue
+        file_id, name, download_name, info = parsed
+        entry = legacy.setdefault(file_id, {'info': {}, 'artifacts': {}, 'mtime': 0})
+        entry['info'].update(info)
+        entry['artifacts'][name] = artifact_entry(filename, download_name)
+        entry['mtime'] = max(entry['mtime'], os.path.getmtime(os.path.join(folder, filename)))
+    
+    registered = 0
+    now = time.time()
+    for file_id, entry in legacy.items():
+        # 파일 생성 시각 기준으로 남은 보관 시간만큼만 등록
+        ttl = entry['mtime'] + app.config['LAYOUT_TTL_SECONDS'] - now
+        if ttl <= 0 or get_artifact_record(file_id) is not None:
+            continue
+        register_artifacts(file_id, dict(entry['info'], upload_time=entry['mtime']), entry['artifacts'], ttl)
+        registered += 1
+    
+    layout_store.put(internal_key('artifact_index_rebuilt'), {'time': now, 'registered': registered})
+    if registered:
+        logger.info("결과 파일 인덱스 재구성: 이전 파일 %d건 등록", registered)
+    return registered
+
 def allowed_file(filename):
     """허용된 파일 형식인지 확인"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def cleanup_old_files():
-    """24시간 이전 파일들 정리"""
-    cutoff_time = datetime.now() - timedelta(hours=24)
+# 임시 파일/결과 파일 보관 정책 (요청 처리와 별도로 백그라운드에서 정리)
+class ArtifactJanitor:
+    """업로드/처리/출력 폴더의 오래된 파일을 지우고 전체 용량 한도를 넘으면 오래된 파일부터 삭제
     
-    for folder in [app.config['UPLOAD_FOLDER'], app.config['PROCESSED_FOLDER']]:
-        if os.path.exists(folder):
-            for filename in os.listdir(folder):
-                file_path = os.path.join(folder, filename)
-                if os.path.isfile(file_path):
-                    file_time = datetime.fromtimestamp(os.path.getmtime(file_path))
-                    if file_time < cutoff_time:
-                        os.remove(file_path)
+    업로드 원본 파일은 원본 저장소 blob의 하드 링크이므로 용량은 blob(inode)마다 한 번만 계산하고,
+    참조가 모두 지워진 blob은 blob_store.collect()로 정리
+    """
+
+    def __init__(self, folders, max_age_seconds, max_bytes, interval, lock_path):
+        self.folders = folders
+        self.max_age_seconds = max_age_seconds
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.lock_path = lock_path
+        self._thread = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """백그라운드 정리 스레드 시작 (프로세스당 한 번)"""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='artifact-janitor', daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.exception("파일 정리 오류: %s", e)
+            self._stop.wait(self.interval)
+
+    def run_once(self):
+        """한 번 정리 실행 - 다른 워커가 정리 중이면 건너뛰고 None 반환"""
+        lock_fd = None
+        if fcntl is not None:
+            os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+            lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o666)
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(lock_fd)
+                return None
+        try:
+            return self._sweep()
+        finally:
+            if lock_fd is not None:
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+                os.close(lock_fd)
+
+    def _sweep(self):
+        started = time.time()
+        cutoff = started - self.max_age_seconds
+        files = []
+        links = {}  # inode별 이번 스캔에서 본 파일 수 (하드 링크는 같은 inode)
+        for folder in self.folders:
+            if not os.path.isdir(folder):
+                continue
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file(follow_symlinks=False):
+                            stat = entry.stat(follow_symlinks=False)
+                            inode = (stat.st_dev, stat.st_ino)
+                            files.append((stat.st_mtime, stat.st_size, entry.path, inode))
+                            links[inode] = links.get(inode, 0) + 1
+                    except OSError:
+                        continue
+
+        removed_files = 0
+        reclaimed_bytes = 0
+        total_bytes = sum({inode: size for _, size, _, inode in files}.values())
+        # 오래된 파일부터 확인: 보관 기간이 지났거나 용량 한도를 넘으면 삭제
+        for mtime, size, path, inode in sorted(files):
+            over_quota = self.max_bytes > 0 and total_bytes > self.max_bytes
+            if mtime >= cutoff and not over_quota:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            removed_files += 1
+            metrics.inc('printlh_janitor_evicted_total', reason='age' if mtime < cutoff else 'quota')
+            links[inode] -= 1
+            # 같은 blob을 참조하는 파일이 남아 있으면 아직 용량이 줄지 않음
+            if links[inode] == 0:
+                reclaimed_bytes += size
+                total_bytes -= size
+
+        blob_stats = blob_store.collect()
+        metrics.inc('printlh_janitor_bytes_reclaimed_total', reclaimed_bytes)
+        metrics.inc('printlh_janitor_blobs_removed_total', blob_stats['removed'])
+        expired_records = layout_store.purge_expired()
+
+        stats = self.stats()
+        stats.update({
+            'runs': stats['runs'] + 1,
+            'files_removed': stats['files_removed'] + removed_files,
+            'bytes_reclaimed': stats['bytes_reclaimed'] + reclaimed_bytes,
+            'records_expired': stats['records_expired'] + expired_records,
+            'blobs_removed': stats['blobs_removed'] + blob_stats['removed'],
+            'blobs': blob_stats['blobs'],
+            'blob_bytes': blob_stats['bytes'],
+            'blob_references': blob_stats['references'],
+            'bytes_in_use': total_bytes,
+            'last_run_time': started,
+            'last_run_seconds': round(time.time() - started, 3),
+            'last_run_files_removed': removed_files,
+            'last_run_bytes_reclaimed': reclaimed_bytes
+        })
+        # 어느 워커에서 조회해도 같은 값이 보이도록 공유 저장소에 기록
+        layout_store.put(internal_key('janitor_stats'), stats, ttl=365 * 24 * 60 * 60)
+        if removed_files:
+            logger.info("파일 정리: %d개 삭제, %.1fMB 확보", removed_files, reclaimed_bytes / 1024 / 1024)
+        return stats
+
+    def stats(self):
+        """누적 정리 통계"""
+        stats = {
+            'runs': 0,
+            'files_removed': 0,
+            'bytes_reclaimed': 0,
+            'records_expired': 0,
+            'blobs_removed': 0,
+            'blobs': None,
+            'blob_bytes': None,
+            'blob_references': None,
+            'bytes_in_use': None,
+            'last_run_time': None,
+            'max_age_seconds': self.max_age_seconds,
+            'max_bytes': self.max_bytes
+        }
+        stats.update(layout_store.get(internal_key('janitor_stats')) or {})
+        return stats
+
+janitor = ArtifactJanitor(
+    [app.config['UPLOAD_FOLDER'], app.config['PROCESSED_FOLDER'], app.config['OUTPUTS_FOLDER']],
+    max_age_seconds=app.config['RETENTION_MAX_AGE_HOURS'] * 60 * 60,
+    max_bytes=app.config['RETENTION_MAX_BYTES'],
+    interval=app.config['RETENTION_INTERVAL_SECONDS'],
+    lock_path=os.path.join(os.path.dirname(app.config['LAYOUT_DB_PATH']) or '.', 'janitor.lock')
+)
+
+@app.before_request
+def start_background_services():
+    """첫 요청 때 백그라운드 정리/계측 기록 스레드 시작 (워커 프로세스마다), 요청 시간 측정 시작"""
+    janitor.start()
+    metrics.start()
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """엔드포인트별 요청 수와 처리 시간 기록"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.inc('printlh_http_requests_total', method=request.method, endpoint=endpoint,
+                    status=response.status_code)
+        metrics.observe('printlh_http_request_seconds', time.perf_counter() - started, endpoint=endpoint)
+    return response
 
 def calculate_optimal_layout(photo_width, photo_height, a4_width, a4_height, margin=50):
     """최적 배치 계산 (회전 포함)"""
@@ -134,7 +934,7 @@ def resize_for_construction_photo(image):
     
     # 회전 처리
     if layout['rotated']:
-        resized_photo = resized_photo.rotate(90, expand=True)
+        resized_photo = rotate_tile(resized_photo, 90)
     
     # A4 용지에 배치
     a4_image = Image.new('RGB', (A4_WIDTH, A4_HEIGHT), 'white')
@@ -189,7 +989,7 @@ def resize_for_document_photo(image):
     
     # 회전 처리
     if layout['rotated']:
-        resized_photo = resized_photo.rotate(90, expand=True)
+        resized_photo = rotate_tile(resized_photo, 90)
     
     # A4 용지에 배치
     a4_image = Image.new('RGB', (A4_WIDTH, A4_HEIGHT), 'white')
@@ -210,7 +1010,6 @@ def resize_for_document_photo(image):
 @app.route('/')
 def index():
     """메인 페이지"""
-    cleanup_old_files()
     return render_template('index.html')
 
 @app.route('/upload', methods=['POST'])
@@ -226,37 +1025,60 @@ def upload_file():
         return jsonify({'error': '파일이 선택되지 않았습니다'}), 400
     
     if file and allowed_file(file.filename):
+        # 헤더만 읽어서 이미지인지/크기가 받을 만한지 확인하고, 예상 메모리 예산이 날 때까지 대기 (대기열이 차면 429)
+        try:
+            probe = probe_image(file)
+            admission_token = admission.acquire(estimate_single_memory(probe))
+        except ImageProbeError as e:
+            return jsonify({'error': f'{file.filename}: {e}'}), 400
+        except AdmissionRejected as e:
+            return admission_rejected_response(e)
         try:
             # 고유한 파일명 생성
             unique_id = str(uuid.uuid4())
             filename = secure_filename(file.filename)
             file_extension = filename.rsplit('.', 1)[1].lower()
             
-            # 업로드 파일 저장
+            # 업로드 파일 저장 (같은 내용의 원본이 이미 있으면 기록하지 않고 참조만 추가)
             upload_filename = f"{unique_id}_original.{file_extension}"
             upload_path = os.path.join(app.config['UPLOAD_FOLDER'], upload_filename)
-            file.save(upload_path)
-            
-            # 이미지 처리
-            image = Image.open(upload_path)
-            
-            # 사진 종류에 따른 리사이징
-            if photo_type == 'construction':
-                processed_image = resize_for_construction_photo(image)
-            else:  # document
-                processed_image = resize_for_document_photo(image)
+            upload = blob_store.put(file, upload_path, probe)
             
-            # 처리된 이미지 저장
-            processed_filename = f"{unique_id}_processed.jpg"
+            # 처리 결과는 (원본 해시, 사진 종류)별로 한 번만 만들고 같은 사진이 다시 오면 재사용
+            resize_type = 'construction' if photo_type == 'construction' else 'document'
+            processed_filename = f"{upload.sha256}_{resize_type}_processed.jpg"
             processed_path = os.path.join(app.config['PROCESSED_FOLDER'], processed_filename)
-            processed_image.save(processed_path, 'JPEG', quality=95)
-            
-            # 미리보기용 썸네일 생성
-            thumbnail = processed_image.copy()
-            thumbnail.thumbnail((400, 400), Image.Resampling.LANCZOS)
-            thumbnail_filename = f"{unique_id}_thumb.jpg"
+            thumbnail_filename = f"{upload.sha256}_{resize_type}_thumb.jpg"
             thumbnail_path = os.path.join(app.config['PROCESSED_FOLDER'], thumbnail_filename)
-            thumbnail.save(thumbnail_path, 'JPEG', quality=85)
+            
+            if not refresh_files(processed_path, thumbnail_path):
+                # 이미지 처리
+                image = Image.open(upload_path, formats=[probe.format])
+                
+                # 사진 종류에 따른 리사이징
+                if resize_type == 'construction':
+                    processed_image = resize_for_construction_photo(image)
+                else:  # document
+                    processed_image = resize_for_document_photo(image)
+                
+                # 처리된 이미지 저장
+                save_image_atomic(processed_image, processed_path, 'JPEG', quality=95)
+                
+                # 미리보기용 썸네일 생성
+                thumbnail = processed_image.copy()
+                thumbnail.thumbnail((400, 400), Image.Resampling.LANCZOS)
+                save_image_atomic(thumbnail, thumbnail_path, 'JPEG', quality=85)
+            
+            # 다운로드/썸네일 조회용 인덱스 저장
+            register_artifacts(unique_id, {
+                'kind': 'single',
+                'original_filename': filename,
+                'original_sha256': upload.sha256,
+                'photo_type': photo_type
+            }, {
+                'processed': artifact_entry(processed_filename, f"resized_photo_{unique_id}.jpg"),
+                'thumbnail': artifact_entry(thumbnail_filename)
+            })
             
             return jsonify({
                 'success': True,
@@ -268,6 +1090,8 @@ def upload_file():
             
         except Exception as e:
             return jsonify({'error': f'이미지 처리 중 오류가 발생했습니다: {str(e)}'}), 500
+        finally:
+            admission.release(admission_token)
     
     return jsonify({'error': '지원하지 않는 파일 형식입니다'}), 400
 
@@ -284,116 +1108,158 @@ def upload_multiple_files():
     if not files or len(files) == 0:
         return jsonify({'error': '파일이 선택되지 않았습니다'}), 400
     
+    # 헤더만 읽어서 받을 수 없는 파일은 제외하고(응답의 rejected_files), 예상 메모리 예산이 날 때까지 대기
+    accepted, rejected_files = probe_uploads(files)
+    if not accepted:
+        return jsonify({'error': '처리할 수 있는 이미지가 없습니다', 'rejected_files': rejected_files}), 400
+    try:
+        admission_token = admission.acquire(estimate_arrange_memory([probe for _, probe in accepted], photo_type, paper_orientation))
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
+    
     try:
         # 고유한 배치 ID 생성
         batch_id = str(uuid.uuid4())
         
         # 업로드된 파일들을 처리
         processed_images = []
-        for i, file in enumerate(files):
-            if file.filename == '':
-                continue
-                
-            if file and allowed_file(file.filename):
-                # 파일 저장
+        try:
+            for i, (file, probe) in enumerate(accepted):
+                # 파일 저장 (같은 내용의 원본이 이미 있으면 기록하지 않고 참조만 추가)
                 filename = secure_filename(file.filename)
                 file_extension = filename.rsplit('.', 1)[1].lower()
                 upload_filename = f"{batch_id}_{i}_original.{file_extension}"
                 upload_path = os.path.join(app.config['UPLOAD_FOLDER'], upload_filename)
-                file.save(upload_path)
+                upload = blob_store.put(file, upload_path, probe)
                 
-                # 이미지 열기 및 처리 준비
-                image = Image.open(upload_path)
+                # 이미지 열기 및 처리 준비 (검사한 형식의 디코더로만 엶, 헤더만 읽으므로 배치 자리마다 따로 엶)
+                # draft 디코딩한 Image는 다른 크기로 다시 쓰면 안 되므로 같은 사진이라도 Image는 공유하지 않음 -
+                # 중복 사진은 image_data(원본 해시) 기준 타일 캐시에서 한 번만 리사이징
                 processed_images.append({
-                    'image': image,
+                    'image': Image.open(upload_path, formats=[probe.format]),
+                    'image_data': upload,
                     'filename': filename
                 })
+            
+            # A4 용지에 여러 이미지 배치 (페이지 리스트)
+            if photo_type == 'construction':
+                final_pages = arrange_multiple_construction_photos(processed_images, paper_orientation)
+            else:  # document
+                final_pages = arrange_multiple_document_photos(processed_images, paper_orientation)
+        finally:
+            # 이미지 정리
+            for img_data in processed_images:
+                img_data['image'].close()
         
-        if not processed_images:
-            return jsonify({'error': '처리할 수 있는 이미지가 없습니다'}), 400
-        
-        # A4 용지에 여러 이미지 배치
-        if photo_type == 'construction':
-            final_image = arrange_multiple_construction_photos(processed_images, paper_orientation)
-        else:  # document
-            final_image = arrange_multiple_document_photos(processed_images, paper_orientation)
-        
-        # 최종 이미지 저장
+        # 최종 이미지 저장 (첫 페이지는 기존 파일명, 2페이지부터 _layout_{n}.jpg)
         orientation_suffix = 'landscape' if paper_orientation == 'landscape' else 'portrait'
         type_suffix = 'construction' if photo_type == 'construction' else 'document'
-        processed_filename = f"{batch_id}_{type_suffix}_{orientation_suffix}_layout.jpg"
-        processed_path = os.path.join(app.config['PROCESSED_FOLDER'], processed_filename)
-        final_image.save(processed_path, 'JPEG', quality=95)
+        type_name = '시공사진' if photo_type == 'construction' else '대문사진'
+        orientation_name = '가로' if paper_orientation == 'landscape' else '세로'
+        artifacts = {}
+        for page_number, page_image in enumerate(final_pages, start=1):
+            if page_number == 1:
+                processed_filename = f"{batch_id}_{type_suffix}_{orientation_suffix}_layout.jpg"
+                artifact_name = 'processed'
+                download_name = f"A4_{type_name}_{orientation_name}_{batch_id}.jpg"
+            else:
+                processed_filename = f"{batch_id}_{type_suffix}_{orientation_suffix}_layout_{page_number}.jpg"
+                artifact_name = f'page_{page_number}'
+                download_name = f"A4_{type_name}_{orientation_name}_{batch_id}_{page_number}.jpg"
+            processed_path = os.path.join(app.config['PROCESSED_FOLDER'], processed_filename)
+            page_image.save(processed_path, 'JPEG', quality=95)
+            artifacts[artifact_name] = artifact_entry(processed_filename, download_name)
         
-        # 미리보기용 썸네일 생성
-        thumbnail = final_image.copy()
+        # 미리보기용 썸네일 생성 (첫 페이지)
+        thumbnail = final_pages[0].copy()
         thumbnail.thumbnail((400, 400), Image.Resampling.LANCZOS)
         thumbnail_filename = f"{batch_id}_thumb.jpg"
         thumbnail_path = os.path.join(app.config['PROCESSED_FOLDER'], thumbnail_filename)
         thumbnail.save(thumbnail_path, 'JPEG', quality=85)
+        artifacts['thumbnail'] = artifact_entry(thumbnail_filename)
+        
+        for page_image in final_pages:
+            page_image.close()
+        
+        # 다운로드/썸네일 조회용 인덱스 저장
+        register_artifacts(batch_id, {
+            'kind': 'batch',
+            'file_count': len(processed_images),
+            'original_sha256': [entry['image_data'].sha256 for entry in processed_images],
+            'total_pages': len(final_pages),
+            'photo_type': photo_type,
+            'paper_orientation': paper_orientation
+        }, artifacts)
         
         return jsonify({
             'success': True,
             'file_id': batch_id,
             'file_count': len(processed_images),
+            'total_pages': len(final_pages),
             'photo_type': photo_type,
             'paper_orientation': paper_orientation,
-            'thumbnail_url': f'/thumbnail/{batch_id}'
+            'thumbnail_url': f'/thumbnail/{batch_id}',
+            'rejected_files': rejected_files
         })
         
     except Exception as e:
         return jsonify({'error': f'이미지 처리 중 오류가 발생했습니다: {str(e)}'}), 500
+    finally:
+        admission.release(admission_token)
 
 @app.route('/thumbnail/<file_id>')
 def get_thumbnail(file_id):
     """썸네일 이미지 반환"""
-    thumbnail_path = os.path.join(app.config['PROCESSED_FOLDER'], f"{file_id}_thumb.jpg")
-    if os.path.exists(thumbnail_path):
-        return send_file(thumbnail_path, mimetype='image/jpeg')
-    return '', 404
+    artifact = find_artifact(file_id, 'thumbnail')
+    if artifact is None:
+        return '', 404
+    return send_file(artifact['path'], mimetype=artifact['mimetype'])
 
 @app.route('/download/<file_id>')
 def download_file(file_id):
-    """처리된 이미지 다운로드"""
-    # 새로운 형식의 파일명을 먼저 찾아보기
-    processed_folder = app.config['PROCESSED_FOLDER']
-    
-    # 새로운 형식: {id}_{type}_{orientation}_layout.jpg
-    for filename in os.listdir(processed_folder):
-        if filename.startswith(file_id) and filename.endswith('_layout.jpg'):
-            processed_path = os.path.join(processed_folder, filename)
-            # 파일명에서 정보 추출하여 다운로드명 생성
-            parts = filename.replace('.jpg', '').split('_')
-            if len(parts) >= 3:
-                type_name = '시공사진' if parts[1] == 'construction' else '대문사진'
-                orientation_name = '가로' if parts[2] == 'landscape' else '세로'
-                download_name = f"A4_{type_name}_{orientation_name}_{file_id}.jpg"
-            else:
-                download_name = f"resized_photo_{file_id}.jpg"
-            
-            return send_file(
-                processed_path,
-                as_attachment=True,
-                download_name=download_name,
-                mimetype='image/jpeg'
-            )
-    
-    # 기존 형식 fallback
-    processed_path = os.path.join(processed_folder, f"{file_id}_processed.jpg")
-    if os.path.exists(processed_path):
-        return send_file(
-            processed_path,
-            as_attachment=True,
-            download_name=f"resized_photo_{file_id}.jpg",
-            mimetype='image/jpeg'
-        )
+    """처리된 이미지 다운로드 (page=N 으로 여러 페이지 중 선택)"""
+    page = request.args.get('page', 1, type=int)
+    artifact = find_artifact(file_id, 'processed' if page <= 1 else f'page_{page}')
+    if artifact is None:
+        return '', 404
     
-    return '', 404
+    return send_file(
+        artifact['path'],
+        as_attachment=True,
+        download_name=artifact['download_name'],
+        mimetype=artifact['mimetype']
+    )
 
 @app.route('/health')
 def health_check():
     """헬스 체크"""
-    return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
+    return jsonify({
+        'status': 'healthy',
+        'timestamp': datetime.now().isoformat(),
+        'tile_cache': tile_cache.stats(),
+        'packing_memo': packing_memo.stats(),
+        'layout_template_cache': layout_template_cache.stats(),
+        'layout_store': layout_store.stats(),
+        'janitor': janitor.stats(),
+        'admission': admission.stats()
+    })
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus 형식 계측 값 (모든 워커 프로세스 합산 + 공유 저장소 기준 현재 값)"""
+    janitor_stats = janitor.stats()
+    admission_stats = admission.stats()
+    gauges = [
+        ('printlh_layout_records', '저장소의 만료되지 않은 배치/작업 레코드 수', layout_store.count()),
+        ('printlh_artifact_bytes', '업로드/처리/출력 폴더 사용량 (마지막 정리 기준)', janitor_stats['bytes_in_use'] or 0),
+        ('printlh_blob_bytes', '업로드 원본 저장소 크기 (마지막 정리 기준)', janitor_stats['blob_bytes'] or 0),
+        ('printlh_blob_references', '원본 저장소 blob을 참조하는 업로드 파일 수 (마지막 정리 기준)', janitor_stats['blob_references'] or 0),
+        ('printlh_admission_queue_depth', '메모리 예산을 기다리는 요청/작업 수', admission_stats['queue_depth']),
+        ('printlh_admission_running', '메모리 예산을 예약하고 실행 중인 요청/작업 수', admission_stats['running']),
+        ('printlh_admission_reserved_bytes', '실행 중인 요청/작업의 예상 메모리 합계', admission_stats['reserved_bytes']),
+        ('printlh_admission_budget_bytes', '요청 수락 제어 메모리 예산', admission_stats['budget_bytes']),
+    ]
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
 
 def resize_maintain_aspect_ratio(image, max_width, max_height):
     """비율을 유지하면서 최대 크기에 맞게 리사이징"""
@@ -415,125 +1281,995 @@ def resize_maintain_aspect_ratio(image, max_width, max_height):
 MARGIN_PX = 20  # 여백 (픽셀)
 CONSTRUCTION_CM = (9.0, 11.0)  # 시공사진 크기 (cm)
 DOCUMENT_CM = (11.4, 15.2)     # 대문사진 크기 (cm)
+# /upload_multiple 페이지당 사진 수 (사진 종류, 용지 방향) - 배치 함수와 메모리 예측이 같이 사용
+ARRANGE_PHOTOS_PER_PAGE = {
+    ('construction', 'landscape'): 5,  # 정방향 3장 + 회전 2장
+    ('construction', 'portrait'): 4,   # 2x2
+    ('document', 'landscape'): 2,
+    ('document', 'portrait'): 2,       # 큰 사진이므로 세로에서도 2장
+}
 
 def cm_to_px(cm, dpi=300):
-    """센티미터를 픽셀로 변환 (300 DPI 기준)"""
+    """센티미터를 픽셀로 변환 (기본 300 DPI)"""
     return int(cm * dpi / 2.54)
 
-def calculate_max_photos_single_type(photo_width_px, photo_height_px, a4_width_px, a4_height_px):
-    """단일 종류 사진의 최대 배치 개수 계산 (회전 고려)"""
-    # 정방향 배치
-    cols_normal = (a4_width_px - MARGIN_PX) // (photo_width_px + MARGIN_PX)
-    rows_normal = (a4_height_px - MARGIN_PX) // (photo_height_px + MARGIN_PX)
-    total_normal = cols_normal * rows_normal
-    
-    # 90도 회전 배치
-    cols_rotated = (a4_width_px - MARGIN_PX) // (photo_height_px + MARGIN_PX)
-    rows_rotated = (a4_height_px - MARGIN_PX) // (photo_width_px + MARGIN_PX)
-    total_rotated = cols_rotated * rows_rotated
-    
-    if total_rotated > total_normal:
-        return total_rotated, True, (cols_rotated, rows_rotated), (photo_height_px, photo_width_px)
-    else:
-        return total_normal, False, (cols_normal, rows_normal), (photo_width_px, photo_height_px)
+def scale_px(px, dpi):
+    """300 DPI 기준으로 정한 픽셀 값(여백, 간격 등)을 다른 DPI로 환산"""
+    return px if dpi == 300 else round(px * dpi / 300)
 
-# 복잡한 최적화 함수들은 메모리 절약을 위해 모두 제거
-# 메모리 효율적인 간단한 혼합 배치만 사용
+# 용지 크기와 출력 해상도
+DEFAULT_DPI = 300
+MIN_DPI = 72
+MAX_DPI = 600
 
-def arrange_construction_photos_landscape(image_data_list, a4_width, a4_height):
-    """가로 A4에서 시공사진 배치: 정방향 3장 + 회전 2장 = 총 5장 per page"""
-    # 시공사진 크기 (9cm × 11cm, 300 DPI 기준)
-    photo_w_px = int(90 * 300 / 25.4)   # 약 1063픽셀 (9cm)
-    photo_h_px = int(110 * 300 / 25.4)  # 약 1299픽셀 (11cm)
+class PaperProfile:
+    """용지 크기 (세로 방향 기준 cm)"""
+
+    def __init__(self, name, width_cm, height_cm):
+        self.name = name
+        self.width_cm = width_cm
+        self.height_cm = height_cm
+
+    def size_px(self, orientation='portrait', dpi=DEFAULT_DPI):
+        """방향과 DPI에 맞는 픽셀 크기 (너비, 높이)"""
+        if orientation == 'landscape':
+            return cm_to_px(self.height_cm, dpi), cm_to_px(self.width_cm, dpi)
+        return cm_to_px(self.width_cm, dpi), cm_to_px(self.height_cm, dpi)
+
+    def to_dict(self):
+        return {'name': self.name, 'width_cm': self.width_cm, 'height_cm': self.height_cm}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], data['width_cm'], data['height_cm'])
+
+PAPER_PROFILES = {
+    'A4': PaperProfile('A4', 21.0, 29.7),
+    'A3': PaperProfile('A3', 29.7, 42.0),
+    'Letter': PaperProfile('Letter', 21.59, 27.94),
+}
+
+def resolve_paper_profile(name='A4', width_cm=None, height_cm=None):
+    """용지 이름(A4, A3, Letter) 또는 custom + 크기(cm)로 PaperProfile 반환 (잘못된 값이면 ValueError)"""
+    for profile_name, profile in PAPER_PROFILES.items():
+        if profile_name.lower() == (name or 'A4').lower():
+            return profile
+    if (name or '').lower() != 'custom':
+        raise ValueError(f"지원하지 않는 용지입니다: {name} (A4, A3, Letter, custom)")
     
-    # 마진과 갭 최소화
-    margin = 30  # 줄임
-    gap = 15     # 줄임
+    try:
+        # 0.1cm 단위로 맞춤 - 배치 메모/템플릿 표 키가 되므로 미세하게 다른 값마다 다시 계산하지 않도록
+        width_cm, height_cm = round(float(width_cm), 1), round(float(height_cm), 1)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("사용자 지정 용지는 paper_width_cm, paper_height_cm 값이 필요합니다.")
+    if not (math.isfinite(width_cm) and math.isfinite(height_cm)):
+        raise ValueError("사용자 지정 용지는 paper_width_cm, paper_height_cm 값이 필요합니다.")
+    short_side, long_side = sorted((width_cm, height_cm))
+    # 가장 큰 사진(대문사진)이 한 장은 들어가야 하고, 너무 크면 페이지 메모리가 과도해짐
+    if short_side < DOCUMENT_CM[0] + 0.4 or long_side < DOCUMENT_CM[1] + 0.4 or long_side > 120:
+        raise ValueError("사용자 지정 용지는 대문사진이 들어가는 크기(11.8×15.6cm 이상, 120cm 이하)여야 합니다.")
+    return PaperProfile('custom', short_side, long_side)
+
+# 업로드 스풀: 원본 바이트를 메모리에 들고 있지 않도록 디스크에 기록하고 참조만 전달
+UPLOAD_MAX_FILE_BYTES = 20 * 1024 * 1024  # 파일당 20MB 제한 (압축된 파일 기준)
+SPOOL_CHUNK_BYTES = 1024 * 1024
+
+class UploadRef:
+    """스풀된 업로드 파일 참조 (경로, SHA-256, 크기) - 배치 엔진은 타일을 만들 때 파일을 엶"""
+
+    def __init__(self, path, sha256, size, filename=None, probe=None):
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+        self.filename = filename
+        self.probe = probe  # 스풀한 뒤 읽은 헤더 정보 (ImageProbe)
+
+    def to_dict(self):
+        """작업 레코드에 저장할 값 (미리보기 후 확정할 때 다시 UploadRef로 복원)"""
+        return {
+            'path': self.path, 'sha256': self.sha256, 'size': self.size, 'filename': self.filename,
+            'probe': self.probe.to_dict() if self.probe is not None else None
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        probe = ImageProbe.from_dict(data['probe']) if data.get('probe') else None
+        return cls(data['path'], data['sha256'], data['size'], data.get('filename'), probe)
+
+    def discard(self):
+        """스풀 파일 삭제 (이미 지워졌으면 무시)"""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+def spool_upload(file, max_bytes=UPLOAD_MAX_FILE_BYTES):
+    """업로드 파일을 청크 단위로 업로드 폴더에 기록하면서 SHA-256 계산 (크기 초과 시 None)"""
+    ext = file.filename.rsplit('.', 1)[1].lower()
+    path = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4()}_spool.{ext}")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, 'wb') as out:
+            while True:
+                chunk = file.stream.read(SPOOL_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+    except Exception:
+        UploadRef(path, None, size).discard()
+        raise
     
-    # 페이지당 5장씩 처리
-    photos_per_page = 5
-    pages = []
+    if size > max_bytes:
+        os.remove(path)
+        return None
+    return UploadRef(path, digest.hexdigest(), size, file.filename)
+
+def discard_uploads(*upload_lists):
+    """배치가 끝난 스풀 파일 정리 (바이트 원본은 무시)"""
+    for uploads in upload_lists:
+        for upload in uploads:
+            if isinstance(upload, UploadRef):
+                upload.discard()
+
+# 업로드 원본 저장소: /upload, /upload_multiple 원본을 내용(SHA-256)별로 한 번만 디스크에 기록
+BLOB_ORPHAN_GRACE_SECONDS = 10 * 60  # 참조가 없는 blob을 지우기 전 유예 시간 (막 기록해서 아직 링크하지 않은 blob 보호)
+
+class BlobStore:
+    """SHA-256 이름으로 원본을 보관하는 저장소 - 참조 수는 하드 링크 수(st_nlink - 1)
     
-    for page_start in range(0, len(image_data_list), photos_per_page):
-        page_images = image_data_list[page_start:page_start + photos_per_page]
-        
-        # A4 용지 생성
-        a4_image = Image.new('RGB', (a4_width, a4_height), 'white')
-        
-        # 배치 영역 계산
-        available_width = a4_width - 2 * margin   # 약 3448px (29.1cm)
-        available_height = a4_height - 2 * margin # 약 2420px (20.4cm)
-        
-        # 실제 배치 계산:
-        # 위쪽 정방향 3장: 3 × 9cm + 2 × 0.4cm = 27.8cm (가능)
-        # 아래쪽 회전 2장: 2 × 11cm + 1 × 0.4cm = 22.4cm (가능)
-        # 전체 높이: 11cm + 9cm + 0.4cm = 20.4cm (가능)
+    요청별 원본 파일({id}_original.{확장자})은 blob의 하드 링크라서 같은 사진을 다시 올리면 기록 없이 링크만 추가.
+    참조 파일은 기존처럼 ArtifactJanitor가 보관 기간/용량 기준으로 지우고, 참조가 모두 사라진 blob은 collect()가 삭제.
+    하드 링크를 만들 수 없는 파일 시스템에서는 복사로 대체 (중복 제거 없이 기존과 같게 동작)
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def blob_path(self, sha256):
+        return os.path.join(self.folder, sha256)
+
+    def put(self, file, link_path, probe=None):
+        """업로드 파일을 저장하고 link_path에 참조 생성 → link_path를 가리키는 UploadRef
         
-        photo_index = 0
+        먼저 스트림을 해시만 해서 같은 내용의 blob이 있으면 새로 기록하지 않음
+        """
+        stream = file.stream
+        position = stream.tell()
+        digest = hashlib.sha256()
+        size = 0
+        while True:
+            chunk = stream.read(SPOOL_CHUNK_BYTES)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+        sha256 = digest.hexdigest()
+        blob_path = self.blob_path(sha256)
         
-        # 1단계: 위쪽 정방향 3장 (가로 배치)
-        top_photos_width = 3 * photo_w_px + 2 * gap  # 3장 + 2개 갭
-        if top_photos_width <= available_width:
-            start_x = margin + (available_width - top_photos_width) // 2  # 가로 중앙 정렬
-            start_y = margin
-            
-            for i in range(3):
-                if photo_index < len(page_images):
-                    image_data = page_images[photo_index]
-                    image = image_data['image']
-                    
-                    # 정방향 리사이징 (9cm × 11cm)
-                    resized_image = resize_to_exact_size(image, photo_w_px, photo_h_px)
-                    
-                    # 배치 위치
-                    x = start_x + i * (photo_w_px + gap)
-                    y = start_y
-                    
-                    a4_image.paste(resized_image, (int(x), int(y)))
-                    photo_index += 1
-                    resized_image.close()
+        if self._link(blob_path, link_path):
+            result = 'duplicate'
+        else:
+            stream.seek(position)
+            self._write(stream, blob_path)
+            if not self._link(blob_path, link_path):
+                raise FileNotFoundError(blob_path)
+            result = 'stored'
+        # 하드 링크는 mtime을 공유하므로 보관 기간이 이번 업로드부터 다시 시작되도록 갱신
+        os.utime(link_path)
+        metrics.inc('printlh_blob_uploads_total', result=result)
+        metrics.inc('printlh_blob_bytes_total', size, result=result)
+        return UploadRef(link_path, sha256, size, file.filename, probe)
+
+    def _write(self, stream, blob_path):
+        """임시 파일에 쓰고 교체 (같은 사진을 동시에 올려도 완성된 blob만 보이도록)"""
+        tmp_path = f"{blob_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, 'wb') as out:
+                shutil.copyfileobj(stream, out, SPOOL_CHUNK_BYTES)
+            os.replace(tmp_path, blob_path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    @staticmethod
+    def _link(blob_path, link_path):
+        """blob 참조 생성 (blob이 없으면 False)"""
+        try:
+            os.link(blob_path, link_path)
+        except FileNotFoundError:
+            return False
+        except OSError:  # 하드 링크를 지원하지 않는 파일 시스템
+            try:
+                shutil.copyfile(blob_path, link_path)
+            except FileNotFoundError:
+                return False
+        return True
+
+    def collect(self, grace_seconds=BLOB_ORPHAN_GRACE_SECONDS):
+        """참조가 없는 blob(과 쓰다 남은 임시 파일) 삭제 → 삭제 수와 남은 blob 통계
         
-        # 2단계: 아래쪽 회전 2장 (가로 배치)
-        bottom_photos_width = 2 * photo_h_px + gap  # 회전된 2장 + 1개 갭
-        if bottom_photos_width <= available_width:
-            start_x = margin + (available_width - bottom_photos_width) // 2  # 가로 중앙 정렬
-            start_y = margin + photo_h_px + gap  # 위쪽 사진 높이 + 갭
-            
-            for i in range(2):
-                if photo_index < len(page_images):
-                    image_data = page_images[photo_index]
-                    image = image_data['image']
-                    
-                    # 정방향으로 리사이징 후 90도 회전
-                    resized_image = resize_to_exact_size(image, photo_w_px, photo_h_px)
-                    rotated_image = resized_image.rotate(90, expand=True)
-                    
-                    # 배치 위치
-                    x = start_x + i * (photo_h_px + gap)  # 회전된 너비 사용
-                    y = start_y
-                    
-                    a4_image.paste(rotated_image, (int(x), int(y)))
-                    photo_index += 1
-                    resized_image.close()
-                    rotated_image.close()
+        지우는 사이 다른 요청이 링크를 만들어도 그 파일은 같은 inode를 가리키므로 안전 (다음 중복만 놓침)
+        """
+        stats = {'removed': 0, 'blobs': 0, 'bytes': 0, 'references': 0}
+        if not os.path.isdir(self.folder):
+            return stats
+        cutoff = time.time() - grace_seconds
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                    if stat.st_nlink <= 1 and stat.st_mtime < cutoff:
+                        os.remove(entry.path)
+                        stats['removed'] += 1
+                        continue
+                except OSError:
+                    continue
+                if not entry.name.endswith('.tmp'):
+                    stats['blobs'] += 1
+                    stats['bytes'] += stat.st_size
+                    stats['references'] += stat.st_nlink - 1
+        return stats
+
+blob_store = BlobStore(app.config['BLOB_FOLDER'])
+
+def refresh_files(*paths):
+    """파일이 모두 있으면 mtime을 갱신해서(보관 기간 연장) True, 하나라도 없으면 False"""
+    try:
+        for path in paths:
+            os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+def save_image_atomic(image, path, image_format, **params):
+    """임시 파일에 저장하고 교체 (같은 결과 파일을 동시에 만들거나 내려받는 중이어도 완성된 파일만 보이도록)"""
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    image.save(tmp_path, image_format, **params)
+    os.replace(tmp_path, path)
+
+# 업로드 헤더 검사: 픽셀을 디코딩하기 전에 형식/크기/모드만 읽어서 잘못된 파일과 압축 폭탄을 거름
+PROBE_FORMATS = ('JPEG', 'PNG', 'GIF', 'BMP', 'TIFF')  # ALLOWED_EXTENSIONS에 해당하는 실제 형식
+
+class ImageProbeError(Exception):
+    """업로드 파일을 이미지로 받을 수 없음 (사용자에게 보여줄 메시지 포함)"""
+
+class ImageProbe:
+    """헤더에서 읽은 이미지 정보 (형식, 저장된 픽셀 크기, 모드)"""
+
+    def __init__(self, image_format, width, height, mode):
+        self.format = image_format
+        self.width = width
+        self.height = height
+        self.mode = mode
+
+    @property
+    def pixels(self):
+        return self.width * self.height
+
+    def decoded_bytes(self, target_width=None, target_height=None):
+        """디코딩했을 때의 픽셀 메모리 (캔버스가 RGB이므로 최소 3밴드)
         
-        pages.append(a4_image)
+        타일 크기를 주면 JPEG는 draft 축소 디코딩 크기로 계산 (draft_for_size와 같은 규칙)
+        """
+        width, height = self.width, self.height
+        if self.format == 'JPEG' and target_width and target_height:
+            width, height = jpeg_draft_size(width, height, target_width, target_height)
+        try:
+            bands = Image.getmodebands(self.mode)
+        except KeyError:  # 알 수 없는 모드는 넉넉하게 4밴드로 계산
+            bands = 4
+        return width * height * max(3, bands)
+
+    def to_dict(self):
+        return {'format': self.format, 'width': self.width, 'height': self.height, 'mode': self.mode}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['format'], data['width'], data['height'], data['mode'])
+
+def _probe_file(fp):
+    try:
+        with Image.open(fp, formats=PROBE_FORMATS) as image:
+            probe = ImageProbe(image.format, image.width, image.height, image.mode)
+    except Image.DecompressionBombError:
+        raise ImageProbeError("이미지 픽셀 수가 너무 많습니다.")
+    except UnidentifiedImageError:
+        raise ImageProbeError("이미지 파일이 아니거나 지원하지 않는 형식입니다.")
+    except (OSError, SyntaxError, ValueError, EOFError):
+        raise ImageProbeError("손상된 이미지 파일입니다.")
     
-    return pages
+    if probe.width < 1 or probe.height < 1:
+        raise ImageProbeError("손상된 이미지 파일입니다.")
+    if probe.pixels > app.config['MAX_IMAGE_PIXELS']:
+        raise ImageProbeError(
+            f"이미지가 너무 큽니다 ({probe.width}×{probe.height}, "
+            f"최대 {app.config['MAX_IMAGE_PIXELS'] / 1_000_000:.0f}메가픽셀)."
+        )
+    return probe
 
-def arrange_construction_photos_portrait(image_data_list, a4_width, a4_height):
-    """세로 A4에서 시공사진 배치: 2x2 = 4장 per page"""
-    margin = 50
-    gap = 20
+def probe_image(source):
+    """헤더만 읽어서 ImageProbe 반환 (픽셀 디코딩 없음) - 받을 수 없는 파일이면 ImageProbeError
     
-    # 페이지당 4장씩 처리
-    photos_per_page = 4
-    pages = []
+    source: UploadRef, 파일 경로, 또는 업로드 파일(FileStorage - 읽은 뒤 스트림 위치를 되돌림)
+    """
+    stream = getattr(source, 'stream', None)
+    if stream is not None:
+        position = stream.tell()
+        try:
+            return _probe_file(stream)
+        finally:
+            stream.seek(position)
+    return _probe_file(source.path if isinstance(source, UploadRef) else source)
+
+def open_photo_source(img_data):
+    """타일 원본 열기 (헤더만 읽고 디코딩은 지연) - 스풀 파일은 경로로, 바이트는 메모리 버퍼로
     
-    for page_start in range(0, len(image_data_list), photos_per_page):
-        page_images = image_data_list[page_start:page_start + photos_per_page]
-        
-        # A4 용지 생성
+    헤더 검사를 거친 스풀 파일은 검사한 형식의 디코더로만 엶 (다른 형식 플러그인 시도 생략)
+    """
+    if isinstance(img_data, UploadRef):
+        formats = [img_data.probe.format] if img_data.probe is not None else None
+        return Image.open(img_data.path, formats=formats)
+    return Image.open(io.BytesIO(img_data))
+
+def photo_source_digest(img_data):
+    """타일 원본의 SHA-256 (스풀 파일은 스풀할 때 계산한 값 재사용)"""
+    if isinstance(img_data, UploadRef):
+        return img_data.sha256
+    return hashlib.sha256(img_data).hexdigest()
+
+# 디코딩된 타일 캐시 (같은 원본을 반복해서 디코딩/리사이징하지 않도록)
+class TileCache:
+    """(원본 SHA-256, 타일 크기, 회전) 키로 리사이징된 타일을 보관하는 LRU 캐시"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """캐시된 타일을 새 Image 객체로 반환 (없으면 None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        metrics.inc('printlh_tile_cache_requests_total', result='miss' if entry is None else 'hit')
+        if entry is None:
+            return None
+        mode, size, data = entry
+        return Image.frombytes(mode, size, data)
+
+    def put(self, key, image):
+        """타일의 원시 픽셀을 저장하고 예산을 넘으면 오래된 항목부터 제거"""
+        data = image.tobytes()
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old[2])
+            self._entries[key] = (image.mode, image.size, data)
+            self.current_bytes += len(data)
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted[2])
+                self.evictions += 1
+
+    def stats(self):
+        """캐시 통계 (헬스 체크용)"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+tile_cache = TileCache(app.config['TILE_CACHE_MAX_BYTES'])
+
+def tile_rotation(rotated):
+    """타일 회전 값(회전 여부 또는 각도)을 반시계 방향 각도(0, 90, 180, 270)로 통일 - True는 90도"""
+    if rotated is True:
+        return 90
+    return int(rotated or 0) % 360
+
+# 반시계 방향 회전 각도별 전치 (픽셀 재배열만 하므로 리샘플링/아핀 변환 없음)
+TILE_TRANSPOSE = {
+    90: Image.Transpose.ROTATE_90,
+    180: Image.Transpose.ROTATE_180,
+    270: Image.Transpose.ROTATE_270
+}
+
+def rotate_tile(tile, rotated):
+    """타일을 회전 각도만큼 전치한 새 이미지 반환 (회전이 없으면 그대로, 회전하면 원본은 닫음)"""
+    rotation = tile_rotation(rotated)
+    if not rotation:
+        return tile
+    rotated_tile = tile.transpose(TILE_TRANSPOSE[rotation])
+    tile.close()
+    return rotated_tile
+
+def render_photo_tile(img_data, target_width, target_height, rotated=False, timings=None):
+    """원본(바이트 또는 UploadRef)을 디코딩해서 RGB 타일 생성 (리사이징 + 필요시 회전)
+    
+    rotated: 회전 여부(True면 90도) 또는 반시계 방향 각도 - target 크기는 회전 전 정방향 크기
+    timings: dict를 주면 decode, tile_resize 단계 소요 시간(초)을 기록
+    """
+    start = time.perf_counter()
+    image = open_photo_source(img_data)
+    try:
+        # 디코딩(JPEG는 필요한 만큼만 축소 디코딩)을 먼저 끝내서 리사이징 시간과 나눠서 측정
+        draft_for_size(image, target_width, target_height)
+        image.load()
+        decoded = time.perf_counter()
+        tile = resize_to_exact_size(image, target_width, target_height)
+    finally:
+        image.close()
+
+    tile = rotate_tile(tile, rotated)
+
+    # 캔버스가 RGB이므로 타일도 RGB로 통일
+    if tile.mode != 'RGB':
+        rgb_tile = tile.convert('RGB')
+        tile.close()
+        tile = rgb_tile
+
+    if timings is not None:
+        timings['decode'] = decoded - start
+        timings['tile_resize'] = time.perf_counter() - decoded
+    logger.debug("   타일 생성: %d×%d → %s (회전 %s)", target_width, target_height, tile.size, rotated)
+    return tile
+
+def _render_tile_task(img_data, target_width, target_height, rotated):
+    """프로세스 풀 작업: 타일을 렌더링해서 원시 버퍼와 단계별 소요 시간으로 반환
+    
+    풀 프로세스의 계측 값은 집계되지 않으므로 시간은 부모 프로세스가 기록
+    """
+    timings = {}
+    tile = render_photo_tile(img_data, target_width, target_height, rotated, timings)
+    try:
+        return tile.mode, tile.size, tile.tobytes(), timings
+    finally:
+        tile.close()
+
+def record_tile_timings(timings):
+    """타일 렌더링 단계 시간을 계측에 기록"""
+    for stage, seconds in timings.items():
+        metrics.record_stage(stage, seconds)
+
+class GlobalSlots:
+    """호스트 전체(모든 gunicorn 워커) 타일 렌더링 동시 실행 수 제한
+    
+    슬롯마다 잠금 파일을 두고 flock으로 점유하므로 프로세스가 죽으면 자동으로 해제됨
+    """
+
+    def __init__(self, folder, count):
+        self.folder = folder
+        self.count = max(1, count)
+        self._local = threading.BoundedSemaphore(self.count)
+        if fcntl is not None:
+            os.makedirs(folder, exist_ok=True)
+
+    def acquire(self):
+        """빈 슬롯을 점유할 때까지 대기 후 슬롯 핸들 반환"""
+        self._local.acquire()
+        if fcntl is None:
+            return None
+        while True:
+            for i in range(self.count):
+                fd = os.open(os.path.join(self.folder, f'slot_{i}.lock'), os.O_RDWR | os.O_CREAT, 0o666)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return fd
+                except OSError:
+                    os.close(fd)
+            time.sleep(0.01)
+
+    def release(self, handle):
+        """슬롯 반환"""
+        if handle is not None:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+            os.close(handle)
+        self._local.release()
+
+tile_slots = None if TILE_POOL_CHILD else GlobalSlots(
+    app.config['TILE_SLOTS_FOLDER'], app.config['TILE_GLOBAL_CONCURRENCY']
+)
+
+# 업로드 요청 수락 제어 (예상 메모리 기준)
+ADMISSION_BASE_BYTES = 32 * 1024 * 1024  # 요청당 고정 비용 (요청 파싱, 인코더 버퍼 등)
+ADMISSION_FALLBACK_PIXELS = 4000 * 3000  # 헤더를 읽을 수 없는 파일은 12MP 사진으로 가정
+ADMISSION_POLL_SECONDS = 0.05
+
+class AdmissionRejected(Exception):
+    """메모리 예산이 부족해서 요청을 받을 수 없음 (429 응답용 재시도 시간과 대기열 길이 포함)"""
+
+    def __init__(self, retry_after, queue_depth):
+        super().__init__('서버가 처리 중인 작업이 많습니다. 잠시 후 다시 시도해주세요.')
+        self.retry_after = retry_after
+        self.queue_depth = queue_depth
+
+class AdmissionController:
+    """호스트 전체(모든 gunicorn 워커) 예상 메모리 예산 안에서만 무거운 요청을 실행
+    
+    실행 중/대기 중인 요청을 잠금 파일(flock)로 보호되는 JSON 장부에 (pid, 예상 바이트)로 기록.
+    예산을 넘으면 먼저 온 순서대로 대기하고, 대기열이 차거나 대기 시간이 지나면 AdmissionRejected.
+    예산보다 큰 요청은 실행 중인 요청이 없을 때 혼자 실행. 기록한 프로세스가 죽은 항목은 다음 접근 때 정리
+    """
+
+    def __init__(self, state_path, budget_bytes, max_queue, queue_timeout):
+        self.state_path = state_path
+        self.budget_bytes = budget_bytes
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._state = None  # fcntl이 없으면 프로세스 내부 장부만 사용
+        if fcntl is not None:
+            os.makedirs(os.path.dirname(state_path) or '.', exist_ok=True)
+
+    @contextlib.contextmanager
+    def _ledger(self):
+        """장부를 잠그고 (죽은 프로세스 항목을 정리한) 상태 dict를 넘긴 뒤 다시 기록"""
+        with self._lock:
+            if fcntl is None:
+                if self._state is None:
+                    self._state = {'running': {}, 'queue': [], 'avg_seconds': None}
+                yield self._state
+                return
+            lock_fd = os.open(self.state_path + '.lock', os.O_RDWR | os.O_CREAT, 0o666)
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX)
+                try:
+                    with open(self.state_path) as f:
+                        state = json.load(f)
+                except FileNotFoundError:
+                    state = {'running': {}, 'queue': [], 'avg_seconds': None}
+                except (OSError, ValueError) as e:
+                    logger.warning("요청 수락 장부를 읽지 못해 초기화: %s", e)
+                    state = {'running': {}, 'queue': [], 'avg_seconds': None}
+                alive = {}
+                def entry_alive(entry):
+                    key = (entry['pid'], entry.get('pid_started'))
+                    if key not in alive:
+                        alive[key] = process_alive(*key)
+                    return alive[key]
+                state['running'] = {
+                    token: entry for token, entry in state['running'].items() if entry_alive(entry)
+                }
+                state['queue'] = [entry for entry in state['queue'] if entry_alive(entry)]
+                yield state
+                with open(self.state_path + '.tmp', 'w') as f:
+                    json.dump(state, f)
+                os.replace(self.state_path + '.tmp', self.state_path)
+            finally:
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+                os.close(lock_fd)
+
+    def _fits(self, state, estimated_bytes):
+        if not state['running']:
+            return True
+        reserved = sum(entry['bytes'] for entry in state['running'].values())
+        return reserved + estimated_bytes <= self.budget_bytes
+
+    def _retry_after(self, state):
+        """대기열이 빠지는 데 걸릴 시간 추정 (초, 1~120)"""
+        avg_seconds = state['avg_seconds'] or 5.0
+        running = max(1, len(state['running']))
+        return max(1, min(120, math.ceil(avg_seconds * (len(state['queue']) + 1) / running)))
+
+    def acquire(self, estimated_bytes, background=False):
+        """예산이 날 때까지 대기 후 예약 토큰 반환
+        
+        background=True(비동기 작업)는 이미 접수된 작업이므로 대기열 길이/대기 시간 제한 없이 기다림
+        """
+        token = uuid.uuid4().hex
+        entry = {'token': token, 'pid': os.getpid(), 'pid_started': process_start_ticks(os.getpid()),
+                 'bytes': estimated_bytes, 'since': time.time()}
+        started = time.perf_counter()
+        # 장부 블록 안에서 예외를 던지면 변경 내용이 기록되지 않으므로 거절은 블록을 나온 뒤에 처리
+        rejected = None
+        with self._ledger() as state:
+            if not state['queue'] and self._fits(state, estimated_bytes):
+                state['running'][token] = entry
+                metrics.inc('printlh_admission_total', result='admitted')
+                return token
+            if not background and len(state['queue']) >= self.max_queue:
+                rejected = AdmissionRejected(self._retry_after(state), len(state['queue']))
+            else:
+                state['queue'].append(entry)
+        if rejected is None:
+            metrics.inc('printlh_admission_total', result='queued')
+            logger.info("메모리 예산 대기: 예상 %.0fMB", estimated_bytes / 1024 / 1024)
+
+        deadline = None if background else time.monotonic() + self.queue_timeout
+        while rejected is None:
+            time.sleep(ADMISSION_POLL_SECONDS)
+            with self._ledger() as state:
+                if not any(queued['token'] == token for queued in state['queue']):
+                    # 장부를 읽지 못해 초기화되었으면 처음 대기열에 들어온 시각 순서대로 다시 넣음
+                    logger.warning("요청 수락 장부에서 대기 항목이 사라짐: 다시 대기열에 추가")
+                    state['queue'].append(entry)
+                    state['queue'].sort(key=lambda queued: queued['since'])
+                if state['queue'][0]['token'] == token and self._fits(state, estimated_bytes):
+                    state['queue'].pop(0)
+                    entry['since'] = time.time()
+                    state['running'][token] = entry
+                    break
+                if deadline is not None and time.monotonic() >= deadline:
+                    state['queue'] = [queued for queued in state['queue'] if queued['token'] != token]
+                    rejected = AdmissionRejected(self._retry_after(state), len(state['queue']))
+        if rejected is not None:
+            metrics.inc('printlh_admission_total', result='rejected')
+            raise rejected
+        metrics.observe('printlh_admission_wait_seconds', time.perf_counter() - started)
+        return token
+
+    def release(self, token):
+        """예약 반환 (평균 처리 시간을 갱신해서 Retry-After 추정에 사용)"""
+        with self._ledger() as state:
+            entry = state['running'].pop(token, None)
+            if entry is not None:
+                seconds = time.time() - entry['since']
+                previous = state['avg_seconds']
+                state['avg_seconds'] = seconds if previous is None else previous * 0.8 + seconds * 0.2
+
+    @contextlib.contextmanager
+    def admit(self, estimated_bytes, background=False):
+        """예산 안에서 블록 실행 (예산이 안 나면 AdmissionRejected)"""
+        token = self.acquire(estimated_bytes, background)
+        try:
+            yield
+        finally:
+            self.release(token)
+
+    def stats(self):
+        """현재 예약/대기열 상태 (헬스 체크, /metrics용)"""
+        with self._ledger() as state:
+            return {
+                'budget_bytes': self.budget_bytes,
+                'reserved_bytes': sum(entry['bytes'] for entry in state['running'].values()),
+                'running': len(state['running']),
+                'queue_depth': len(state['queue']),
+                'max_queue': self.max_queue,
+                'queue_timeout_seconds': self.queue_timeout,
+                'avg_job_seconds': round(state['avg_seconds'], 2) if state['avg_seconds'] else None
+            }
+
+def process_start_ticks(pid):
+    """프로세스 시작 시각 (부팅 후 클럭 틱, /proc이 없으면 None) - PID 재사용 구분용"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # 두 번째 필드(실행 파일 이름)에 공백이 있을 수 있으므로 마지막 ')' 뒤부터 셈
+            return int(f.read().rpartition(')')[2].split()[19])
+    except (OSError, ValueError, IndexError):
+        return None
+
+def process_alive(pid, started=None):
+    """pid 프로세스가 살아 있는지 (권한이 없어도 존재하면 True)
+    
+    started(process_start_ticks 값)를 주면 같은 PID를 재사용한 다른 프로세스(컨테이너 재시작 등)는 죽은 것으로 봄
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return started is None or process_start_ticks(pid) in (None, started)
+
+def admission_budget_bytes():
+    """ADMISSION_MEMORY_BUDGET_MB (0이면 컨테이너 cgroup 메모리 한도의 60%, 한도가 없으면 2048MB)"""
+    if app.config['ADMISSION_MEMORY_BUDGET_MB'] > 0:
+        return app.config['ADMISSION_MEMORY_BUDGET_MB'] * 1024 * 1024
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(int(value) * 0.6)
+    return 2048 * 1024 * 1024
+
+admission = None if TILE_POOL_CHILD else AdmissionController(
+    app.config['ADMISSION_STATE_PATH'],
+    admission_budget_bytes(),
+    app.config['ADMISSION_QUEUE_MAX'],
+    app.config['ADMISSION_QUEUE_TIMEOUT_SECONDS']
+)
+
+def admission_rejected_response(error):
+    """429 응답 (Retry-After 헤더와 현재 대기열 길이)"""
+    response = jsonify({'error': str(error), 'retry_after': error.retry_after, 'queue_depth': error.queue_depth})
+    return response, 429, {'Retry-After': str(error.retry_after)}
+
+def photo_tile_size(photo_type, dpi=DEFAULT_DPI):
+    """사진 종류별 타일 크기 (픽셀, 회전 전)"""
+    width_cm, height_cm = DOCUMENT_CM if photo_type == 'document' else CONSTRUCTION_CM
+    return cm_to_px(width_cm, dpi), cm_to_px(height_cm, dpi)
+
+def source_decoded_bytes(probe, target_size=None):
+    """원본 디코딩 메모리 (헤더 정보가 없으면 12MP RGB 사진으로 가정)"""
+    if probe is None:
+        return ADMISSION_FALLBACK_PIXELS * 3
+    return probe.decoded_bytes(*(target_size or (None, None)))
+
+def estimate_layout_memory(construction_images, document_images, paper=None, dpi=DEFAULT_DPI):
+    """혼합 배치 작업 예상 메모리 (바이트)
+    
+    페이지는 한 장씩 만들므로 캔버스 + 그 페이지 타일(최대 페이지 면적) + 인코더 버퍼로 페이지 3장 분량,
+    여기에 타일 프로세스 풀에서 동시에 디코딩되는 가장 큰 원본들(JPEG는 draft 축소 크기)을 더함
+    """
+    page_width, page_height = (paper or PAPER_PROFILES['A4']).size_px('landscape', dpi)
+    decoded = [source_decoded_bytes(getattr(image, 'probe', None), photo_tile_size('construction', dpi))
+               for image in construction_images]
+    decoded += [source_decoded_bytes(getattr(image, 'probe', None), photo_tile_size('document', dpi))
+                for image in document_images]
+    decoded.sort(reverse=True)
+    concurrent_decodes = max(1, app.config['TILE_WORKERS'])
+    return ADMISSION_BASE_BYTES + 3 * page_width * page_height * 3 + sum(decoded[:concurrent_decodes])
+
+def estimate_arrange_memory(probes, photo_type, paper_orientation='portrait', dpi=DEFAULT_DPI):
+    """/upload_multiple 예상 메모리 - 모든 페이지를 메모리에 모은 뒤 저장하므로 페이지 수만큼 캔버스"""
+    kind = 'document' if photo_type == 'document' else 'construction'
+    orientation = 'landscape' if paper_orientation == 'landscape' else 'portrait'
+    photos_per_page = ARRANGE_PHOTOS_PER_PAGE[(kind, orientation)]
+    pages = max(1, math.ceil(len(probes) / photos_per_page))
+    tile_size = photo_tile_size(photo_type, dpi)
+    decoded = max((source_decoded_bytes(probe, tile_size) for probe in probes), default=0)
+    return ADMISSION_BASE_BYTES + (pages + 1) * scale_px(A4_WIDTH, dpi) * scale_px(A4_HEIGHT, dpi) * 3 + decoded
+
+def estimate_single_memory(probe):
+    """/upload 예상 메모리 - 원본 전체 디코딩 + 리사이징 결과"""
+    return ADMISSION_BASE_BYTES + 2 * source_decoded_bytes(probe)
+
+_tile_executor = None
+_tile_executor_lock = threading.Lock()
+
+def tile_process_context():
+    """타일 프로세스 풀 시작 방식 - 워커는 정리/계측/작업 스레드와 sqlite 연결을 가진 채로 돌고 있어서
+    fork하면 자식이 잠긴 락과 타일 캐시까지 물려받으므로 forkserver(없으면 spawn)로 새 프로세스에서 시작
+    """
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
+def get_tile_executor():
+    """타일 렌더링용 프로세스 풀 (워커 프로세스마다 최초 사용 시 생성, 비활성화 시 None)"""
+    global _tile_executor
+    if app.config['TILE_WORKERS'] <= 0:
+        return None
+    with _tile_executor_lock:
+        if _tile_executor is None:
+            _tile_executor = ProcessPoolExecutor(
+                max_workers=app.config['TILE_WORKERS'], mp_context=tile_process_context()
+            )
+        return _tile_executor
+
+def reset_tile_executor():
+    """프로세스 풀이 깨졌을 때(자식 프로세스 강제 종료 등) 다음 사용 시 새로 만들도록 정리"""
+    global _tile_executor
+    with _tile_executor_lock:
+        if _tile_executor is not None:
+            _tile_executor.shutdown(wait=False, cancel_futures=True)
+            _tile_executor = None
+
+def tile_cache_key(img_data, target_width, target_height, rotated):
+    """타일 캐시 키 (원본 SHA-256, 타일 크기, 회전 각도)"""
+    return (photo_source_digest(img_data), (target_width, target_height), tile_rotation(rotated))
+
+def render_tiles(tile_requests):
+    """여러 타일을 한 번에 준비 - 캐시에 없는 타일은 프로세스 풀에서 병렬 렌더링
+    
+    tile_requests: [(원본 바이트 또는 UploadRef, 너비, 높이, 회전 여부), ...]
+    UploadRef는 경로만 프로세스 풀로 넘기고 각 프로세스가 파일을 직접 읽음
+    반환: 요청 순서대로 RGB 타일 리스트
+    """
+    tiles = [None] * len(tile_requests)
+    pending = []
+    pending_index = {}  # 캐시 키 → 렌더링할 요청 위치 (같은 사진이 한 번에 여러 장 오면 한 번만 렌더링)
+    duplicates = []
+    for i, (img_data, target_width, target_height, rotated) in enumerate(tile_requests):
+        key = tile_cache_key(img_data, target_width, target_height, rotated)
+        if key in pending_index:
+            duplicates.append((i, pending_index[key]))
+            continue
+        tile = tile_cache.get(key)
+        if tile is not None:
+            tiles[i] = tile
+        else:
+            pending_index[key] = i
+            pending.append((i, key))
+
+    executor = get_tile_executor() if len(pending) > 1 else None
+    futures = []
+    if executor is not None:
+        try:
+            for i, key in pending:
+                handle = tile_slots.acquire()
+                try:
+                    future = executor.submit(_render_tile_task, *tile_requests[i])
+                except Exception:
+                    tile_slots.release(handle)
+                    raise
+                future.add_done_callback(lambda _, h=handle: tile_slots.release(h))
+                futures.append((i, key, future))
+        except BrokenProcessPool:
+            reset_tile_executor()
+
+    for i, key, future in futures:
+        try:
+            mode, size, data, timings = future.result()
+        except BrokenProcessPool:
+            reset_tile_executor()
+            continue
+        record_tile_timings(timings)
+        tile = Image.frombytes(mode, size, data)
+        tile_cache.put(key, tile)
+        tiles[i] = tile
+
+    # 풀을 쓰지 않았거나 풀 오류로 남은 타일은 현재 프로세스에서 렌더링
+    for i, key in pending:
+        if tiles[i] is None:
+            handle = tile_slots.acquire()
+            timings = {}
+            try:
+                tile = render_photo_tile(*tile_requests[i], timings=timings)
+            finally:
+                tile_slots.release(handle)
+            record_tile_timings(timings)
+            tile_cache.put(key, tile)
+            tiles[i] = tile
+
+    # 호출한 쪽이 타일을 붙인 뒤 닫으므로 중복 요청에는 복사본 전달
+    for i, source in duplicates:
+        tiles[i] = tiles[source].copy()
+    return tiles
+
+def get_photo_tile(img_data, target_width, target_height, rotated=False):
+    """업로드 원본(바이트 또는 UploadRef)으로부터 배치용 타일 생성 (캐시 적중 시 디코딩/리사이징 생략)"""
+    return render_tiles([(img_data, target_width, target_height, rotated)])[0]
+
+def load_entry_tiles(tile_requests):
+    """배치 항목(dict) 목록에서 타일 생성 - 원본('image_data': 바이트 또는 UploadRef)이 있으면 캐시/프로세스 풀 사용
+    
+    tile_requests: [(항목, 너비, 높이, 회전 여부), ...]
+    """
+    tiles = [None] * len(tile_requests)
+    byte_requests = []
+    for i, (entry, target_width, target_height, rotated) in enumerate(tile_requests):
+        if entry.get('image_data') is not None:
+            byte_requests.append((i, (entry['image_data'], target_width, target_height, rotated)))
+            continue
+
+        tile = resize_to_exact_size(entry['image'], target_width, target_height)
+        tiles[i] = rotate_tile(tile, rotated)
+
+    rendered = render_tiles([request for _, request in byte_requests])
+    for (i, _), tile in zip(byte_requests, rendered):
+        tiles[i] = tile
+    return tiles
+
+def load_entry_tile(entry, target_width, target_height, rotated=False):
+    """배치 항목(dict) 하나에서 타일 생성"""
+    return load_entry_tiles([(entry, target_width, target_height, rotated)])[0]
+
+def calculate_max_photos_single_type(photo_width_px, photo_height_px, a4_width_px, a4_height_px):
+    """단일 종류 사진의 최대 배치 개수 계산 (회전 고려)"""
+    # 정방향 배치
+    cols_normal = (a4_width_px - MARGIN_PX) // (photo_width_px + MARGIN_PX)
+    rows_normal = (a4_height_px - MARGIN_PX) // (photo_height_px + MARGIN_PX)
+    total_normal = cols_normal * rows_normal
+    
+    # 90도 회전 배치
+    cols_rotated = (a4_width_px - MARGIN_PX) // (photo_height_px + MARGIN_PX)
+    rows_rotated = (a4_height_px - MARGIN_PX) // (photo_width_px + MARGIN_PX)
+    total_rotated = cols_rotated * rows_rotated
+    
+    if total_rotated > total_normal:
+        return total_rotated, True, (cols_rotated, rows_rotated), (photo_height_px, photo_width_px)
+    else:
+        return total_normal, False, (cols_normal, rows_normal), (photo_width_px, photo_height_px)
+
+# 복잡한 최적화 함수들은 메모리 절약을 위해 모두 제거
+# 메모리 효율적인 간단한 혼합 배치만 사용
+
+def construction_landscape_slots(page_width, dpi=DEFAULT_DPI):
+    """가로 용지 시공사진 자리: 위쪽 정방향 3장 + 아래쪽 회전 2장 (줄마다 가로 중앙 정렬)
+    
+    arrange_construction_photos_landscape와 배치 템플릿(construction_template_tiles)이 같이 사용
+    반환: (타일 크기(정방향 너비, 높이), [(x, y, 회전 여부), ...]) - 용지 폭에 들어가지 않는 줄은 제외
+    """
+    # 시공사진 크기 (9cm × 11cm)
+    photo_w_px = cm_to_px(CONSTRUCTION_CM[0], dpi)   # 약 1063픽셀 (9cm, 300 DPI)
+    photo_h_px = cm_to_px(CONSTRUCTION_CM[1], dpi)  # 약 1299픽셀 (11cm, 300 DPI)
+    
+    # 마진과 갭 최소화
+    margin = scale_px(30, dpi)  # 줄임
+    gap = scale_px(15, dpi)     # 줄임
+    available_width = page_width - 2 * margin   # 약 3448px (29.1cm)
+    
+    # 실제 배치 계산:
+    # 위쪽 정방향 3장: 3 × 9cm + 2 × 0.4cm = 27.8cm (가능)
+    # 아래쪽 회전 2장: 2 × 11cm + 1 × 0.4cm = 22.4cm (가능)
+    # 전체 높이: 11cm + 9cm + 0.4cm = 20.4cm (가능)
+    slots = []
+    
+    # 1단계: 위쪽 정방향 3장 (가로 배치)
+    top_photos_width = 3 * photo_w_px + 2 * gap  # 3장 + 2개 갭
+    if top_photos_width <= available_width:
+        start_x = margin + (available_width - top_photos_width) // 2  # 가로 중앙 정렬
+        for i in range(3):
+            slots.append((start_x + i * (photo_w_px + gap), margin, False))
+    
+    # 2단계: 아래쪽 회전 2장 (가로 배치) - 정방향으로 리사이징 후 90도 회전
+    bottom_photos_width = 2 * photo_h_px + gap  # 회전된 2장 + 1개 갭
+    if bottom_photos_width <= available_width:
+        start_x = margin + (available_width - bottom_photos_width) // 2  # 가로 중앙 정렬
+        start_y = margin + photo_h_px + gap  # 위쪽 사진 높이 + 갭
+        for i in range(2):
+            slots.append((start_x + i * (photo_h_px + gap), start_y, True))  # 회전된 너비 사용
+    
+    return (photo_w_px, photo_h_px), slots
+
+def arrange_construction_photos_landscape(image_data_list, a4_width, a4_height, dpi=DEFAULT_DPI):
+    """가로 A4에서 시공사진 배치: 정방향 3장 + 회전 2장 = 총 5장 per page"""
+    (photo_w_px, photo_h_px), slots = construction_landscape_slots(a4_width, dpi)
+    
+    # 페이지당 5장씩 처리
+    photos_per_page = ARRANGE_PHOTOS_PER_PAGE[('construction', 'landscape')]
+    pages = []
+    
+    for page_start in range(0, len(image_data_list), photos_per_page):
+        page_images = image_data_list[page_start:page_start + photos_per_page]
+        
+        # A4 용지 생성
+        a4_image = Image.new('RGB', (a4_width, a4_height), 'white')
+        
+        # 자리 순서대로 배치 (항목, 너비, 높이, 회전 여부, 위치)
+        placements = [
+            (image_data, photo_w_px, photo_h_px, rotated, (int(x), int(y)))
+            for image_data, (x, y, rotated) in zip(page_images, slots)
+        ]
+        
+        # 페이지의 모든 타일을 한 번에 준비 (프로세스 풀 병렬 처리) 후 배치
+        tiles = load_entry_tiles([placement[:4] for placement in placements])
+        for placement, tile in zip(placements, tiles):
+            a4_image.paste(tile, placement[4])
+            tile.close()
+        
+        pages.append(a4_image)
+    
+    return pages
+
+def arrange_construction_photos_portrait(image_data_list, a4_width, a4_height, dpi=DEFAULT_DPI):
+    """세로 A4에서 시공사진 배치: 2x2 = 4장 per page"""
+    margin = scale_px(50, dpi)
+    gap = scale_px(20, dpi)
+    
+    # 페이지당 4장씩 처리
+    photos_per_page = ARRANGE_PHOTOS_PER_PAGE[('construction', 'portrait')]
+    pages = []
+    
+    for page_start in range(0, len(image_data_list), photos_per_page):
+        page_images = image_data_list[page_start:page_start + photos_per_page]
+        
+        # A4 용지 생성
         a4_image = Image.new('RGB', (a4_width, a4_height), 'white')
         
         # 배치 영역 계산
@@ -567,31 +2303,48 @@ def arrange_construction_photos_portrait(image_data_list, a4_width, a4_height):
     # 개별 페이지 리스트 반환 (다중 페이지 지원)
     return pages
 
-def arrange_multiple_construction_photos(image_data_list, paper_orientation='portrait'):
+def arrange_multiple_construction_photos(image_data_list, paper_orientation='portrait', dpi=DEFAULT_DPI):
     """여러 시공사진을 A4 용지에 최적 배치"""
     # 용지 방향에 따른 A4 크기 설정
     if paper_orientation == 'landscape':
-        a4_width, a4_height = A4_HEIGHT, A4_WIDTH  # 가로: 3508 x 2480
+        a4_width, a4_height = scale_px(A4_HEIGHT, dpi), scale_px(A4_WIDTH, dpi)  # 가로: 3508 x 2480
         # 가로 A4에서 시공사진 배치: 정방향 3장 + 회전 2장
-        return arrange_construction_photos_landscape(image_data_list, a4_width, a4_height)
+        return arrange_construction_photos_landscape(image_data_list, a4_width, a4_height, dpi)
     else:
-        a4_width, a4_height = A4_WIDTH, A4_HEIGHT  # 세로: 2480 x 3508
+        a4_width, a4_height = scale_px(A4_WIDTH, dpi), scale_px(A4_HEIGHT, dpi)  # 세로: 2480 x 3508
         # 세로 A4에서는 기존 로직 사용
-        return arrange_construction_photos_portrait(image_data_list, a4_width, a4_height)
+        return arrange_construction_photos_portrait(image_data_list, a4_width, a4_height, dpi)
 
 
-def arrange_multiple_document_photos(image_data_list, paper_orientation='portrait'):
+def document_landscape_slots(page_width, page_height, dpi=DEFAULT_DPI):
+    """가로 용지 대문사진 자리: 2장 나란히 (양쪽 여백과 가운데 간격을 같게, 세로 중앙 정렬)
+    
+    arrange_multiple_document_photos(가로)와 배치 템플릿(document_template_tiles)이 같이 사용
+    반환: (타일 크기(너비, 높이), [(x, y), (x, y)]) - 간격이 음수면 용지에 들어가지 않음
+    """
+    document_width_px = cm_to_px(DOCUMENT_CM[0], dpi)   # 약 1346픽셀 (11.4cm, 300 DPI)
+    document_height_px = cm_to_px(DOCUMENT_CM[1], dpi)  # 약 1795픽셀 (15.2cm, 300 DPI)
+    margin = scale_px(50, dpi)
+    available_width = page_width - 2 * margin
+    available_height = page_height - 2 * margin
+    
+    spacing = (available_width - 2 * document_width_px) // 3  # 양쪽 여백 + 가운데 간격
+    y = margin + (available_height - document_height_px) // 2  # 세로 중앙 정렬
+    slots = [(margin + spacing + i * (document_width_px + spacing), y) for i in range(2)]
+    return (document_width_px, document_height_px), slots, spacing
+
+def arrange_multiple_document_photos(image_data_list, paper_orientation='portrait', dpi=DEFAULT_DPI):
     """여러 대문사진을 A4 용지에 최적 배치"""
     # 용지 방향에 따른 A4 크기 설정
     if paper_orientation == 'landscape':
-        a4_width, a4_height = A4_HEIGHT, A4_WIDTH  # 가로: 3508 x 2480
-        photos_per_page = 2  # 가로에서는 2장
+        a4_width, a4_height = scale_px(A4_HEIGHT, dpi), scale_px(A4_WIDTH, dpi)  # 가로: 3508 x 2480
+        photos_per_page = ARRANGE_PHOTOS_PER_PAGE[('document', 'landscape')]  # 가로에서는 2장
     else:
-        a4_width, a4_height = A4_WIDTH, A4_HEIGHT  # 세로: 2480 x 3508
-        photos_per_page = 2  # 세로에서도 2장 (큰 사진이므로)
+        a4_width, a4_height = scale_px(A4_WIDTH, dpi), scale_px(A4_HEIGHT, dpi)  # 세로: 2480 x 3508
+        photos_per_page = ARRANGE_PHOTOS_PER_PAGE[('document', 'portrait')]  # 세로에서도 2장 (큰 사진이므로)
     
-    margin = 50
-    gap = 20
+    margin = scale_px(50, dpi)
+    gap = scale_px(20, dpi)
     pages = []
     
     for page_start in range(0, len(image_data_list), photos_per_page):
@@ -604,42 +2357,32 @@ def arrange_multiple_document_photos(image_data_list, paper_orientation='portrai
         available_width = a4_width - 2 * margin
         available_height = a4_height - 2 * margin
         
-        # 대문사진 정확한 크기 (11.4cm × 15.2cm, 300 DPI 기준)
-        document_width_px = int(114 * 300 / 25.4)   # 약 1346픽셀 (11.4cm)
-        document_height_px = int(152 * 300 / 25.4)  # 약 1795픽셀 (15.2cm)
+        # 대문사진 정확한 크기 (11.4cm × 15.2cm)
+        document_width_px = cm_to_px(DOCUMENT_CM[0], dpi)   # 약 1346픽셀 (11.4cm, 300 DPI)
+        document_height_px = cm_to_px(DOCUMENT_CM[1], dpi)  # 약 1795픽셀 (15.2cm, 300 DPI)
+        
+        # 정확한 대문사진 크기로 리사이징 (11.4cm × 15.2cm, 최대 2장을 한 번에 준비)
+        tiles = load_entry_tiles([
+            (image_data, document_width_px, document_height_px, False)
+            for image_data in page_images[:2]
+        ])
         
         if paper_orientation == 'landscape':
-            # 가로 모드: 나란히 배치
-            for i, image_data in enumerate(page_images):
-                if i < 2:  # 최대 2장
-                    image = image_data['image']
-                    
-                    # 정확한 대문사진 크기로 리사이징 (11.4cm × 15.2cm)
-                    resized_image = resize_to_exact_size(image, document_width_px, document_height_px)
-                    
-                    # 배치 위치 계산 (가로 2장 나란히)
-                    spacing = (available_width - 2 * document_width_px) // 3  # 양쪽 여백 + 가운데 간격
-                    x = margin + spacing + i * (document_width_px + spacing)
-                    y = margin + (available_height - document_height_px) // 2  # 세로 중앙 정렬
-                    
-                    a4_image.paste(resized_image, (int(x), int(y)))
-                    resized_image.close()
+            # 가로 모드: 나란히 배치 (가로 2장)
+            _, slots, _ = document_landscape_slots(a4_width, a4_height, dpi)
+            for resized_image, (x, y) in zip(tiles, slots):
+                a4_image.paste(resized_image, (int(x), int(y)))
+                resized_image.close()
         else:
             # 세로 모드: 위아래 배치
-            for i, image_data in enumerate(page_images):
-                if i < 2:  # 최대 2장
-                    image = image_data['image']
-                    
-                    # 정확한 대문사진 크기로 리사이징 (11.4cm × 15.2cm)
-                    resized_image = resize_to_exact_size(image, document_width_px, document_height_px)
-                    
-                    # 배치 위치 계산 (세로 2장 위아래)
-                    spacing = (available_height - 2 * document_height_px) // 3  # 위아래 여백 + 가운데 간격
-                    x = margin + (available_width - document_width_px) // 2  # 가로 중앙 정렬
-                    y = margin + spacing + i * (document_height_px + spacing)
-                    
-                    a4_image.paste(resized_image, (int(x), int(y)))
-                    resized_image.close()
+            for i, resized_image in enumerate(tiles):
+                # 배치 위치 계산 (세로 2장 위아래)
+                spacing = (available_height - 2 * document_height_px) // 3  # 위아래 여백 + 가운데 간격
+                x = margin + (available_width - document_width_px) // 2  # 가로 중앙 정렬
+                y = margin + spacing + i * (document_height_px + spacing)
+                
+                a4_image.paste(resized_image, (int(x), int(y)))
+                resized_image.close()
         
         pages.append(a4_image)
     
@@ -647,6 +2390,15 @@ def arrange_multiple_document_photos(image_data_list, paper_orientation='portrai
     return pages
 
 def calculate_grid_layout(photo_type, a4_width_cm, a4_height_cm, margin_cm=0.2):
+    """같은 타입 사진의 최적 그리드 배치 (결과는 인자로만 정해지므로 배치 메모에서 재사용)"""
+    key = ('grid', photo_type, a4_width_cm, a4_height_cm, margin_cm)
+    result = packing_memo.get(key)
+    if result is None:
+        result = compute_grid_layout(photo_type, a4_width_cm, a4_height_cm, margin_cm)
+        packing_memo.put(key, result)
+    return result
+
+def compute_grid_layout(photo_type, a4_width_cm, a4_height_cm, margin_cm=0.2):
     """같은 타입 사진의 최적 그리드 배치 계산 (혼합 배치 포함)"""
     if photo_type == 'construction':
         photo_w_cm, photo_h_cm = 9.0, 11.0
@@ -698,11 +2450,11 @@ def calculate_grid_layout(photo_type, a4_width_cm, a4_height_cm, margin_cm=0.2):
                     mixed_total = mixed_2
                     mixed_layout = ('top_rotated_bottom_normal', top_cols, bottom_cols, bottom_rows)
     
-    print(f"   {photo_type} 그리드 계산:")
-    print(f"   정방향: {cols_normal}×{rows_normal} = {total_normal}개")
-    print(f"   회전됨: {cols_rotated}×{rows_rotated} = {total_rotated}개")
+    logger.debug("   %s 그리드 계산:", photo_type)
+    logger.debug("   정방향: %d×%d = %d개", cols_normal, rows_normal, total_normal)
+    logger.debug("   회전됨: %d×%d = %d개", cols_rotated, rows_rotated, total_rotated)
     if mixed_total > 0:
-        print(f"   혼합배치: {mixed_layout[0]} = {mixed_total}개")
+        logger.debug("   혼합배치: %s = %d개", mixed_layout[0], mixed_total)
     
     # 가장 효율적인 방법 선택
     if mixed_total > max(total_normal, total_rotated):
@@ -712,15 +2464,13 @@ def calculate_grid_layout(photo_type, a4_width_cm, a4_height_cm, margin_cm=0.2):
     else:
         return 'normal', cols_normal, rows_normal, total_normal, None
 
-def create_grid_layout_page(photos, orientation, a4_width_cm, a4_height_cm, construction_images, document_images):
+def create_grid_layout_page(photos, orientation, a4_width_cm, a4_height_cm, construction_images, document_images,
+                            dpi=DEFAULT_DPI):
     """그리드 배치로 페이지 생성"""
-    if orientation == 'landscape':
-        a4_width_px, a4_height_px = cm_to_px(a4_width_cm), cm_to_px(a4_height_cm)
-    else:
-        a4_width_px, a4_height_px = cm_to_px(a4_width_cm), cm_to_px(a4_height_cm)
+    a4_width_px, a4_height_px = cm_to_px(a4_width_cm, dpi), cm_to_px(a4_height_cm, dpi)
     
     layout_image = Image.new('RGB', (a4_width_px, a4_height_px), 'white')
-    margin_px = cm_to_px(0.2)
+    margin_px = cm_to_px(0.2, dpi)
     
     # 이미지 데이터 매핑
     image_map = {}
@@ -743,9 +2493,9 @@ def create_grid_layout_page(photos, orientation, a4_width_cm, a4_height_cm, cons
         
         # 기본 크기
         if photo.photo_type == 'construction':
-            photo_w_px, photo_h_px = cm_to_px(9.0), cm_to_px(11.0)
+            photo_w_px, photo_h_px = cm_to_px(9.0, dpi), cm_to_px(11.0, dpi)
         else:
-            photo_w_px, photo_h_px = cm_to_px(11.4), cm_to_px(15.2)
+            photo_w_px, photo_h_px = cm_to_px(11.4, dpi), cm_to_px(15.2, dpi)
         
         # 회전 처리
         if grid_type == 'rotated':
@@ -762,93 +2512,148 @@ def create_grid_layout_page(photos, orientation, a4_width_cm, a4_height_cm, cons
         # 이미지 처리
         if photo.photo_id in image_map:
             img_data = image_map[photo.photo_id]
-            image = Image.open(io.BytesIO(img_data))
             
-            # 정방향으로 리사이징
-            resized_image = resize_to_exact_size(image, photo_w_px, photo_h_px)
-            
-            # 회전 처리
-            if rotated:
-                final_image = resized_image.rotate(90, expand=True)
-                resized_image.close()
-            else:
-                final_image = resized_image
+            # 정방향으로 리사이징 후 필요시 회전 (타일 캐시 사용)
+            final_image = get_photo_tile(img_data, photo_w_px, photo_h_px, rotated)
             
             # 배치
             if x + final_image.width <= a4_width_px and y + final_image.height <= a4_height_px:
                 layout_image.paste(final_image, (int(x), int(y)))
                 placed_count += 1
-                print(f"   ✅ {photo.photo_id} 그리드 배치: ({int(x)}, {int(y)}) {'회전' if rotated else '정방향'}")
+                logger.debug("   ✅ %s 그리드 배치: (%d, %d) %s", photo.photo_id, x, y, '회전' if rotated else '정방향')
             
-            image.close()
             final_image.close()
     
     return layout_image, placed_count
 
-def create_optimized_mixed_layout(construction_images, document_images, paper_orientation='portrait'):
-    """개선된 혼합 배치: 같은 타입이 많으면 그리드, 혼합이면 2D 빈패킹"""
-    print(f"개선된 배치 시작 - 시공사진: {len(construction_images)}장, 대문사진: {len(document_images)}장, 방향: {paper_orientation}")
+def orient_tile_position(x, y, width, height, rotated, bin_width, paper_orientation):
+    """가로 용지 기준 타일 자리를 출력 방향으로 변환 → (x, y, 너비, 높이, 회전 각도)
+    
+    세로는 가로 페이지 전체를 90도(반시계) 회전한 것과 같은 자리/방향이 되도록 좌표와 타일 회전만 바꿈
+    (너비, 높이는 페이지에서 차지하는 크기)
+    """
+    rotation = tile_rotation(rotated)
+    if paper_orientation != 'portrait':
+        return x, y, width, height, rotation
+    return y, bin_width - x - width, height, width, (rotation + 90) % 360
+
+def orient_layout_page(page_image, paper_orientation):
+    """가로로 만든 페이지를 세로 방향 선택시 90도 회전 (시계 반대 방향)
+    
+    고정 배치 함수(arrange_*)로 만든 페이지용 - 좌표로 배치하는 페이지는 orient_tile_position으로 바로 세로로 그림
+    """
+    if paper_orientation != 'portrait':
+        return page_image
+    logger.debug("   🔄 세로 방향 변환: 90도 회전 적용")
+    return rotate_tile(page_image, 90)  # 원본 이미지는 닫아서 메모리 해제
+
+def layout_message(total_pages, construction_placed, document_placed):
+    """배치 결과 요약 메시지"""
+    total_placed = construction_placed + document_placed
+    return f"개선된 배치 완료! 총 {total_pages}페이지에 {total_placed}장 배치 (시공사진: {construction_placed}장, 대문사진: {document_placed}장)"
+
+def create_optimized_mixed_layout(construction_images, document_images, paper_orientation='portrait',
+                                  paper=None, dpi=DEFAULT_DPI):
+    """개선된 혼합 배치 결과를 페이지 리스트로 반환 (iter_optimized_mixed_layout 래퍼)
     
+    모든 페이지를 메모리에 모으므로 페이지 수가 많으면 iter_optimized_mixed_layout을 직접 사용
+    """
+    pages = []
+    total_construction_placed = 0
+    total_document_placed = 0
     try:
-        # 방향별 A4 크기 설정
-        if paper_orientation == 'portrait':
-            a4_width_cm, a4_height_cm = 21.0, 29.7
-        else:
-            a4_width_cm, a4_height_cm = 29.7, 21.0
-        
-        print(f"A4 크기: {a4_width_cm}cm x {a4_height_cm}cm")
+        for page_image, construction_placed, document_placed in iter_optimized_mixed_layout(
+                construction_images, document_images, paper_orientation, paper, dpi):
+            pages.append(page_image)
+            total_construction_placed += construction_placed
+            total_document_placed += document_placed
+    except LayoutError as e:
+        for page_image in pages:
+            page_image.close()
+        return None, str(e), 0, 0, 0
+    
+    message = layout_message(len(pages), total_construction_placed, total_document_placed)
+    return pages, message, total_construction_placed, total_document_placed, len(pages)
+
+def iter_optimized_mixed_layout(construction_images, document_images, paper_orientation='portrait',
+                                paper=None, dpi=DEFAULT_DPI):
+    """개선된 혼합 배치: 같은 타입이 많으면 그리드, 혼합이면 2D 빈패킹
+    
+    완성된 페이지를 한 장씩 (페이지 이미지, 시공사진 수, 대문사진 수)로 yield하는 제너레이터.
+    받는 쪽에서 페이지를 저장하고 닫으면 다음 페이지를 만들므로 페이지 수와 관계없이
+    메모리에는 페이지 한 장만 남음. 실패하면 LayoutError 발생
+    """
+    paper = paper or PAPER_PROFILES['A4']
+    logger.info("개선된 배치 시작 - 시공사진: %d장, 대문사진: %d장, 방향: %s", len(construction_images), len(document_images), paper_orientation)
+    
+    try:
+        logger.debug("용지: %s %scm x %scm, %d DPI", paper.name, paper.width_cm, paper.height_cm, dpi)
+        # 페이지별 배치는 항상 가로 방향 크기로 계산 (세로 용지는 마지막에 회전)
+        a4_width, a4_height = paper.size_px('landscape', dpi)
         
         # Photo 객체들 생성
         all_photos = create_photo_objects(construction_images, document_images)
         
         if len(all_photos) == 0:
-            return None, "배치할 사진이 없습니다.", 0, 0, []
+            raise LayoutError("배치할 사진이 없습니다.")
         
-        pages = []
+        # 페이지별(greedy) 배치의 고정 배치 함수는 A4 전용이므로 다른 용지는 항상 전체 최적화로 처리
+        if app.config['LAYOUT_OPTIMIZER'] == 'global' or paper.name != 'A4':
+            yield from iter_global_layout_pages(
+                construction_images, document_images, paper_orientation, paper, dpi
+            )
+            return
+        
+        total_pages = 0
         remaining_photos = all_photos.copy()
         page_num = 1
         total_construction_placed = 0
         total_document_placed = 0
         
         while remaining_photos:
-            print(f"\n=== 페이지 {page_num} 배치 시작 - 남은 사진: {len(remaining_photos)}장 ===")
+            logger.debug("=== 페이지 %d 배치 시작 - 남은 사진: %d장 ===", page_num, len(remaining_photos))
             
             # 남은 사진 타입별 개수 확인
             construction_count = sum(1 for p in remaining_photos if p.photo_type == 'construction')
             document_count = sum(1 for p in remaining_photos if p.photo_type == 'document')
             
-            print(f"남은 사진: 시공 {construction_count}장, 대문 {document_count}장")
+            logger.debug("남은 사진: 시공 %d장, 대문 %d장", construction_count, document_count)
             
+            construction_before = total_construction_placed
+            document_before = total_document_placed
             placed_count = 0
             page_image = None
+            page_oriented = False  # 좌표 배치 페이지는 처음부터 출력 방향으로 그림
             
             # 전략 1: 시공사진이 있으면 먼저 배치하고, 남는 공간에 대문사진 추가
             if construction_count > 0:
-                print("🏗️ 시공사진 우선 배치 + 남는 공간 활용 시도")
+                logger.debug("🏗️ 시공사진 우선 배치 + 남는 공간 활용 시도")
                 
                 # 효율성을 위해 항상 가로 방향 로직 사용 (5장 배치)
                 # 세로 방향 선택시에도 가로 로직으로 배치 후 마지막에 회전
                 max_construction_per_page = 5  # 항상 5장 배치
                 
-                print(f"   📐 배치 방향: {'가로 (원본)' if paper_orientation == 'landscape' else '가로 로직 → 세로 회전'}")
+                logger.debug("   📐 배치 방향: %s", '가로 (원본)' if paper_orientation == 'landscape' else '가로 로직 → 세로 회전')
                 
                 # 이번 페이지에 배치할 시공사진 수
                 construction_to_place = min(max_construction_per_page, construction_count)
                 
                 # 남는 공간이 있고 대문사진이 있으면 혼합 배치 시도
                 if construction_to_place < max_construction_per_page and document_count > 0:
-                    print(f"   🧩 혼합 배치 시도: 시공사진 {construction_to_place}장 + 대문사진 일부")
+                    logger.debug("   🧩 혼합 배치 시도: 시공사진 %d장 + 대문사진 일부", construction_to_place)
                     # 2D 빈패킹으로 혼합 배치 (항상 가로 방향 크기 사용)
                     try:
-                        a4_width, a4_height = cm_to_px(29.7), cm_to_px(21.0)  # 항상 가로 A4 크기 사용
-                        packer = BinPacker(a4_width, a4_height, margin_cm=0.2)
-                        placed_count, placed_photos = packer.pack_photos(remaining_photos.copy())
+                        placed_count, placed_photos = pack_photos_memoized(
+                            a4_width, a4_height, remaining_photos.copy(), margin_cm=0.2, dpi=dpi
+                        )
                         
                         if placed_count > 0:
+                            # 가로 기준 배치 좌표를 출력 방향으로 변환해서 바로 그림
                             page_image = create_optimized_layout_image(
-                                all_photos, placed_photos, 'landscape',  # 항상 가로 방향으로 생성
-                                construction_images, document_images
+                                all_photos, placed_photos, paper_orientation,
+                                construction_images, document_images, dpi
                             )
+                            page_oriented = True
                             
                             # 배치 통계 업데이트
                             placed_construction = sum(1 for p in placed_photos if p.photo_type == 'construction')
@@ -857,13 +2662,13 @@ def create_optimized_mixed_layout(construction_images, document_images, paper_or
                             total_construction_placed += placed_construction
                             total_document_placed += placed_document
                             
-                            print(f"   ✅ 혼합 배치 성공: 시공사진 {placed_construction}장 + 대문사진 {placed_document}장")
+                            logger.debug("   ✅ 혼합 배치 성공: 시공사진 %d장 + 대문사진 %d장", placed_construction, placed_document)
                             
                             # 배치된 사진들 제거
                             placed_ids = {photo.photo_id for photo in placed_photos}
                             remaining_photos = [p for p in remaining_photos if p.photo_id not in placed_ids]
                     except Exception as e:
-                        print(f"   ⚠️ 혼합 배치 실패, 시공사진 단독 배치로 전환: {str(e)}")
+                        logger.warning("혼합 배치 실패, 시공사진 단독 배치로 전환: %s", e)
                         # 혼합 배치 실패시 시공사진만 배치
                         construction_image_data = []
                         construction_photos_used = 0
@@ -872,10 +2677,8 @@ def create_optimized_mixed_layout(construction_images, document_images, paper_or
                                 try:
                                     actual_index = int(photo.photo_id.split('_')[1])
                                     if actual_index < len(construction_images):
-                                        img_data = construction_images[actual_index]
-                                        image = Image.open(io.BytesIO(img_data))
                                         construction_image_data.append({
-                                            'image': image,
+                                            'image_data': construction_images[actual_index],
                                             'filename': f'construction_{actual_index}.jpg'
                                         })
                                         construction_photos_used += 1
@@ -883,8 +2686,7 @@ def create_optimized_mixed_layout(construction_images, document_images, paper_or
                                     continue
                         
                         if construction_image_data:
-                            a4_width, a4_height = cm_to_px(29.7), cm_to_px(21.0)  # 항상 가로 A4 크기 사용
-                            result_pages = arrange_construction_photos_landscape(construction_image_data, a4_width, a4_height)  # 항상 가로 로직 사용
+                            result_pages = arrange_construction_photos_landscape(construction_image_data, a4_width, a4_height, dpi)  # 항상 가로 로직 사용
                             
                             if result_pages:
                                 page_image = result_pages[0]
@@ -900,13 +2702,9 @@ def create_optimized_mixed_layout(construction_images, document_images, paper_or
                                         construction_removed += 1
                                 
                                 remaining_photos = [p for p in remaining_photos if p.photo_id not in construction_photos_to_remove]
-                            
-                            # 이미지 정리
-                            for img_data in construction_image_data:
-                                img_data['image'].close()
                 else:
                     # 시공사진만으로 페이지가 가득 찬 경우
-                    print(f"   🏗️ 시공사진 단독 배치: {construction_to_place}장")
+                    logger.debug("   🏗️ 시공사진 단독 배치: %d장", construction_to_place)
                     construction_image_data = []
                     construction_photos_used = 0
                     for photo in remaining_photos:
@@ -914,10 +2712,8 @@ def create_optimized_mixed_layout(construction_images, document_images, paper_or
                             try:
                                 actual_index = int(photo.photo_id.split('_')[1])
                                 if actual_index < len(construction_images):
-                                    img_data = construction_images[actual_index]
-                                    image = Image.open(io.BytesIO(img_data))
                                     construction_image_data.append({
-                                        'image': image,
+                                        'image_data': construction_images[actual_index],
                                         'filename': f'construction_{actual_index}.jpg'
                                     })
                                     construction_photos_used += 1
@@ -925,8 +2721,7 @@ def create_optimized_mixed_layout(construction_images, document_images, paper_or
                                 continue
                     
                     if construction_image_data:
-                        a4_width, a4_height = cm_to_px(29.7), cm_to_px(21.0)  # 항상 가로 A4 크기 사용
-                        result_pages = arrange_construction_photos_landscape(construction_image_data, a4_width, a4_height)  # 항상 가로 로직 사용
+                        result_pages = arrange_construction_photos_landscape(construction_image_data, a4_width, a4_height, dpi)  # 항상 가로 로직 사용
                         
                         if result_pages:
                             page_image = result_pages[0]
@@ -942,14 +2737,10 @@ def create_optimized_mixed_layout(construction_images, document_images, paper_or
                                     construction_removed += 1
                             
                             remaining_photos = [p for p in remaining_photos if p.photo_id not in construction_photos_to_remove]
-                        
-                        # 이미지 정리
-                        for img_data in construction_image_data:
-                            img_data['image'].close()
             
             # 전략 2: 시공사진이 없고 대문사진만 있는 경우
             elif document_count >= 1:
-                print("📄 대문사진 전용 배치 시도")
+                logger.debug("📄 대문사진 전용 배치 시도")
                 # 대문사진 데이터 준비
                 document_image_data = []
                 for photo in remaining_photos:
@@ -958,19 +2749,17 @@ def create_optimized_mixed_layout(construction_images, document_images, paper_or
                         try:
                             actual_index = int(photo.photo_id.split('_')[1])
                             if actual_index < len(document_images):
-                                img_data = document_images[actual_index]
-                                image = Image.open(io.BytesIO(img_data))
                                 document_image_data.append({
-                                    'image': image,
+                                    'image_data': document_images[actual_index],
                                     'filename': f'document_{actual_index}.jpg'
                                 })
                         except (ValueError, IndexError):
-                            print(f"Invalid photo_id format: {photo.photo_id}")
+                            logger.warning("Invalid photo_id format: %s", photo.photo_id)
                             continue
                 
                 if document_image_data:
                     # 대문사진도 항상 가로 로직으로 배치 (2장씩)
-                    result_pages = arrange_multiple_document_photos(document_image_data, 'landscape')
+                    result_pages = arrange_multiple_document_photos(document_image_data, 'landscape', dpi)
                     placed_count = min(2, len(document_image_data))  # 대문사진은 최대 2장
                     
                     if result_pages:
@@ -978,30 +2767,28 @@ def create_optimized_mixed_layout(construction_images, document_images, paper_or
                         total_document_placed += placed_count
                         # 배치된 대문사진들을 제거
                         remaining_photos = remaining_photos[placed_count:]
-                        
-                        # 이미지 정리
-                        for img_data in document_image_data:
-                            img_data['image'].close()
                 
             else:
                 # 전략 3: 혼합 배치는 2D 빈패킹 사용 (항상 가로 방향)
-                print("🧩 2D 빈패킹 혼합 배치 시도")
-                packer = BinPacker(
-                    cm_to_px(29.7),  # 항상 가로 A4 너비
-                    cm_to_px(21.0),  # 항상 가로 A4 높이
-                    margin_cm=0.2
+                logger.debug("🧩 2D 빈패킹 혼합 배치 시도")
+                placed_count, placed_photos = pack_photos_memoized(
+                    a4_width,  # 항상 가로 A4 너비
+                    a4_height,  # 항상 가로 A4 높이
+                    remaining_photos.copy(),
+                    margin_cm=0.2,
+                    dpi=dpi
                 )
                 
-                placed_count, placed_photos = packer.pack_photos(remaining_photos.copy())
-                
                 if placed_count == 0:
-                    print("더 이상 배치할 수 없습니다.")
+                    logger.debug("더 이상 배치할 수 없습니다.")
                     break
                 
+                # 가로 기준 배치 좌표를 출력 방향으로 변환해서 바로 그림
                 page_image = create_optimized_layout_image(
-                    all_photos, placed_photos, 'landscape',  # 항상 가로 방향으로 생성
-                    construction_images, document_images
+                    all_photos, placed_photos, paper_orientation,
+                    construction_images, document_images, dpi
                 )
+                page_oriented = True
                 
                 # 배치된 사진 개수 집계
                 for photo in placed_photos:
@@ -1015,178 +2802,891 @@ def create_optimized_mixed_layout(construction_images, document_images, paper_or
                 remaining_photos = [p for p in remaining_photos if p.photo_id not in placed_ids]
             
             if placed_count > 0 and page_image is not None:
-                # 세로 방향 선택시 90도 회전 (시계 반대 방향)
-                if paper_orientation == 'portrait':
-                    print(f"   🔄 세로 방향 변환: 90도 회전 적용")
-                    rotated_page = page_image.rotate(90, expand=True)
-                    page_image.close()  # 원본 이미지 메모리 해제
-                    page_image = rotated_page
-                
-                pages.append(page_image)
-                print(f"페이지 {page_num} 완성 - {placed_count}장 배치됨")
+                if not page_oriented:
+                    page_image = orient_layout_page(page_image, paper_orientation)
+                logger.debug("페이지 %d 완성 - %d장 배치됨", page_num, placed_count)
+                total_pages += 1
+                yield (page_image,
+                       total_construction_placed - construction_before,
+                       total_document_placed - document_before)
+                page_image = None  # 저장은 받는 쪽에서 끝났으므로 참조 해제
                 page_num += 1
             else:
-                print("배치 실패")
-                break
-            
-            # 무한 루프 방지
-            if page_num > 20:
-                print("최대 페이지 수 도달")
-                break
-        
-        total_placed = total_construction_placed + total_document_placed
-        total_pages = len(pages)
+                # 남은 사진을 버리지 않고 실패로 처리 (매 페이지 최소 1장은 배치되므로 무한 루프 없음)
+                raise LayoutError(f"사진 {len(remaining_photos)}장을 배치하지 못했습니다.")
         
-        print(f"\n=== 최종 결과 ===")
-        print(f"총 {total_pages}개 페이지 생성")
-        print(f"배치된 사진: 시공사진 {total_construction_placed}장, 대문사진 {total_document_placed}장")
+        logger.info("배치 완료: 총 %d페이지, 시공사진 %d장, 대문사진 %d장", total_pages, total_construction_placed, total_document_placed)
         
-        if not pages:
+        if total_pages == 0:
             if paper_orientation == 'portrait':
                 a4_width, a4_height = A4_PORTRAIT_SIZE
             else:
                 a4_width, a4_height = A4_LANDSCAPE_SIZE
-            empty_page = Image.new('RGB', (a4_width, a4_height), 'white')
-            pages.append(empty_page)
-            total_pages = 1
-        
-        message = f"개선된 배치 완료! 총 {total_pages}페이지에 {total_placed}장 배치 (시공사진: {total_construction_placed}장, 대문사진: {total_document_placed}장)"
-        
-        return pages, message, total_construction_placed, total_document_placed, total_pages
+            yield Image.new('RGB', (scale_px(a4_width, dpi), scale_px(a4_height, dpi)), 'white'), 0, 0
         
+    except LayoutError:
+        raise
+    except MemoryError:
+        raise
     except Exception as e:
-        print(f"개선된 배치 오류: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return None, f"배치 중 오류가 발생했습니다: {str(e)}", 0, 0, 0
+        logger.exception("개선된 배치 오류: %s", e)
+        raise LayoutError(f"배치 중 오류가 발생했습니다: {str(e)}")
 
 # 복잡한 배치 함수들도 메모리 절약을 위해 제거됨
 
+def probe_uploads(files):
+    """업로드 파일 헤더 검사 → ([(파일, ImageProbe), ...], [{'filename', 'error'}, ...])
+    
+    빈 파일명/허용하지 않는 확장자는 기존처럼 조용히 건너뛰고, 헤더 검사에 실패한 파일만 거절 목록에 넣음
+    """
+    accepted = []
+    rejected = []
+    for file in files:
+        if not file or file.filename == '' or not allowed_file(file.filename):
+            continue
+        try:
+            accepted.append((file, probe_image(file)))
+        except ImageProbeError as e:
+            logger.warning("업로드 거절: %s (%s)", file.filename, e)
+            metrics.inc('printlh_uploads_total', result='rejected')
+            rejected.append({'filename': file.filename, 'error': str(e)})
+    return accepted, rejected
+
+def read_optimized_uploads(files):
+    """업로드된 시공사진/대문사진 파일을 디스크에 스풀해서 (시공사진, 대문사진, 거절 목록) 반환
+    
+    원본 바이트는 메모리에 올리지 않음 - 다 쓴 뒤에는 discard_uploads로 정리.
+    스풀한 파일은 헤더만 읽어서 검사하고(UploadRef.probe), 이미지가 아니거나 손상/압축 폭탄이면
+    바로 지우고 거절 목록에 {'filename', 'error'}로 기록
+    """
+    construction_images = []
+    document_images = []
+    rejected = []
+    
+    # 시공사진 / 대문사진 처리 (제한 없이 모두 처리)
+    with metrics.span('ingest'):
+        for field, images, label in [('construction_files', construction_images, '시공사진'),
+                                     ('document_files', document_images, '대문사진')]:
+            for file in files.getlist(field):
+                if file and file.filename != '' and allowed_file(file.filename):
+                    try:
+                        upload = spool_upload(file)
+                        # 파일 크기 체크 (압축된 파일 기준)
+                        if upload is None:
+                            logger.warning("파일 크기 초과: %s", file.filename)
+                            metrics.inc('printlh_uploads_total', result='too_large')
+                            continue
+                        try:
+                            upload.probe = probe_image(upload)
+                        except ImageProbeError as e:
+                            upload.discard()
+                            logger.warning("%s 거절: %s (%s)", label, file.filename, e)
+                            metrics.inc('printlh_uploads_total', result='rejected')
+                            rejected.append({'filename': file.filename, 'error': str(e)})
+                            continue
+                        images.append(upload)
+                        metrics.inc('printlh_uploads_total', result='ok')
+                        metrics.inc('printlh_ingested_bytes_total', upload.size)
+                    except Exception as e:
+                        logger.warning("%s 읽기 오류: %s", label, e)
+                        metrics.inc('printlh_uploads_total', result='error')
+                        continue
+    
+    return construction_images, document_images, rejected
+
+def read_layout_options(form):
+    """요청의 용지(paper_size, paper_width_cm, paper_height_cm)와 dpi 값 확인 (잘못된 값이면 ValueError)"""
+    paper = resolve_paper_profile(
+        form.get('paper_size', 'A4'), form.get('paper_width_cm'), form.get('paper_height_cm')
+    )
+    try:
+        dpi = int(form.get('dpi', DEFAULT_DPI))
+    except ValueError:
+        raise ValueError("dpi는 정수여야 합니다.")
+    if not MIN_DPI <= dpi <= MAX_DPI:
+        raise ValueError(f"dpi는 {MIN_DPI}~{MAX_DPI} 범위여야 합니다.")
+    # 페이지 캔버스는 한 장씩이라도 통째로 메모리에 올라가므로 용지 면적 × dpi²를 제한
+    page_width, page_height = paper.size_px('landscape', dpi)
+    if page_width * page_height > app.config['MAX_PAGE_PIXELS']:
+        raise ValueError(
+            f"페이지가 너무 큽니다 ({page_width}×{page_height}픽셀, "
+            f"최대 {app.config['MAX_PAGE_PIXELS'] / 1_000_000:.0f}메가픽셀). 용지나 dpi를 줄여주세요."
+        )
+    return paper, dpi
+
+class LayoutError(Exception):
+    """배치 생성 실패 (사용자에게 보여줄 메시지 포함)"""
+
+class StreamingPdfWriter:
+    """페이지가 만들어지는 대로 JPEG 이미지 스트림(DCTDecode)으로 바로 기록하는 다중 페이지 PDF 작성기
+    
+    페이지 이미지는 파일에 쓰고 나면 더 이상 필요 없으므로 전체 페이지를 메모리에 모아둘 필요가 없음
+    """
+    CATALOG_ID = 1
+    PAGES_ID = 2
+
+    def __init__(self, path, dpi=300, quality=90):
+        self.path = path
+        self.dpi = dpi
+        self.quality = quality
+        self.page_ids = []
+        self._offsets = {}
+        self._next_id = 3
+        self._broken = False  # 페이지 기록 도중 실패하면 객체가 빠져서 상호 참조 테이블을 만들 수 없음
+        self._fp = open(path, 'wb')
+        self._fp.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _allocate_id(self):
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    def _begin_object(self, obj_id):
+        self._offsets[obj_id] = self._fp.tell()
+        self._fp.write(f'{obj_id} 0 obj\n'.encode())
+
+    def _write_object(self, obj_id, body):
+        self._begin_object(obj_id)
+        self._fp.write(body.encode() + b'\nendobj\n')
+
+    def add_page(self, page_image):
+        """페이지 한 장을 JPEG로 인코딩해서 파일에 바로 기록 → 이 페이지로 늘어난 바이트 수"""
+        try:
+            return self._add_page(page_image)
+        except BaseException:
+            self._broken = True
+            raise
+
+    def _add_page(self, page_image):
+        page_start = self._fp.tell()
+        if page_image.mode != 'RGB':
+            page_image = page_image.convert('RGB')
+        width_px, height_px = page_image.size
+        width_pt = width_px * 72 / self.dpi
+        height_pt = height_px * 72 / self.dpi
+        image_id, length_id, content_id, page_id = (self._allocate_id() for _ in range(4))
+
+        # 이미지 스트림: 길이를 미리 알 수 없으므로 간접 참조(length_id)로 기록
+        self._begin_object(image_id)
+        self._fp.write(
+            f'<< /Type /XObject /Subtype /Image /Width {width_px} /Height {height_px} '
+            f'/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode '
+            f'/Length {length_id} 0 R >>\nstream\n'.encode()
+        )
+        stream_start = self._fp.tell()
+        page_image.save(self._fp, 'JPEG', quality=self.quality, dpi=(self.dpi, self.dpi))
+        stream_length = self._fp.tell() - stream_start
+        self._fp.write(b'\nendstream\nendobj\n')
+        self._write_object(length_id, str(stream_length))
+
+        content = f'q {width_pt:.2f} 0 0 {height_pt:.2f} 0 0 cm /Im0 Do Q'
+        self._write_object(content_id, f'<< /Length {len(content)} >>\nstream\n{content}\nendstream')
+        self._write_object(
+            page_id,
+            f'<< /Type /Page /Parent {self.PAGES_ID} 0 R /MediaBox [0 0 {width_pt:.2f} {height_pt:.2f}] '
+            f'/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>'
+        )
+        self.page_ids.append(page_id)
+        return self._fp.tell() - page_start
+
+    def abort(self):
+        """기록 중인 파일을 닫고 지움 (실패한 작업의 잘린 PDF를 남기지 않음)"""
+        self._fp.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.path)
+
+    def close(self):
+        """페이지 트리, 카탈로그, 상호 참조 테이블을 기록하고 파일 닫기 (페이지 기록이 실패했으면 abort)"""
+        if self._broken:
+            self.abort()
+            raise LayoutError("PDF 페이지 기록에 실패해서 파일을 완성할 수 없습니다.")
+        kids = ' '.join(f'{page_id} 0 R' for page_id in self.page_ids)
+        self._write_object(self.PAGES_ID, f'<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>')
+        self._write_object(self.CATALOG_ID, f'<< /Type /Catalog /Pages {self.PAGES_ID} 0 R >>')
+
+        xref_offset = self._fp.tell()
+        self._fp.write(f'xref\n0 {self._next_id}\n0000000000 65535 f \n'.encode())
+        for obj_id in range(1, self._next_id):
+            self._fp.write(f'{self._offsets[obj_id]:010d} 00000 n \n'.encode())
+        self._fp.write(
+            f'trailer\n<< /Size {self._next_id} /Root {self.CATALOG_ID} 0 R >>\n'
+            f'startxref\n{xref_offset}\n%%EOF\n'.encode()
+        )
+        self._fp.close()
+
+# 페이지 인코더: 완성된 페이지를 출력 형식에 맞게 파일에 바로 기록 (중간 메모리 버퍼 없음)
+class PageEncoder:
+    """페이지별 이미지 파일 인코더 - 형식별 하위 클래스가 저장 옵션을 정함
+    
+    페이지마다 인코딩 시간과 출력 바이트 수를 기록 (stats)
+    """
+    format_name = None
+    extension = None
+    default_quality = None
+    max_side = None  # 형식이 지원하는 최대 가로/세로 픽셀 (None이면 제한 없음)
+
+    def __init__(self, folder, base_name, dpi=DEFAULT_DPI, quality=None):
+        self.folder = folder
+        self.base_name = base_name
+        self.dpi = dpi
+        self.quality = quality or self.default_quality
+        self.output_filename = None  # 모든 페이지를 한 파일에 모으는 형식(PDF)의 파일명
+        self.page_stats = []
+
+    def save_options(self):
+        """Image.save에 넘길 형식별 옵션"""
+        return {}
+
+    def write_page(self, page_image, page_number):
+        """페이지를 파일로 저장 → (파일명, 바이트 수)"""
+        filename = f"{self.base_name}_page_{page_number}.{self.extension}"
+        path = os.path.join(self.folder, filename)
+        page_image.save(path, format=self.format_name, dpi=(self.dpi, self.dpi), **self.save_options())
+        return filename, os.path.getsize(path)
+
+    def add_page(self, page_image, page_number):
+        """페이지 인코딩 + 통계 기록 → 페이지 파일명 (한 파일에 모으는 형식은 None)"""
+        start = time.perf_counter()
+        filename, size = self.write_page(page_image, page_number)
+        elapsed = time.perf_counter() - start
+        self.page_stats.append({'page': page_number, 'encode_ms': round(elapsed * 1000, 1), 'bytes': size})
+        metrics.record_stage('encode', elapsed)
+        metrics.inc('printlh_pages_total', format=self.extension)
+        metrics.observe('printlh_page_bytes', size, format=self.extension)
+        return filename
+
+    def close(self):
+        """출력 마무리 (페이지별 파일 형식은 할 일 없음)"""
+
+    def abort(self):
+        """배치가 실패했을 때 출력 정리 (이미 저장한 페이지 파일은 작업 레코드가 가리키므로 그대로 둠)"""
+
+    def stats(self):
+        """인코딩 통계 (배치 정보에 저장)"""
+        return {
+            'format': self.extension,
+            'quality': self.quality,
+            'total_bytes': sum(page['bytes'] for page in self.page_stats),
+            'total_encode_ms': round(sum(page['encode_ms'] for page in self.page_stats), 1),
+            'pages': self.page_stats
+        }
+
+class PngPageEncoder(PageEncoder):
+    """무손실 PNG (기본값, 사진에서는 가장 느리고 큼)"""
+    format_name = 'PNG'
+    extension = 'png'
+
+class JpegPageEncoder(PageEncoder):
+    """고품질 JPEG - 색 정보 축소 없이(4:4:4) 저장해서 글자/경계선이 번지지 않도록"""
+    format_name = 'JPEG'
+    extension = 'jpg'
+    default_quality = 92
+    max_side = 65500
+
+    def save_options(self):
+        return {'quality': self.quality, 'subsampling': 0}
+
+class WebpPageEncoder(PageEncoder):
+    """WebP (같은 화질에서 JPEG보다 작음, 한 변 16383픽셀까지)"""
+    format_name = 'WEBP'
+    extension = 'webp'
+    default_quality = 90
+    max_side = 16383
+
+    def save_options(self):
+        return {'quality': self.quality, 'method': 4}
+
+class PdfPageEncoder(PageEncoder):
+    """모든 페이지를 다중 페이지 PDF 한 개로 기록 (StreamingPdfWriter)"""
+    extension = 'pdf'
+    default_quality = 90
+    max_side = 65500
+
+    def __init__(self, folder, base_name, dpi=DEFAULT_DPI, quality=None):
+        super().__init__(folder, base_name, dpi, quality)
+        self.output_filename = f"{base_name}.pdf"
+        self._writer = StreamingPdfWriter(os.path.join(folder, self.output_filename), dpi=dpi, quality=self.quality)
+
+    def write_page(self, page_image, page_number):
+        return None, self._writer.add_page(page_image)
+
+    def close(self):
+        self._writer.close()
+
+    def abort(self):
+        self._writer.abort()
+
+PAGE_ENCODERS = {'png': PngPageEncoder, 'jpeg': JpegPageEncoder, 'pdf': PdfPageEncoder}
+if features.check('webp'):  # Pillow가 libwebp 없이 빌드되었으면 WebP 출력은 제공하지 않음
+    PAGE_ENCODERS['webp'] = WebpPageEncoder
+
+def read_output_options(form, paper, dpi, output_format='png', quality=None):
+    """요청의 출력 형식(output_format)과 품질(quality, 1~100) 확인 (잘못된 값이면 ValueError)"""
+    output_format = form.get('output_format', output_format).lower()
+    if output_format == 'jpg':
+        output_format = 'jpeg'
+    if output_format not in PAGE_ENCODERS:
+        raise ValueError(f"지원하지 않는 출력 형식입니다 ({', '.join(PAGE_ENCODERS)})")
+    
+    quality = form.get('quality', quality)
+    if quality is not None:
+        try:
+            quality = int(quality)
+        except ValueError:
+            raise ValueError("quality는 정수여야 합니다.")
+        if not 1 <= quality <= 100:
+            raise ValueError("quality는 1~100 범위여야 합니다.")
+    
+    max_side = PAGE_ENCODERS[output_format].max_side
+    if max_side is not None and max(paper.size_px('portrait', dpi)) > max_side:
+        raise ValueError(f"{output_format} 출력은 한 변 {max_side}픽셀까지입니다. 용지나 dpi를 줄여주세요.")
+    return output_format, quality
+
+def run_optimized_layout(layout_id, construction_images, document_images, paper_orientation,
+                         on_page=None, output_format='png', paper=None, dpi=DEFAULT_DPI, layout_plan=None,
+                         quality=None):
+    """혼합 배치를 생성하고 페이지를 저장한 뒤 배치 정보(layout_info) 반환
+    
+    output_format: 페이지 인코더 (png, jpeg, webp: 페이지별 파일, pdf: 다중 페이지 PDF 한 개)
+    quality: 손실 압축 형식의 품질 (None이면 형식별 기본값)
+    paper/dpi: 용지 프로필(기본 A4)과 출력 해상도
+    layout_plan: 미리보기에서 만든 배치 계획 - 주어지면 다시 배치하지 않고 그대로 렌더링 (용지/DPI도 계획 값)
+    on_page: 페이지가 저장될 때마다 (페이지 번호, 파일명)으로 호출되는 콜백 (PDF는 파일명 None)
+    
+    작업 단계별 소요 시간 합계는 layout_info['timings'](초), 전체 집계는 /metrics
+    """
+    started = time.perf_counter()
+    try:
+        with metrics.job_timings() as timings:
+            layout_info = _run_optimized_layout(
+                layout_id, construction_images, document_images, paper_orientation,
+                on_page, output_format, paper, dpi, layout_plan, quality
+            )
+    except BaseException:
+        metrics.inc('printlh_jobs_total', status='failed', format=output_format)
+        raise
+    
+    metrics.inc('printlh_jobs_total', status='done', format=output_format)
+    metrics.observe('printlh_job_seconds', time.perf_counter() - started, format=output_format)
+    metrics.observe('printlh_job_pages', layout_info['total_pages'])
+    metrics.inc('printlh_photos_placed_total', layout_info['construction_count'], type='construction')
+    metrics.inc('printlh_photos_placed_total', layout_info['document_count'], type='document')
+    layout_info['timings'] = {stage: round(seconds, 3) for stage, seconds in timings.items()}
+    return layout_info
+
+def _run_optimized_layout(layout_id, construction_images, document_images, paper_orientation,
+                          on_page, output_format, paper, dpi, layout_plan, quality):
+    # 다중 페이지 배치: 페이지를 한 장씩 받아서 바로 저장
+    if layout_plan is not None:
+        paper = PaperProfile.from_dict(layout_plan['paper'])
+        dpi = layout_plan['dpi']
+        pages = iter_planned_layout_pages(layout_plan, construction_images, document_images, paper_orientation)
+    else:
+        paper = paper or PAPER_PROFILES['A4']
+        pages = iter_optimized_mixed_layout(construction_images, document_images, paper_orientation, paper, dpi)
+    actual_construction_count = 0
+    actual_document_count = 0
+    completed_pages = 0
+    
+    # outputs 폴더 생성
+    outputs_folder = app.config['OUTPUTS_FOLDER']
+    os.makedirs(outputs_folder, exist_ok=True)
+    
+    page_filenames = []
+    encoder = PAGE_ENCODERS[output_format](
+        outputs_folder, f"mixed_layout_{paper_orientation}_{layout_id}", dpi, quality
+    )
+    
+    finished = False
+    try:
+        for i, (page_img, construction_placed, document_placed) in enumerate(pages):
+            # 페이지를 출력 파일에 바로 기록 (PDF는 한 파일에 이어서 기록하므로 파일명 None)
+            filename = encoder.add_page(page_img, i + 1)
+            if filename is not None:
+                page_filenames.append(filename)
+            
+            # 메모리 정리
+            page_img.close()
+            del page_img
+            completed_pages = i + 1
+            actual_construction_count += construction_placed
+            actual_document_count += document_placed
+            
+            if on_page is not None:
+                with metrics.span('write'):
+                    on_page(i + 1, filename)
+        finished = True
+    finally:
+        pages.close()
+        # 실패했으면 마무리(PDF 상호 참조 테이블 등)를 쓰지 않고 정리만 해서 원래 예외가 그대로 전달되게 함
+        if finished:
+            with metrics.span('write'):
+                encoder.close()
+        else:
+            encoder.abort()
+    
+    return {
+        'kind': 'optimized',
+        'layout_id': layout_id,
+        'output_format': output_format,
+        'quality': encoder.quality,
+        'encoding': encoder.stats(),
+        'page_filenames': page_filenames,
+        'pdf_filename': encoder.output_filename,
+        'completed_pages': completed_pages,
+        'total_pages': completed_pages,
+        'construction_count': actual_construction_count,
+        'document_count': actual_document_count,
+        'paper_orientation': paper_orientation,
+        'paper': paper.to_dict(),
+        'dpi': dpi,
+        'upload_time': time.time(),
+        'message': layout_message(completed_pages, actual_construction_count, actual_document_count)
+    }
+
+def create_layout_preview(layout_id, construction_images, document_images, paper_orientation,
+                          output_format='png', paper=None, dpi=DEFAULT_DPI, quality=None):
+    """배치 계획만 세우고 화면 해상도(PREVIEW_DPI) JPEG 페이지로 미리보기 생성 → 미리보기 레코드 반환
+    
+    스풀 파일과 배치 계획은 레코드에 남겨두고, 확정(/jobs/<id>/confirm)하면 같은 배치로 최종 렌더링
+    """
+    paper = paper or PAPER_PROFILES['A4']
+    layout_plan = plan_global_layout(len(construction_images), len(document_images), paper, dpi)
+    if not layout_plan['pages']:
+        raise LayoutError("배치할 사진이 없습니다.")
+    
+    outputs_folder = app.config['OUTPUTS_FOLDER']
+    os.makedirs(outputs_folder, exist_ok=True)
+    preview_filenames = []
+    pages = iter_planned_layout_pages(
+        layout_plan, construction_images, document_images, paper_orientation, dpi=app.config['PREVIEW_DPI']
+    )
+    try:
+        for i, (page_img, _, _) in enumerate(pages):
+            filename = f"mixed_preview_{paper_orientation}_{layout_id}_page_{i+1}.jpg"
+            page_img.save(os.path.join(outputs_folder, filename), format='JPEG', quality=80)
+            page_img.close()
+            preview_filenames.append(filename)
+    finally:
+        pages.close()
+    
+    return {
+        'kind': 'optimized',
+        'layout_id': layout_id,
+        'status': 'preview',
+        'stage': 'preview',
+        'page_filenames': [],
+        'preview_filenames': preview_filenames,
+        'completed_pages': 0,
+        'total_pages': len(layout_plan['pages']),
+        'construction_count': len(construction_images),
+        'document_count': len(document_images),
+        'submitted_construction': len(construction_images),
+        'submitted_document': len(document_images),
+        'paper_orientation': paper_orientation,
+        'paper': paper.to_dict(),
+        'dpi': dpi,
+        'output_format': output_format,
+        'quality': quality,
+        'pdf_filename': None,
+        'layout_plan': layout_plan,
+        'uploads': {
+            'construction': [upload.to_dict() for upload in construction_images],
+            'document': [upload.to_dict() for upload in document_images]
+        },
+        'upload_time': time.time(),
+        'message': f"미리보기: {len(layout_plan['pages'])}페이지 (확정하면 {dpi} DPI로 렌더링)",
+        'error': None
+    }
+
+def layout_result_response(layout_info, uploaded_construction, uploaded_document, rejected_files=()):
+    """동기 배치 완료 응답 (rejected_files: 헤더 검사에서 거절된 업로드)"""
+    return jsonify({
+        'success': True,
+        'message': layout_info['message'],
+        'layout_id': layout_info['layout_id'],
+        'page_filenames': layout_info['page_filenames'],
+        'output_format': layout_info['output_format'],
+        'quality': layout_info['quality'],
+        'encoding': layout_info['encoding'],
+        'timings': layout_info['timings'],
+        'pdf_filename': layout_info['pdf_filename'],
+        'pdf_url': job_pdf_url(layout_info),
+        'total_pages': layout_info['total_pages'],
+        'construction_count': layout_info['construction_count'],
+        'document_count': layout_info['document_count'],
+        'uploaded_construction': uploaded_construction,
+        'uploaded_document': uploaded_document,
+        'rejected_files': list(rejected_files),
+        'paper_orientation': layout_info['paper_orientation'],
+        'paper': layout_info['paper'],
+        'dpi': layout_info['dpi']
+    })
+
 # 새로운 최적화 혼합 배치 엔드포인트
 @app.route('/upload_optimized', methods=['POST'])
 def upload_optimized_files():
-    """두 종류 사진을 최적화해서 다중 페이지 배치하는 엔드포인트"""
+    """두 종류 사진을 최적화해서 다중 페이지 배치하는 엔드포인트
+    
+    async=true 이면 작업을 백그라운드에 맡기고 job_id를 바로 반환 (진행 상황은 /jobs/<job_id>)
+    output_format으로 페이지 형식 선택 (png 기본, jpeg, webp, pdf: 다중 페이지 PDF 한 개), quality로 압축 품질
+    paper_size(A4, A3, Letter, custom)와 dpi로 용지와 출력 해상도 지정 (기본 A4, 300 DPI)
+    preview=true 이면 화면 해상도 미리보기만 만들고, 최종 렌더링은 /jobs/<job_id>/confirm 에서 수행
+    """
     try:
         construction_files = request.files.getlist('construction_files')
         document_files = request.files.getlist('document_files')
         paper_orientation = request.form.get('paper_orientation', 'portrait')
+        run_async = request.form.get('async', 'false').lower() in ('1', 'true', 'yes')
+        preview = request.form.get('preview', 'false').lower() in ('1', 'true', 'yes')
         
-        print(f"다중 페이지 배치 요청: 시공사진 {len(construction_files)}장, 대문사진 {len(document_files)}장")
+        try:
+            paper, dpi = read_layout_options(request.form)
+            output_format, quality = read_output_options(request.form, paper, dpi)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # 파일 유효성 검사 및 메모리 효율적 처리
-        construction_images = []
-        document_images = []
+        logger.info("다중 페이지 배치 요청: 시공사진 %d장, 대문사진 %d장", len(construction_files), len(document_files))
         
-        # 시공사진 처리 (제한 없이 모두 처리)
-        for i, file in enumerate(construction_files):
-            if file and file.filename != '' and allowed_file(file.filename):
-                try:
-                    file_data = file.read()
-                    # 파일 크기 체크 (압축된 파일 기준)
-                    if len(file_data) > 20 * 1024 * 1024:  # 20MB 제한 (압축된 파일 기준)
-                        print(f"파일 크기 초과: {file.filename}")
-                        continue
-                    construction_images.append(file_data)
-                except Exception as e:
-                    print(f"시공사진 읽기 오류: {str(e)}")
-                    continue
-        
-        # 대문사진 처리 (제한 없이 모두 처리)
-        for i, file in enumerate(document_files):
-            if file and file.filename != '' and allowed_file(file.filename):
-                try:
-                    file_data = file.read()
-                    # 파일 크기 체크 (압축된 파일 기준)
-                    if len(file_data) > 20 * 1024 * 1024:  # 20MB 제한 (압축된 파일 기준)
-                        print(f"파일 크기 초과: {file.filename}")
-                        continue
-                    document_images.append(file_data)
-                except Exception as e:
-                    print(f"대문사진 읽기 오류: {str(e)}")
-                    continue
+        # 파일 유효성 검사 및 메모리 효율적 처리
+        construction_images, document_images, rejected_files = read_optimized_uploads(request.files)
         
         if not construction_images and not document_images:
-            return jsonify({'error': '유효한 업로드 사진이 없습니다.'}), 400
-        
-        print(f"처리할 이미지: 시공사진 {len(construction_images)}장, 대문사진 {len(document_images)}장")
+            return jsonify({'error': '유효한 업로드 사진이 없습니다.', 'rejected_files': rejected_files}), 400
         
-        # 다중 페이지 배치 생성
-        result = create_optimized_mixed_layout(construction_images, document_images, paper_orientation)
-        
-        if result[0] is None:  # 오류 케이스
-            return jsonify({'error': result[1]}), 400
-        
-        result_pages, message, actual_construction_count, actual_document_count, total_pages = result
+        logger.debug("처리할 이미지: 시공사진 %d장, 대문사진 %d장", len(construction_images), len(document_images))
         
         # 고유한 배치 ID 생성
         layout_id = str(uuid.uuid4())
         
-        # outputs 폴더 생성
-        outputs_folder = 'static/outputs'
-        os.makedirs(outputs_folder, exist_ok=True)
-        
-        # 각 페이지를 개별 파일로 저장
-        page_filenames = []
-        for i, page_img in enumerate(result_pages):
-            # 이미지를 메모리에 저장
-            img_buffer = io.BytesIO()
-            page_img.save(img_buffer, format='PNG', dpi=(300, 300))
-            img_buffer.seek(0)
-            
-            # 페이지별 파일명 생성
-            filename = f"mixed_layout_{paper_orientation}_{layout_id}_page_{i+1}.png"
-            page_filenames.append(filename)
-            
-            # 파일 저장
-            file_path = os.path.join(outputs_folder, filename)
-            with open(file_path, 'wb') as f:
-                f.write(img_buffer.getvalue())
-            
-            # 메모리 정리
-            img_buffer.close()
-            page_img.close()
+        if preview:
+            try:
+                estimate = estimate_layout_memory(construction_images, document_images, paper,
+                                                  app.config['PREVIEW_DPI'])
+                with admission.admit(estimate):
+                    job = create_layout_preview(
+                        layout_id, construction_images, document_images, paper_orientation, output_format, paper,
+                        dpi, quality
+                    )
+            except AdmissionRejected as e:
+                discard_uploads(construction_images, document_images)
+                return admission_rejected_response(e)
+            except LayoutError as e:
+                discard_uploads(construction_images, document_images)
+                return jsonify({'error': str(e)}), 400
+            except BaseException:
+                discard_uploads(construction_images, document_images)
+                raise
+            layout_store.put(layout_id, job)
+            return jsonify({
+                'success': True,
+                'job_id': layout_id,
+                'status': job['status'],
+                'message': job['message'],
+                'total_pages': job['total_pages'],
+                'previews': job_preview_results(job),
+                'preview_dpi': app.config['PREVIEW_DPI'],
+                'paper': job['paper'],
+                'dpi': dpi,
+                'confirm_url': f'/jobs/{layout_id}/confirm',
+                'rejected_files': rejected_files
+            })
         
-        # 메모리 정리
-        del construction_images
-        del document_images
-        
-        # 배치 정보 저장
-        layout_info = {
-            'layout_id': layout_id,
-            'page_filenames': page_filenames,
-            'total_pages': total_pages,
-            'construction_count': actual_construction_count,
-            'document_count': actual_document_count,
-            'paper_orientation': paper_orientation,
-            'upload_time': time.time(),
-            'message': message
-        }
-        uploaded_files[layout_id] = layout_info
+        if run_async:
+            job = submit_layout_job(
+                layout_id, construction_images, document_images, paper_orientation, output_format, paper, dpi,
+                quality=quality
+            )
+            return jsonify({
+                'success': True,
+                'job_id': layout_id,
+                'status': job['status'],
+                'status_url': f'/jobs/{layout_id}',
+                'rejected_files': rejected_files
+            }), 202
         
-        print(f"다중 페이지 배치 성공: {total_pages}페이지 생성")
+        try:
+            with admission.admit(estimate_layout_memory(construction_images, document_images, paper, dpi)):
+                layout_info = run_optimized_layout(
+                    layout_id, construction_images, document_images, paper_orientation,
+                    output_format=output_format, paper=paper, dpi=dpi, quality=quality
+                )
+        except AdmissionRejected as e:
+            return admission_rejected_response(e)
+        except LayoutError as e:
+            return jsonify({'error': str(e)}), 400
+        finally:
+            # 스풀 파일 정리
+            discard_uploads(construction_images, document_images)
         
-        return jsonify({
-            'success': True,
-            'message': message,
-            'layout_id': layout_id,
-            'page_filenames': page_filenames,
-            'total_pages': total_pages,
-            'construction_count': actual_construction_count,
-            'document_count': actual_document_count,
-            'uploaded_construction': len(construction_files),
-            'uploaded_document': len(document_files),
-            'paper_orientation': paper_orientation
-        })
+        # 배치 정보 저장 (모든 워커가 공유하는 저장소)
+        layout_info['status'] = 'done'
+        layout_store.put(layout_id, layout_info)
+        
+        logger.info("다중 페이지 배치 성공: %d페이지 생성", layout_info['total_pages'])
+        
+        return layout_result_response(layout_info, len(construction_files), len(document_files), rejected_files)
         
     except MemoryError:
-        print("메모리 부족 오류 발생")
+        logger.error("메모리 부족 오류 발생")
         return jsonify({'error': '메모리가 부족합니다. 더 적은 수의 사진으로 시도해주세요.'}), 500
     except Exception as e:
-        print(f"다중 페이지 배치 오류: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("다중 페이지 배치 오류: %s", e)
         return jsonify({'error': f'레이아웃 생성 중 오류가 발생했습니다: {str(e)}'}), 500
 
+# 대용량 배치를 위한 비동기 작업 처리
+_job_executor = None
+_job_executor_lock = threading.Lock()
+
+def get_job_executor():
+    """배치 작업용 백그라운드 스레드 풀 (최초 사용 시 생성)"""
+    global _job_executor
+    with _job_executor_lock:
+        if _job_executor is None:
+            _job_executor = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'], thread_name_prefix='layout-job')
+        return _job_executor
+
+def submit_layout_job(job_id, construction_images, document_images, paper_orientation, output_format='png',
+                      paper=None, dpi=DEFAULT_DPI, layout_plan=None, quality=None):
+    """배치 작업 레코드를 만들고 백그라운드 풀에 제출"""
+    job = {
+        'kind': 'optimized',
+        'layout_id': job_id,
+        'status': 'queued',
+        'stage': 'queued',
+        'page_filenames': [],
+        'completed_pages': 0,
+        'total_pages': None,
+        'construction_count': 0,
+        'document_count': 0,
+        'submitted_construction': len(construction_images),
+        'submitted_document': len(document_images),
+        'paper_orientation': paper_orientation,
+        'paper': (paper or PAPER_PROFILES['A4']).to_dict(),
+        'dpi': dpi,
+        'output_format': output_format,
+        'quality': quality,
+        'pdf_filename': None,
+        'upload_time': time.time(),
+        'message': '대기 중',
+        'error': None
+    }
+    layout_store.put(job_id, job)
+    get_job_executor().submit(
+        run_layout_job, dict(job), construction_images, document_images, paper_orientation, output_format,
+        paper, dpi, layout_plan, quality
+    )
+    return job
+
+def run_layout_job(job, construction_images, document_images, paper_orientation, output_format='png',
+                   paper=None, dpi=DEFAULT_DPI, layout_plan=None, quality=None):
+    """백그라운드 배치 작업 실행 - 진행 상황을 작업 레코드에 기록 (다른 워커에서도 조회 가능)
+    
+    메모리 예산이 날 때까지 queued 상태로 기다림 (이미 접수된 작업이라 429로 거절하지 않음)
+    """
+    job_id = job['layout_id']
+    if layout_plan is not None:
+        paper, dpi = PaperProfile.from_dict(layout_plan['paper']), layout_plan['dpi']
+    admission_token = admission.acquire(
+        estimate_layout_memory(construction_images, document_images, paper, dpi), background=True
+    )
+    job['status'] = 'running'
+    job['stage'] = 'layout'
+    job['started_time'] = time.time()
+    layout_store.put(job_id, job)
+    
+    def on_page(page_number, filename):
+        job['stage'] = 'saving'
+        if filename is not None:
+            job['page_filenames'].append(filename)
+        job['completed_pages'] = page_number
+        layout_store.put(job_id, job)
+    
+    try:
+        layout_info = run_optimized_layout(
+            job_id, construction_images, document_images, paper_orientation, on_page, output_format,
+            paper, dpi, layout_plan, quality
+        )
+        job.update(layout_info)
+        job['status'] = 'done'
+        job['stage'] = 'done'
+        logger.info("배치 작업 완료: %s (%d페이지)", job_id, layout_info['total_pages'])
+    except MemoryError:
+        job['status'] = 'failed'
+        job['error'] = '메모리가 부족합니다. 더 적은 수의 사진으로 시도해주세요.'
+    except LayoutError as e:
+        job['status'] = 'failed'
+        job['error'] = str(e)
+    except Exception as e:
+        logger.exception("배치 작업 오류 (%s): %s", job_id, e)
+        job['status'] = 'failed'
+        job['error'] = f'레이아웃 생성 중 오류가 발생했습니다: {str(e)}'
+    finally:
+        admission.release(admission_token)
+        discard_uploads(construction_images, document_images)
+        job['finished_time'] = time.time()
+        layout_store.put(job_id, job)
+
+def job_pdf_url(job):
+    """PDF 출력 작업의 다운로드 경로 (PDF가 아니면 None)"""
+    if not job.get('pdf_filename'):
+        return None
+    return f"/static/outputs/{job['pdf_filename']}"
+
+def job_page_results(job):
+    """작업 레코드의 완료된 페이지 목록"""
+    return [
+        {'page': i + 1, 'filename': filename, 'url': f'/static/outputs/{filename}'}
+        for i, filename in enumerate(job['page_filenames'])
+    ]
+
+def job_preview_results(job):
+    """작업 레코드의 미리보기 페이지 목록"""
+    return [
+        {'page': i + 1, 'filename': filename, 'url': f'/static/outputs/{filename}'}
+        for i, filename in enumerate(job.get('preview_filenames', []))
+    ]
+
+def get_job(job_id):
+    """배치 작업 레코드 조회 (없거나 배치 작업이 아니면 None)"""
+    job = layout_store.get(job_id)
+    if job is None or job.get('kind') != 'optimized':
+        return None
+    return job
+
+@app.route('/jobs/<job_id>')
+def get_job_status(job_id):
+    """배치 작업 상태 및 진행률 반환"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': '작업을 찾을 수 없습니다'}), 404
+    
+    response = dict(job)
+    # 미리보기 레코드의 배치 계획과 스풀 파일 경로는 내부용
+    response.pop('layout_plan', None)
+    response.pop('uploads', None)
+    response['job_id'] = job_id
+    response['pages'] = job_page_results(job)
+    response['previews'] = job_preview_results(job)
+    response['pdf_url'] = job_pdf_url(job) if job['status'] == 'done' else None
+    return jsonify(response)
+
+@app.route('/jobs/<job_id>/pages')
+def get_job_pages(job_id):
+    """배치 작업에서 지금까지 완료된 페이지 결과 반환"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': '작업을 찾을 수 없습니다'}), 404
+    
+    return jsonify({
+        'job_id': job_id,
+        'status': job['status'],
+        'completed_pages': job['completed_pages'],
+        'total_pages': job['total_pages'],
+        'pages': job_page_results(job)
+    })
+
+def confirm_failed(job_id, job, error, status_code):
+    """미리보기 확정 실패를 레코드에 기록하고 오류 응답 반환 (스풀 파일은 이미 정리되므로 다시 확정할 수 없음)"""
+    job.update({'status': 'failed', 'error': error, 'layout_plan': None, 'uploads': None})
+    layout_store.put(job_id, job)
+    return jsonify({'error': error}), status_code
+
+@app.route('/jobs/<job_id>/confirm', methods=['POST'])
+def confirm_layout_preview(job_id):
+    """미리보기 배치를 확정해서 최종 해상도로 렌더링 - 미리보기의 배치 계획을 그대로 사용 (다시 배치하지 않음)
+    
+    paper_orientation, output_format, quality는 바꿀 수 있음 (배치는 가로 용지 기준이라 방향이 바뀌어도 같은 배치)
+    async=true 이면 백그라운드 작업으로 실행하고 /jobs/<job_id>로 진행 상황 조회
+    """
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': '작업을 찾을 수 없습니다'}), 404
+    if job['status'] != 'preview':
+        return jsonify({'error': '미리보기 상태의 작업이 아닙니다', 'status': job['status']}), 409
+    
+    layout_plan = job['layout_plan']
+    paper = PaperProfile.from_dict(layout_plan['paper'])
+    paper_orientation = request.form.get('paper_orientation', job['paper_orientation'])
+    run_async = request.form.get('async', 'false').lower() in ('1', 'true', 'yes')
+    try:
+        output_format, quality = read_output_options(
+            request.form, paper, layout_plan['dpi'], job['output_format'], job.get('quality')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # preview → queued/running 전이를 원자적으로 - 같은 확정이 여러 워커에 동시에 와도 한 요청만 렌더링
+    claimed_status = 'queued' if run_async else 'running'
+    job = layout_store.compare_and_set(job_id, 'preview', {'status': claimed_status, 'stage': claimed_status})
+    if job is None:
+        current = layout_store.get(job_id)
+        return jsonify({
+            'error': '미리보기 상태의 작업이 아닙니다',
+            'status': current['status'] if current else None
+        }), 409
+    
+    construction_images = [UploadRef.from_dict(upload) for upload in job['uploads']['construction']]
+    document_images = [UploadRef.from_dict(upload) for upload in job['uploads']['document']]
+    if not all(os.path.exists(upload.path) for upload in construction_images + document_images):
+        discard_uploads(construction_images, document_images)
+        layout_store.delete(job_id)
+        return jsonify({'error': '미리보기 원본이 만료되었습니다. 다시 업로드해주세요.'}), 410
+    
+    if run_async:
+        job = submit_layout_job(
+            job_id, construction_images, document_images, paper_orientation, output_format,
+            paper, layout_plan['dpi'], layout_plan, quality
+        )
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status': job['status'],
+            'status_url': f'/jobs/{job_id}'
+        }), 202
+    
+    # 예산이 날 때까지 대기
+    try:
+        admission_token = admission.acquire(
+            estimate_layout_memory(construction_images, document_images, paper, layout_plan['dpi'])
+        )
+    except AdmissionRejected as e:
+        # 미리보기 상태로 되돌림 - 원본은 그대로 두므로 나중에 다시 확정할 수 있음
+        layout_store.compare_and_set(job_id, 'running', {'status': 'preview', 'stage': 'preview'})
+        return admission_rejected_response(e)
+    
+    try:
+        layout_info = run_optimized_layout(
+            job_id, construction_images, document_images, paper_orientation,
+            output_format=output_format, layout_plan=layout_plan, quality=quality
+        )
+    except LayoutError as e:
+        return confirm_failed(job_id, job, str(e), 400)
+    except MemoryError:
+        return confirm_failed(job_id, job, '메모리가 부족합니다. 더 적은 수의 사진으로 시도해주세요.', 500)
+    except Exception as e:
+        logger.exception("미리보기 확정 오류 (%s): %s", job_id, e)
+        return confirm_failed(job_id, job, f'레이아웃 생성 중 오류가 발생했습니다: {str(e)}', 500)
+    finally:
+        admission.release(admission_token)
+        discard_uploads(construction_images, document_images)
+    
+    layout_info['status'] = 'done'
+    layout_info['preview_filenames'] = job['preview_filenames']
+    layout_store.put(job_id, layout_info)
+    logger.info("미리보기 확정 배치 완료: %s (%d페이지)", job_id, layout_info['total_pages'])
+    
+    return layout_result_response(layout_info, len(construction_images), len(document_images))
+
 # 2D 빈 패킹을 위한 클래스들
 class Photo:
     def __init__(self, photo_id, width_cm, height_cm, photo_type):
@@ -1215,26 +3715,25 @@ class Rectangle:
                 self.height >= photo_height + margin)
 
 class BinPacker:
-    def __init__(self, bin_width, bin_height, margin_cm=0.2):
+    def __init__(self, bin_width, bin_height, margin_cm=0.2, dpi=DEFAULT_DPI):
         self.bin_width = bin_width
         self.bin_height = bin_height
-        self.margin_px = cm_to_px(margin_cm)
+        self.dpi = dpi
+        self.margin_px = cm_to_px(margin_cm, dpi)
         self.available_spaces = [Rectangle(0, 0, bin_width, bin_height)]
         self.placed_photos = []
         
-        print(f"📦 BinPacker 초기화")
-        print(f"   A4 크기: {bin_width}×{bin_height}px")
-        print(f"   여백: {margin_cm}cm ({self.margin_px}px)")
-        print(f"   시공사진 크기: 9×11cm ({cm_to_px(9.0)}×{cm_to_px(11.0)}px)")
-        print(f"   대문사진 크기: 11.4×15.2cm ({cm_to_px(11.4)}×{cm_to_px(15.2)}px)")
+        logger.debug("📦 BinPacker 초기화: A4 %d×%dpx, 여백 %scm (%dpx), 시공사진 9×11cm (%d×%dpx), 대문사진 11.4×15.2cm (%d×%dpx)",
+                     bin_width, bin_height, margin_cm, self.margin_px,
+                     cm_to_px(9.0, dpi), cm_to_px(11.0, dpi), cm_to_px(11.4, dpi), cm_to_px(15.2, dpi))
     
     def get_best_orientation(self, photo, space):
         """사진의 최적 방향(정방향/회전) 결정"""
         # 기본 크기 (cm에서 픽셀로 변환)
         if photo.photo_type == 'construction':
-            w_px, h_px = cm_to_px(9.0), cm_to_px(11.0)
+            w_px, h_px = cm_to_px(9.0, self.dpi), cm_to_px(11.0, self.dpi)
         else:  # document
-            w_px, h_px = cm_to_px(11.4), cm_to_px(15.2)
+            w_px, h_px = cm_to_px(11.4, self.dpi), cm_to_px(15.2, self.dpi)
         
         # 정방향으로 들어가는지 확인
         fits_normal = space.can_fit(w_px, h_px, self.margin_px)
@@ -1304,7 +3803,7 @@ class BinPacker:
         space_idx, fit_info = self.find_best_space(photo)
         
         if space_idx == -1:
-            print(f"⚠️  {photo.photo_id} ({photo.photo_type}) 배치 불가 - 남은 공간 없음")
+            logger.debug("⚠️  %s (%s) 배치 불가 - 남은 공간 없음", photo.photo_id, photo.photo_type)
             return False  # 배치 불가
         
         # 공간 제거
@@ -1319,9 +3818,9 @@ class BinPacker:
         
         # 배치 정보 출력
         rotation_text = "회전됨" if rotated else "정방향"
-        print(f"✅ {photo.photo_id} ({photo.photo_type}) 배치 완료")
-        print(f"   위치: ({int(space.x)}, {int(space.y)})")
-        print(f"   크기: {photo.width_cm}×{photo.height_cm}cm → {fit_w}×{fit_h}px ({rotation_text})")
+        logger.debug("✅ %s (%s) 배치 완료 - 위치: (%d, %d), 크기: %s×%scm → %d×%dpx (%s)",
+                     photo.photo_id, photo.photo_type, space.x, space.y,
+                     photo.width_cm, photo.height_cm, fit_w, fit_h, rotation_text)
         
         self.placed_photos.append(photo)
         
@@ -1332,7 +3831,7 @@ class BinPacker:
         # 공간을 면적 기준으로 정렬 (큰 공간부터)
         self.available_spaces.sort(key=lambda s: s.area(), reverse=True)
         
-        print(f"   남은 빈 공간: {len(self.available_spaces)}개")
+        logger.debug("   남은 빈 공간: %d개", len(self.available_spaces))
         
         return True
     
@@ -1350,6 +3849,645 @@ class BinPacker:
         
         return placed_count, self.placed_photos
 
+class MaxRectsPacker:
+    """MaxRects 빈패킹 - 서로 겹칠 수 있는 빈 사각형 목록을 유지해서 분할로 버려지는 공간이 없음
+    
+    BinPacker와 같은 pack_photos 인터페이스. 사진 오른쪽/아래에 여백(margin)을 포함해서 공간을 차지함
+    heuristic: 'bssf' (짧은 변 기준 최적), 'baf' (면적 기준 최적), 'bl' (위쪽 우선, 다음은 왼쪽 - 화면 좌표라 y가 작은 쪽이 위)
+    """
+    HEURISTICS = ('bssf', 'baf', 'bl')
+
+    def __init__(self, bin_width, bin_height, margin_cm=0.2, heuristic='bssf', dpi=DEFAULT_DPI):
+        if heuristic not in self.HEURISTICS:
+            raise ValueError(f"알 수 없는 배치 기준: {heuristic}")
+        self.bin_width = bin_width
+        self.bin_height = bin_height
+        self.dpi = dpi
+        self.margin_px = cm_to_px(margin_cm, dpi)
+        self.heuristic = heuristic
+        self.free_rects = [Rectangle(0, 0, bin_width, bin_height)]
+        self.placed_photos = []
+
+    def photo_size_px(self, photo):
+        """사진의 정방향 픽셀 크기"""
+        return cm_to_px(photo.width_cm, self.dpi), cm_to_px(photo.height_cm, self.dpi)
+
+    def score(self, space, fit_w, fit_h):
+        """빈 사각형에 (fit_w, fit_h)를 놓았을 때 점수 (작을수록 좋음)"""
+        leftover_w = space.width - fit_w
+        leftover_h = space.height - fit_h
+        if self.heuristic == 'bssf':
+            return (min(leftover_w, leftover_h), max(leftover_w, leftover_h))
+        if self.heuristic == 'baf':
+            return (space.area() - fit_w * fit_h, min(leftover_w, leftover_h))
+        return (space.y + fit_h, space.x)  # bl: 위쪽(작은 y) 우선, 다음은 왼쪽
+
+    def find_position(self, width, height):
+        """사진 크기(정방향)에 대해 가장 좋은 (점수, 빈 사각형, 회전 여부) 찾기 (없으면 None)"""
+        best = None
+        for rotated, (fit_w, fit_h) in ((False, (width, height)), (True, (height, width))):
+            need_w, need_h = fit_w + self.margin_px, fit_h + self.margin_px
+            for space in self.free_rects:
+                if space.width >= need_w and space.height >= need_h:
+                    score = self.score(space, need_w, need_h)
+                    if best is None or score < best[0]:
+                        best = (score, space, rotated)
+        return best
+
+    def split_free_rects(self, used):
+        """배치된 영역(used)과 겹치는 빈 사각형을 최대 4개의 빈 사각형으로 분할"""
+        new_rects = []
+        for free in self.free_rects:
+            if (used.x >= free.x + free.width or used.x + used.width <= free.x or
+                    used.y >= free.y + free.height or used.y + used.height <= free.y):
+                new_rects.append(free)
+                continue
+            if used.x > free.x:  # 왼쪽
+                new_rects.append(Rectangle(free.x, free.y, used.x - free.x, free.height))
+            if used.x + used.width < free.x + free.width:  # 오른쪽
+                right = used.x + used.width
+                new_rects.append(Rectangle(right, free.y, free.x + free.width - right, free.height))
+            if used.y > free.y:  # 위쪽
+                new_rects.append(Rectangle(free.x, free.y, free.width, used.y - free.y))
+            if used.y + used.height < free.y + free.height:  # 아래쪽
+                bottom = used.y + used.height
+                new_rects.append(Rectangle(free.x, bottom, free.width, free.y + free.height - bottom))
+        self.free_rects = self.prune_free_rects(new_rects)
+
+    @staticmethod
+    def prune_free_rects(rects):
+        """다른 빈 사각형에 완전히 포함된 사각형 제거"""
+        rects = sorted(rects, key=lambda r: r.area(), reverse=True)
+        kept = []
+        for rect in rects:
+            contained = any(
+                rect.x >= other.x and rect.y >= other.y and
+                rect.x + rect.width <= other.x + other.width and
+                rect.y + rect.height <= other.y + other.height
+                for other in kept
+            )
+            if not contained:
+                kept.append(rect)
+        return kept
+
+    def pack_photos(self, photos):
+        """배치 가능한 사진을 모두 배치 - 매번 전체 후보 중 점수가 가장 좋은 사진부터 놓음"""
+        remaining = list(photos)
+        while remaining:
+            # 같은 크기의 사진은 점수가 같으므로 크기별로 한 번만 계산 (큰 사진 우선)
+            best = None
+            for size in sorted({self.photo_size_px(p) for p in remaining},
+                               key=lambda size: size[0] * size[1], reverse=True):
+                position = self.find_position(*size)
+                if position is not None and (best is None or position[0] < best[1][0]):
+                    best = (size, position)
+            if best is None:
+                break
+
+            size, (_, space, rotated) = best
+            photo = next(p for p in remaining if self.photo_size_px(p) == size)
+            remaining.remove(photo)
+            fit_w, fit_h = (size[1], size[0]) if rotated else size
+            photo.placed_x = space.x
+            photo.placed_y = space.y
+            photo.rotated = rotated
+            photo.placed = True
+            self.placed_photos.append(photo)
+            logger.debug("✅ %s (%s) 배치 완료 - 위치: (%d, %d), 크기: %d×%dpx (%s)",
+                         photo.photo_id, photo.photo_type, space.x, space.y, fit_w, fit_h,
+                         '회전됨' if rotated else '정방향')
+            self.split_free_rects(Rectangle(space.x, space.y, fit_w + self.margin_px, fit_h + self.margin_px))
+
+        return len(self.placed_photos), self.placed_photos
+
+def create_packer(bin_width, bin_height, margin_cm=0.2, dpi=DEFAULT_DPI):
+    """설정(LAYOUT_PACKER)에 맞는 빈패킹 엔진 생성"""
+    if app.config['LAYOUT_PACKER'] == 'guillotine':
+        return BinPacker(bin_width, bin_height, margin_cm, dpi)
+    return MaxRectsPacker(bin_width, bin_height, margin_cm, app.config['LAYOUT_PACKER_HEURISTIC'], dpi)
+
+# 배치 결과 메모: 배치는 사진 종류별 개수, 여백, 용지 크기로만 정해지므로 같은 조합이면 패킹을 다시 하지 않음
+class PackingMemo:
+    """배치 결과를 기억하는 크기 제한 LRU 캐시 (적중률 통계 포함)"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """기억된 결과 반환 (없으면 None)"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """결과를 저장하고 개수 한도를 넘으면 오래된 항목부터 제거"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """메모 통계 (헬스 체크용)"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None
+            }
+
+packing_memo = PackingMemo(app.config['PACKING_MEMO_MAX_ENTRIES'])
+
+def photo_type_capacity(photo_type, bin_width, bin_height, margin_cm, dpi=DEFAULT_DPI):
+    """면적 기준으로 한 페이지에 들어갈 수 있는 최대 장수 (실제로 들어가는 장수 이상)"""
+    margin_px = cm_to_px(margin_cm, dpi)
+    width_cm, height_cm = PHOTO_TYPE_CM[photo_type]
+    tile_area = (cm_to_px(width_cm, dpi) + margin_px) * (cm_to_px(height_cm, dpi) + margin_px)
+    return (bin_width + margin_px) * (bin_height + margin_px) // tile_area
+
+def packing_memo_key(bin_width, bin_height, margin_cm, construction_count, document_count, dpi=DEFAULT_DPI):
+    """배치 메모 키 - 면적상 한 페이지에 못 들어가는 초과분은 배치 결과를 바꾸지 않으므로 개수를 잘라서 사용"""
+    return (
+        'pack', app.config['LAYOUT_PACKER'], app.config['LAYOUT_PACKER_HEURISTIC'],
+        bin_width, bin_height, margin_cm, dpi,
+        min(construction_count, photo_type_capacity('construction', bin_width, bin_height, margin_cm, dpi)),
+        min(document_count, photo_type_capacity('document', bin_width, bin_height, margin_cm, dpi))
+    )
+
+def pack_photos_memoized(bin_width, bin_height, photos, margin_cm=0.2, dpi=DEFAULT_DPI):
+    """create_packer(...).pack_photos(photos)와 같은 결과 - 같은 종류별 개수 조합은 메모에서 바로 적용
+    
+    두 엔진 모두 같은 종류의 사진은 입력 순서대로 배치하므로 (종류, 종류 내 순번, 위치, 회전)으로 기억
+    """
+    with metrics.span('packing'):
+        by_type = {'construction': [], 'document': []}
+        for photo in photos:
+            by_type[photo.photo_type].append(photo)
+        key = packing_memo_key(bin_width, bin_height, margin_cm,
+                               len(by_type['construction']), len(by_type['document']), dpi)
+    
+        placements = packing_memo.get(key)
+        if placements is None:
+            _, placed_photos = create_packer(bin_width, bin_height, margin_cm, dpi).pack_photos(photos)
+            placements = tuple(
+                (photo.photo_type, by_type[photo.photo_type].index(photo), photo.placed_x, photo.placed_y, photo.rotated)
+                for photo in placed_photos
+            )
+            packing_memo.put(key, placements)
+            return len(placed_photos), placed_photos
+    
+        placed_photos = []
+        for photo_type, ordinal, x, y, rotated in placements:
+            photo = by_type[photo_type][ordinal]
+            photo.placed_x, photo.placed_y, photo.rotated, photo.placed = x, y, rotated, True
+            placed_photos.append(photo)
+        return len(placed_photos), placed_photos
+
+def warm_packing_memo():
+    """가로/세로 A4에서 나올 수 있는 모든 종류별 개수 조합과 그리드 계산을 미리 채움"""
+    started = time.time()
+    for bin_width, bin_height in [(cm_to_px(29.7), cm_to_px(21.0)), (cm_to_px(21.0), cm_to_px(29.7))]:
+        for construction_count in range(photo_type_capacity('construction', bin_width, bin_height, 0.2) + 1):
+            for document_count in range(photo_type_capacity('document', bin_width, bin_height, 0.2) + 1):
+                photos = create_photo_objects([None] * construction_count, [None] * document_count)
+                pack_photos_memoized(bin_width, bin_height, photos, margin_cm=0.2)
+    for photo_type in ('construction', 'document'):
+        for a4_width_cm, a4_height_cm in [(29.7, 21.0), (21.0, 29.7)]:
+            calculate_grid_layout(photo_type, a4_width_cm, a4_height_cm)
+    # 미리 채운 조회는 적중률 통계에서 제외
+    packing_memo.hits = packing_memo.misses = 0
+    logger.info("배치 메모 준비: %d개 조합 (%.2f초)", packing_memo.stats()['entries'], time.time() - started)
+
+# 배치 템플릿 표: 사진 크기가 두 가지뿐이므로 (시공사진 수, 대문사진 수) 조합별 페이지 배치를 미리 계산해두고
+# 요청 처리 중에는 표에서 찾기만 함 (빈패킹/그리드 계산 생략). 전체 배치 최적화는 표의 최대 조합(패턴)으로
+# 전체 사진을 덮는 최소 페이지 수의 조합을 선택
+PHOTO_TYPE_CM = {'construction': CONSTRUCTION_CM, 'document': DOCUMENT_CM}
+LAYOUT_TEMPLATE_VERSION = 1
+
+def pack_page_pattern(construction_count, document_count, bin_width, bin_height, margin_cm=0.2, dpi=DEFAULT_DPI):
+    """시공사진/대문사진 개수 조합이 한 페이지에 모두 들어가는지 MaxRects 기준별로 시도
+    
+    반환: [(사진 종류, x, y, 회전 여부), ...] 배치 목록 (들어가지 않으면 None)
+    """
+    for heuristic in MaxRectsPacker.HEURISTICS:
+        photos = [Photo(f"{photo_type}_{i}", *PHOTO_TYPE_CM[photo_type], photo_type)
+                  for photo_type, count in (('construction', construction_count), ('document', document_count))
+                  for i in range(count)]
+        placed_count, placed_photos = MaxRectsPacker(
+            bin_width, bin_height, margin_cm, heuristic, dpi
+        ).pack_photos(photos)
+        if placed_count == len(photos):
+            return [(p.photo_type, p.placed_x, p.placed_y, p.rotated) for p in placed_photos]
+    return None
+
+def tiles_fit(tiles, bin_width, bin_height):
+    """타일이 모두 용지 안에 있는지 확인"""
+    return all(x >= 0 and y >= 0 and x + width <= bin_width and y + height <= bin_height
+               for _, x, y, width, height, _ in tiles)
+
+def construction_template_tiles(count, bin_width, bin_height, dpi=DEFAULT_DPI):
+    """arrange_construction_photos_landscape와 같은 배치 (construction_landscape_slots의 앞쪽 count자리)"""
+    (photo_w_px, photo_h_px), slots = construction_landscape_slots(bin_width, dpi)
+    if count > len(slots):
+        return None
+    tiles = [
+        ('construction', x, y, *((photo_h_px, photo_w_px) if rotated else (photo_w_px, photo_h_px)), rotated)
+        for x, y, rotated in slots[:count]
+    ]
+    return tiles if tiles_fit(tiles, bin_width, bin_height) else None
+
+def document_template_tiles(count, bin_width, bin_height, dpi=DEFAULT_DPI):
+    """arrange_multiple_document_photos(가로)와 같은 배치 (document_landscape_slots의 앞쪽 count자리)"""
+    (document_width_px, document_height_px), slots, spacing = document_landscape_slots(bin_width, bin_height, dpi)
+    if count > len(slots):
+        return None
+    tiles = [('document', x, y, document_width_px, document_height_px, False) for x, y in slots[:count]]
+    return tiles if spacing >= 0 and tiles_fit(tiles, bin_width, bin_height) else None
+
+class LayoutTemplateTable:
+    """(시공사진 수, 대문사진 수) → 페이지 타일 배치 [(사진 종류, x, y, 너비, 높이, 회전 여부), ...]
+    
+    너비/높이는 회전이 적용된 뒤 페이지에서 차지하는 크기
+    """
+
+    def __init__(self, signature, templates):
+        self.signature = signature
+        self.templates = templates
+        # 다른 조합에 포함되지 않는 최대 조합 (전체 배치 최적화의 페이지 패턴)
+        self.maximal = sorted(
+            size for size in templates
+            if not any(other != size and other[0] >= size[0] and other[1] >= size[1] for other in templates)
+        )
+
+    def get(self, construction_count, document_count):
+        """조합의 타일 배치 (한 페이지에 들어가지 않으면 None)"""
+        return self.templates.get((construction_count, document_count))
+
+    def patterns(self):
+        """최대 조합 목록 [{'construction': n, 'document': m, 'tiles': [...]}, ...]"""
+        return [{'construction': c, 'document': d, 'tiles': self.templates[(c, d)]} for c, d in self.maximal]
+
+    @staticmethod
+    def signature_for(bin_width, bin_height, margin_cm, dpi=DEFAULT_DPI):
+        """템플릿 계산 조건 (저장된 표를 다시 쓸 수 있는지 비교하는 용도)"""
+        return {
+            'version': LAYOUT_TEMPLATE_VERSION,
+            'bin': [bin_width, bin_height],
+            'margin_cm': margin_cm,
+            'dpi': dpi,
+            'photo_cm': {photo_type: list(size) for photo_type, size in PHOTO_TYPE_CM.items()}
+        }
+
+    @classmethod
+    def build(cls, bin_width, bin_height, margin_cm=0.2, dpi=DEFAULT_DPI, deadline=None):
+        """가능한 모든 조합의 배치 계산 - 한 종류만 있으면 기존 전용 배치, 아니면 MaxRects
+        
+        deadline(time.perf_counter 기준)을 주면 그때까지 끝나지 않을 경우 None 반환
+        (큰 용지는 조합 수가 많고 조합마다 빈패킹을 하므로 수십 초가 걸릴 수 있음)
+        """
+        margin_px = cm_to_px(margin_cm, dpi)
+        page_area = (bin_width + margin_px) * (bin_height + margin_px)
+        def tile_area(photo_type):
+            width_cm, height_cm = PHOTO_TYPE_CM[photo_type]
+            return (cm_to_px(width_cm, dpi) + margin_px) * (cm_to_px(height_cm, dpi) + margin_px)
+        
+        templates = {}
+        bounds = []
+        for construction_count in range(page_area // tile_area('construction') + 1):
+            free_area = page_area - construction_count * tile_area('construction')
+            for document_count in range(free_area // tile_area('document') + 1):
+                if construction_count + document_count == 0:
+                    continue
+                if deadline is not None and time.perf_counter() > deadline:
+                    return None
+                bounds.append((construction_count, document_count))
+                tiles = None
+                if document_count == 0:
+                    tiles = construction_template_tiles(construction_count, bin_width, bin_height, dpi)
+                elif construction_count == 0:
+                    tiles = document_template_tiles(document_count, bin_width, bin_height, dpi)
+                if tiles is None:
+                    placements = pack_page_pattern(
+                        construction_count, document_count, bin_width, bin_height, margin_cm, dpi
+                    )
+                    if placements is not None:
+                        tiles = []
+                        for photo_type, x, y, rotated in placements:
+                            width, height = (cm_to_px(cm, dpi) for cm in PHOTO_TYPE_CM[photo_type])
+                            tiles.append((photo_type, x, y, height, width, True) if rotated
+                                         else (photo_type, x, y, width, height, False))
+                if tiles is not None:
+                    templates[(construction_count, document_count)] = tiles
+        
+        # 직접 계산이 안 된 작은 조합은 들어가는 큰 조합에서 자리를 비워서 채움
+        for construction_count, document_count in bounds:
+            if (construction_count, document_count) in templates:
+                continue
+            for (c, d), tiles in sorted(templates.items()):
+                if c >= construction_count and d >= document_count:
+                    construction_tiles = [t for t in tiles if t[0] == 'construction'][:construction_count]
+                    document_tiles = [t for t in tiles if t[0] == 'document'][:document_count]
+                    templates[(construction_count, document_count)] = construction_tiles + document_tiles
+                    break
+        
+        return cls(cls.signature_for(bin_width, bin_height, margin_cm, dpi), templates)
+
+    def to_json(self):
+        return {
+            'signature': self.signature,
+            'templates': [
+                {'construction': c, 'document': d, 'tiles': [list(tile) for tile in tiles]}
+                for (c, d), tiles in sorted(self.templates.items())
+            ]
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        templates = {
+            (entry['construction'], entry['document']): [tuple(tile) for tile in entry['tiles']]
+            for entry in data['templates']
+        }
+        return cls(data['signature'], templates)
+
+def load_layout_templates(bin_width, bin_height, margin_cm=0.2, path=None):
+    """저장된 템플릿 표(300 DPI)를 읽고, 없거나 계산 조건이 다르면 새로 계산해서 저장"""
+    path = path or app.config['LAYOUT_TEMPLATES_PATH']
+    signature = LayoutTemplateTable.signature_for(bin_width, bin_height, margin_cm)
+    try:
+        with open(path, encoding='utf-8') as f:
+            table = LayoutTemplateTable.from_json(json.load(f))
+        if table.signature == signature:
+            return table
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    
+    table = LayoutTemplateTable.build(bin_width, bin_height, margin_cm)
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # 여러 워커가 동시에 시작해도 읽는 쪽이 쓰다 만 파일을 보지 않도록 임시 파일에 쓰고 교체
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(table.to_json(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        logger.info("배치 템플릿 표 생성: 조합 %d개, 최대 조합 %s", len(table.templates), table.maximal)
+    except OSError as e:
+        logger.warning("배치 템플릿 표 저장 실패 (메모리에서만 사용): %s", e)
+    return table
+
+# 가로 A4 300 DPI 배치 템플릿 (세로 용지는 가로로 배치한 뒤 회전)
+layout_templates = None if TILE_POOL_CHILD else load_layout_templates(
+    *PAPER_PROFILES['A4'].size_px('landscape'), margin_cm=0.2
+)
+
+# 기본(A4, 300 DPI)이 아닌 용지/DPI의 템플릿 표 - 배치 메모와 따로 두어 적중률 통계에 섞이거나
+# 많은 배치 결과에 밀려 제거되지 않게 함 (표 하나가 크므로 최근에 쓴 몇 개만 보관)
+LAYOUT_TEMPLATE_CACHE_ENTRIES = 16
+layout_template_cache = PackingMemo(LAYOUT_TEMPLATE_CACHE_ENTRIES)
+
+def get_layout_templates(bin_width, bin_height, dpi=DEFAULT_DPI, margin_cm=0.2):
+    """용지/DPI에 맞는 템플릿 표 - 기본(A4, 300 DPI)은 저장된 표, 나머지는 처음 쓸 때 계산해서 템플릿 표 캐시에 보관
+    
+    LAYOUT_TEMPLATE_BUDGET_MS 안에 계산이 끝나지 않으면 None (그 결과도 기억해서 다음 요청은 바로 None)
+    """
+    signature = LayoutTemplateTable.signature_for(bin_width, bin_height, margin_cm, dpi)
+    if signature == layout_templates.signature:
+        return layout_templates
+    key = (bin_width, bin_height, margin_cm, dpi)
+    table = layout_template_cache.get(key)
+    if table is None:
+        budget_seconds = app.config['LAYOUT_TEMPLATE_BUDGET_MS'] / 1000
+        table = LayoutTemplateTable.build(
+            bin_width, bin_height, margin_cm, dpi, deadline=time.perf_counter() + budget_seconds
+        )
+        if table is None:
+            logger.warning("배치 템플릿 표 계산 시간 초과 (%d×%d, %d DPI): 페이지별 순차 배치로 계획",
+                           bin_width, bin_height, dpi)
+            table = False
+        layout_template_cache.put(key, table)
+    return table or None
+
+def plan_greedy_pages(construction_count, document_count, bin_width, bin_height, dpi=DEFAULT_DPI, margin_cm=0.2):
+    """템플릿 표가 없을 때의 계획: 페이지마다 남은 사진을 빈패킹 엔진(LAYOUT_PACKER)으로 채움
+    
+    반환: [(시공사진 수, 대문사진 수, 타일 자리 목록), ...] (시공사진부터 채우므로 기존 순차 배치와 같은 순서)
+    """
+    capacity = {photo_type: photo_type_capacity(photo_type, bin_width, bin_height, margin_cm, dpi)
+                for photo_type in PHOTO_TYPE_CM}
+    left = {'construction': construction_count, 'document': document_count}
+    pages = []
+    while left['construction'] or left['document']:
+        # 면적상 한 페이지에 들어갈 수 있는 만큼만 후보로 넘김
+        photos = [Photo(f"{photo_type}_{i}", *PHOTO_TYPE_CM[photo_type], photo_type)
+                  for photo_type in ('construction', 'document')
+                  for i in range(min(left[photo_type], capacity[photo_type]))]
+        _, placed_photos = create_packer(bin_width, bin_height, margin_cm, dpi).pack_photos(photos)
+        if not placed_photos:
+            raise LayoutError("사진이 용지에 들어가지 않습니다.")
+        tiles = []
+        for photo in placed_photos:
+            width, height = (cm_to_px(cm, dpi) for cm in PHOTO_TYPE_CM[photo.photo_type])
+            tiles.append((photo.photo_type, photo.placed_x, photo.placed_y, height, width, True) if photo.rotated
+                         else (photo.photo_type, photo.placed_x, photo.placed_y, width, height, False))
+        page_construction = sum(1 for tile in tiles if tile[0] == 'construction')
+        page_document = len(tiles) - page_construction
+        pages.append((page_construction, page_document, tiles))
+        left['construction'] -= page_construction
+        left['document'] -= page_document
+    return pages
+
+def plan_layout_pages(construction_count, document_count, patterns, budget_seconds):
+    """전체 사진을 덮는 페이지별 (시공사진 수, 대문사진 수) 목록 - 페이지 수 최소화
+    
+    동적 계획법으로 최소 페이지 수를 구하고, 시간 예산을 넘기면 패턴 두 가지 조합 중 최선으로 전환
+    반환: (페이지 목록, 'optimal' 또는 'approximate')
+    """
+    deadline = time.perf_counter() + budget_seconds
+    sizes = [(p['construction'], p['document']) for p in patterns]
+    
+    # pages[c][d]: 시공사진 c장, 대문사진 d장을 배치하는 최소 페이지 수, choice[c][d]: 그때 첫 페이지 패턴
+    pages = [[0] * (document_count + 1) for _ in range(construction_count + 1)]
+    choice = [[None] * (document_count + 1) for _ in range(construction_count + 1)]
+    completed = True
+    for c in range(construction_count + 1):
+        if time.perf_counter() > deadline:
+            completed = False
+            break
+        row, row_choice = pages[c], choice[c]
+        for d in range(document_count + 1):
+            if c == 0 and d == 0:
+                continue
+            best = None
+            for pattern_c, pattern_d in sizes:
+                if (pattern_c == 0 or c == 0) and (pattern_d == 0 or d == 0):
+                    continue  # 남은 사진을 하나도 줄이지 못하는 패턴
+                rest = pages[max(c - pattern_c, 0)][max(d - pattern_d, 0)]
+                if best is None or rest < best[0]:
+                    best = (rest, (pattern_c, pattern_d))
+            row[d] = best[0] + 1
+            row_choice[d] = best[1]
+    
+    plan = []
+    c, d = construction_count, document_count
+    if completed:
+        while c > 0 or d > 0:
+            pattern_c, pattern_d = choice[c][d]
+            plan.append((min(pattern_c, c), min(pattern_d, d)))
+            c, d = max(c - pattern_c, 0), max(d - pattern_d, 0)
+        return plan, 'optimal'
+    
+    # 시간 예산 초과: 패턴 두 가지의 조합만 고려 (선형 계획의 최적해는 패턴 두 개로 구성되므로 근사가 좋음)
+    best = None
+    for first_c, first_d in sizes:
+        for second_c, second_d in sizes:
+            first_max = max(-(-construction_count // first_c) if first_c else 0,
+                            -(-document_count // first_d) if first_d else 0)
+            for first_pages in range(first_max + 1):
+                left_c = max(construction_count - first_pages * first_c, 0)
+                left_d = max(document_count - first_pages * first_d, 0)
+                if (left_c and not second_c) or (left_d and not second_d):
+                    continue
+                second_pages = max(-(-left_c // second_c) if second_c else 0,
+                                   -(-left_d // second_d) if second_d else 0)
+                total = first_pages + second_pages
+                if best is None or total < best[0]:
+                    best = (total, [((first_c, first_d), first_pages), ((second_c, second_d), second_pages)])
+    for (pattern_c, pattern_d), count in best[1]:
+        for _ in range(count):
+            if c == 0 and d == 0:
+                break
+            plan.append((min(pattern_c, c), min(pattern_d, d)))
+            c, d = max(c - pattern_c, 0), max(d - pattern_d, 0)
+    return plan, 'approximate'
+
+def render_template_page(tiles, construction_ids, document_ids, construction_images, document_images,
+                         bin_width, bin_height, paper_orientation='landscape'):
+    """템플릿 타일 배치(가로 용지 기준)대로 페이지 생성 (종류별 자리에 앞에서부터 사진 배정)
+    
+    세로 용지는 페이지를 회전하지 않고 타일 자리와 회전 각도를 바꿔서 세로 캔버스에 바로 붙임
+    """
+    ids = {'construction': construction_ids, 'document': document_ids}
+    sources = {
+        'construction': [construction_images[i] for i in construction_ids],
+        'document': [document_images[i] for i in document_ids]
+    }
+    used = {'construction': 0, 'document': 0}
+    tile_requests = []
+    positions = []
+    for photo_type, x, y, width, height, rotated in tiles:
+        img_data = sources[photo_type][used[photo_type]]
+        photo_id = f"{photo_type}_{ids[photo_type][used[photo_type]]}"
+        used[photo_type] += 1
+        x, y, width, height, rotation = orient_tile_position(
+            int(x), int(y), width, height, rotated, bin_width, paper_orientation
+        )
+        logger.debug("   %s: %d×%d (%d도 회전) → (%d, %d)", photo_id, width, height, rotation, x, y)
+        # 타일은 정방향 크기로 리사이징한 뒤 회전하므로 90/270도 회전된 자리는 너비/높이를 바꿔서 요청
+        tile_width, tile_height = (height, width) if rotation in (90, 270) else (width, height)
+        tile_requests.append((img_data, tile_width, tile_height, rotation))
+        positions.append((x, y))
+    
+    if paper_orientation == 'portrait':
+        bin_width, bin_height = bin_height, bin_width
+    tiles = render_tiles(tile_requests)
+    with metrics.span('paste'):
+        page_image = Image.new('RGB', (bin_width, bin_height), 'white')
+        for position, tile in zip(positions, tiles):
+            page_image.paste(tile, position)
+            tile.close()
+    return page_image
+
+def plan_global_layout(construction_count, document_count, paper=None, dpi=DEFAULT_DPI):
+    """전체 배치 최적화 계획: 페이지별 사진 번호와 타일 자리 (가로 방향 용지 기준, JSON으로 저장 가능)
+    
+    세로 용지는 렌더링한 뒤 회전하므로 같은 계획으로 두 방향 모두 만들 수 있음
+    """
+    paper = paper or PAPER_PROFILES['A4']
+    bin_width, bin_height = paper.size_px('landscape', dpi)
+    with metrics.span('packing'):
+        templates = get_layout_templates(bin_width, bin_height, dpi)
+        if templates is None:
+            planned = plan_greedy_pages(construction_count, document_count, bin_width, bin_height, dpi)
+            method = 'greedy'
+        else:
+            plan, method = plan_layout_pages(
+                construction_count, document_count, templates.patterns(),
+                app.config['LAYOUT_OPTIMIZER_BUDGET_MS'] / 1000
+            )
+            # 시공사진이 많은 페이지부터 (기존 배치 순서와 같이 시공사진 → 혼합 → 대문사진)
+            plan.sort(key=lambda size: (-size[0], -size[1]))
+            planned = [(c, d, templates.get(c, d)) for c, d in plan]
+    logger.info("전체 배치 계획 (%s): %d페이지 %s", method, len(planned), [(c, d) for c, d, _ in planned])
+    
+    pages = []
+    next_construction = 0
+    next_document = 0
+    for page_construction, page_document, tiles in planned:
+        pages.append({
+            'construction_ids': list(range(next_construction, next_construction + page_construction)),
+            'document_ids': list(range(next_document, next_document + page_document)),
+            'tiles': [list(tile) for tile in tiles]
+        })
+        next_construction += page_construction
+        next_document += page_document
+    return {'paper': paper.to_dict(), 'dpi': dpi, 'method': method, 'pages': pages}
+
+def scale_layout_tiles(tiles, plan_dpi, dpi, bin_width, bin_height):
+    """계획 해상도의 타일 자리를 다른 해상도로 환산 (타일 크기는 그 해상도의 사진 크기, 위치는 비례)"""
+    if dpi == plan_dpi:
+        return tiles
+    scaled = []
+    for photo_type, x, y, _, _, rotated in tiles:
+        width, height = (cm_to_px(cm, dpi) for cm in PHOTO_TYPE_CM[photo_type])
+        if rotated:
+            width, height = height, width
+        # 반올림 차이로 용지 밖으로 밀려나지 않도록 경계 안으로 제한
+        x = max(0, min(int(x * dpi / plan_dpi), bin_width - width))
+        y = max(0, min(int(y * dpi / plan_dpi), bin_height - height))
+        scaled.append((photo_type, x, y, width, height, rotated))
+    return scaled
+
+def iter_planned_layout_pages(layout_plan, construction_images, document_images, paper_orientation='portrait',
+                              dpi=None):
+    """배치 계획대로 페이지를 한 장씩 만들어 yield - dpi를 주면 그 해상도로 환산 (다시 배치하지 않음)"""
+    plan_dpi = layout_plan['dpi']
+    dpi = dpi or plan_dpi
+    paper = PaperProfile.from_dict(layout_plan['paper'])
+    bin_width, bin_height = paper.size_px('landscape', dpi)
+    
+    for page_num, page in enumerate(layout_plan['pages'], 1):
+        construction_ids, document_ids = page['construction_ids'], page['document_ids']
+        page_image = render_template_page(
+            scale_layout_tiles(page['tiles'], plan_dpi, dpi, bin_width, bin_height),
+            construction_ids, document_ids, construction_images, document_images, bin_width, bin_height,
+            paper_orientation
+        )
+        logger.debug("페이지 %d 완성 - 시공사진 %d장, 대문사진 %d장", page_num, len(construction_ids), len(document_ids))
+        yield page_image, len(construction_ids), len(document_ids)
+        page_image = None
+
+def iter_global_layout_pages(construction_images, document_images, paper_orientation='portrait',
+                             paper=None, dpi=DEFAULT_DPI):
+    """전체 배치 최적화 모드: 템플릿 표로 페이지 계획을 먼저 세운 뒤 페이지를 한 장씩 만들어 yield"""
+    layout_plan = plan_global_layout(len(construction_images), len(document_images), paper, dpi)
+    yield from iter_planned_layout_pages(layout_plan, construction_images, document_images, paper_orientation)
+
 def create_photo_objects(construction_images, document_images):
     """업로드된 이미지를 Photo 객체로 변환"""
     photos = []
@@ -1369,36 +4507,37 @@ def create_photo_objects(construction_images, document_images):
     return photos
 
 def optimize_a4_orientation(photos, margin_cm=0.2):
-    """A4 용지 방향 최적화"""
+    """A4 용지 방향 최적화 → (방향, 배치된 장수, 배치된 사진 복사본)"""
     # A4 크기 (cm)
     A4_W, A4_H = 21.0, 29.7
     
     # 세로 A4 시도
-    portrait_packer = BinPacker(cm_to_px(A4_W), cm_to_px(A4_H), margin_cm)
-    portrait_count, portrait_placed = portrait_packer.pack_photos([
+    portrait_count, portrait_placed = pack_photos_memoized(cm_to_px(A4_W), cm_to_px(A4_H), [
         Photo(p.photo_id, p.width_cm, p.height_cm, p.photo_type) 
         for p in photos
-    ])
+    ], margin_cm)
     
     # 가로 A4 시도
-    landscape_packer = BinPacker(cm_to_px(A4_H), cm_to_px(A4_W), margin_cm)
-    landscape_count, landscape_placed = landscape_packer.pack_photos([
+    landscape_count, landscape_placed = pack_photos_memoized(cm_to_px(A4_H), cm_to_px(A4_W), [
         Photo(p.photo_id, p.width_cm, p.height_cm, p.photo_type) 
         for p in photos
-    ])
+    ], margin_cm)
     
     # 더 많이 배치된 방향 선택
     if landscape_count > portrait_count:
-        return 'landscape', landscape_packer, landscape_placed
+        return 'landscape', landscape_count, landscape_placed
     else:
-        return 'portrait', portrait_packer, portrait_placed
+        return 'portrait', portrait_count, portrait_placed
 
-def create_optimized_layout_image(photos, placed_photos, orientation, construction_images, document_images):
-    """최적화된 배치로 A4 이미지 생성"""
-    if orientation == 'landscape':
-        a4_width, a4_height = cm_to_px(29.7), cm_to_px(21.0)
-    else:
-        a4_width, a4_height = cm_to_px(21.0), cm_to_px(29.7)
+def create_optimized_layout_image(photos, placed_photos, orientation, construction_images, document_images,
+                                  dpi=DEFAULT_DPI):
+    """최적화된 배치로 A4 이미지 생성
+    
+    배치 좌표는 가로 A4 기준 - 세로(orientation='portrait')는 페이지를 회전하지 않고
+    타일 자리와 회전 각도를 바꿔서 세로 캔버스에 바로 붙임
+    """
+    bin_width = PAPER_PROFILES['A4'].size_px('landscape', dpi)[0]
+    a4_width, a4_height = PAPER_PROFILES['A4'].size_px(orientation, dpi)
     
     # A4 캔버스 생성
     layout_image = Image.new('RGB', (a4_width, a4_height), 'white')
@@ -1410,59 +4549,51 @@ def create_optimized_layout_image(photos, placed_photos, orientation, constructi
     for i, img_data in enumerate(document_images):
         image_map[f"document_{i}"] = img_data
     
-    # 배치된 사진들을 캔버스에 그리기
+    # === 1단계: 배치된 사진별 타일 요청 목록 (정방향 고정 크기 + 회전 각도) ===
+    tile_requests = []
+    tile_photos = []
+    positions = []
     for placed_photo in placed_photos:
         if placed_photo.photo_id in image_map:
-            print(f"🖼️  {placed_photo.photo_id} 이미지 생성 중...")
-            
-            # === 1단계: 원본 이미지 로드 ===
-            img_data = image_map[placed_photo.photo_id]
-            image = Image.open(io.BytesIO(img_data))
-            
-            # === 2단계: 정방향으로 고정 크기 리사이징 ===
             if placed_photo.photo_type == 'construction':
-                target_w_px, target_h_px = cm_to_px(9.0), cm_to_px(11.0)
-                print(f"   시공사진 정방향 리사이징: {target_w_px}×{target_h_px}px")
+                target_w_px, target_h_px = cm_to_px(9.0, dpi), cm_to_px(11.0, dpi)
             else:  # document
-                target_w_px, target_h_px = cm_to_px(11.4), cm_to_px(15.2)
-                print(f"   대문사진 정방향 리사이징: {target_w_px}×{target_h_px}px")
-            
-            # 정방향으로 리사이징 (항상 같은 크기)
-            resized_image = resize_to_exact_size(image, target_w_px, target_h_px)
-            print(f"   ✅ 1단계 리사이징 완료: {resized_image.size}")
-            
-            # === 3단계: 필요시 회전 처리 ===
-            if placed_photo.rotated:
-                rotated_image = resized_image.rotate(90, expand=True)
-                print(f"   🔄 2단계 회전 완료: {resized_image.size} → {rotated_image.size}")
-                resized_image.close()  # 메모리 정리
-                final_image = rotated_image
-            else:
-                print(f"   ➡️  회전 없음: {resized_image.size} 유지")
-                final_image = resized_image
-            
-            # === 4단계: 캔버스에 배치 ===
-            x, y = int(placed_photo.placed_x), int(placed_photo.placed_y)
-            print(f"   배치 위치: ({x}, {y})")
-            print(f"   최종 이미지 크기: {final_image.size}")
+                target_w_px, target_h_px = cm_to_px(11.4, dpi), cm_to_px(15.2, dpi)
+            placed_w_px, placed_h_px = (
+                (target_h_px, target_w_px) if placed_photo.rotated else (target_w_px, target_h_px)
+            )
+            x, y, _, _, rotation = orient_tile_position(
+                int(placed_photo.placed_x), int(placed_photo.placed_y), placed_w_px, placed_h_px,
+                placed_photo.rotated, bin_width, orientation
+            )
+            tile_requests.append((image_map[placed_photo.photo_id], target_w_px, target_h_px, rotation))
+            tile_photos.append(placed_photo)
+            positions.append((x, y))
+    
+    # === 2단계: 디코딩 + 리사이징 + 회전 (캐시 적중 제외, 프로세스 풀에서 병렬 처리) ===
+    logger.debug("🖼️  타일 %d개 준비 중...", len(tile_requests))
+    tiles = render_tiles(tile_requests)
+    
+    # === 3단계: 캔버스에 배치 ===
+    with metrics.span('paste'):
+        for placed_photo, (x, y), final_image in zip(tile_photos, positions, tiles):
+            logger.debug("   %s: %s (%s) → (%d, %d)", placed_photo.photo_id, final_image.size,
+                         '회전' if placed_photo.rotated else '정방향', x, y)
             
             # 캔버스 경계 확인
             if x + final_image.width <= a4_width and y + final_image.height <= a4_height:
                 layout_image.paste(final_image, (x, y))
-                print(f"   ✅ 성공적으로 배치됨")
             else:
-                print(f"   ⚠️ 경계를 벗어남: A4 크기 {a4_width}×{a4_height}, 필요 공간: {x + final_image.width}×{y + final_image.height}")
+                logger.warning("경계를 벗어남: A4 크기 %d×%d, 필요 공간: %d×%d",
+                               a4_width, a4_height, x + final_image.width, y + final_image.height)
             
             # 메모리 정리
-            image.close()
             final_image.close()
     
     return layout_image
 
-def resize_to_exact_size(image, target_width, target_height):
-    """이미지를 정확한 크기로 리사이징 (비율 유지하고 크롭)"""
-    original_width, original_height = image.size
-    target_ratio = target_width / target_height
+def calculate_center_crop_box(original_width, original_height, target_ratio):
+    """목표 비율에 맞는 중앙 크롭 영역 계산"""
     original_ratio = original_width / original_height
     
     if original_ratio > target_ratio:
@@ -1482,12 +4613,50 @@ def resize_to_exact_size(image, target_width, target_height):
         right = original_width
         bottom = top + new_height
     
-    # 크롭 후 리사이징
-    cropped = image.crop((left, top, right, bottom))
-    resized = cropped.resize((target_width, target_height), Image.Resampling.LANCZOS)
-    cropped.close()
+    return left, top, right, bottom
+
+def draft_request_size(width, height, target_width, target_height):
+    """가운데 크롭 후에도 목표 크기 이상이 남도록 draft에 요청할 디코딩 크기"""
+    left, top, right, bottom = calculate_center_crop_box(width, height, target_width / target_height)
+    return -(-width * target_width // max(1, right - left)), -(-height * target_height // max(1, bottom - top))
+
+def jpeg_draft_size(width, height, target_width, target_height):
+    """draft_for_size로 디코딩했을 때의 JPEG 픽셀 크기 (Pillow와 같은 규칙: 요청 크기 이상인 가장 큰 1/8, 1/4, 1/2 배율)"""
+    request_width, request_height = draft_request_size(width, height, target_width, target_height)
+    ratio = min(width // request_width, height // request_height)
+    scale = next((s for s in (8, 4, 2) if ratio >= s), 1)
+    return (width + scale - 1) // scale, (height + scale - 1) // scale
+
+def draft_for_size(image, target_width, target_height):
+    """아직 디코딩되지 않은 JPEG: 크롭 후에도 목표 크기 이상이 남는 가장 큰 DCT 축소 배율(1/2, 1/4, 1/8)로 디코딩하도록 설정"""
+    if image.format == 'JPEG' and image.tile:
+        image.draft(None, draft_request_size(image.width, image.height, target_width, target_height))
+
+def resize_to_exact_size(image, target_width, target_height):
+    """이미지를 정확한 크기로 리사이징 (비율 유지하고 크롭)
+    
+    아직 디코딩되지 않은 JPEG는 draft 모드로 필요한 만큼만 축소 디코딩하므로
+    같은 Image 객체를 더 큰 크기로 다시 리사이징하는 용도로 재사용하면 안 됨
+    """
+    target_ratio = target_width / target_height
+    draft_for_size(image, target_width, target_height)
     
-    return resized
+    crop_box = calculate_center_crop_box(image.width, image.height, target_ratio)
+    
+    # 크롭 영역만 리사이징 (중간 크롭 이미지 복사 생략)
+    # 다른 포맷은 전체 디코딩 후 reduce()로 정수배 축소를 먼저 적용해 LANCZOS 비용 절감
+    return image.resize(
+        (target_width, target_height),
+        Image.Resampling.LANCZOS,
+        box=crop_box,
+        reducing_gap=3.0
+    )
+
+# 시작 시 인덱스가 없는 이전 결과 파일 등록 (워커 간 공유 저장소에 한 번만 수행)
+if not TILE_POOL_CHILD:
+    rebuild_artifact_index()
+    if app.config['PACKING_MEMO_WARMUP']:
+        warm_packing_memo()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001, debug=True) 
\ No newline at end of file
@@ -0,0 +1,112 @@
+"""resize_to_exact_size 전체 디코딩 vs JPEG draft 디코딩 비교 벤치마크
+
+사용법:
+    python benchmarks/bench_draft_decode.py [--count 12] [--width 4000] [--height 3000]
+
+각 모드는 별도 프로세스에서 실행해서 최대 RSS를 따로 측정합니다.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PIL import Image
+
+# 시공사진 / 대문사진 타일 크기 (300 DPI)
+TILE_SIZES = [(1062, 1299), (1346, 1795)]
+
+
+def make_corpus(folder, count, width, height):
+    """현장 사진과 비슷한 크기의 JPEG 생성 (노이즈 + 그라디언트)"""
+    paths = []
+    for i in range(count):
+        noise = Image.effect_noise((width, height), 40 + i)
+        gradient = Image.linear_gradient('L').resize((width, height))
+        image = Image.merge('RGB', (noise, gradient, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+        path = os.path.join(folder, f'photo_{i}.jpg')
+        image.save(path, 'JPEG', quality=92)
+        paths.append(path)
+    return paths
+
+
+def peak_rss_mb():
+    """현재 프로세스의 최대 RSS (MB)
+
+    ru_maxrss는 fork/exec 이전 부모 프로세스의 값을 물려받으므로 리눅스에서는 VmHWM 사용
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(mode, tile_size, paths):
+    """한 가지 모드/타일 크기로 전체 코퍼스를 처리하고 결과를 JSON으로 출력 (하위 프로세스)"""
+    from app import resize_to_exact_size
+
+    target_width, target_height = tile_size
+    start = time.perf_counter()
+    for path in paths:
+        with Image.open(path) as image:
+            if mode == 'full':
+                image.load()  # 디코딩을 먼저 해서 draft 경로를 비활성화
+            resized = resize_to_exact_size(image, target_width, target_height)
+            resized.close()
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        'mode': mode,
+        'tile_size': list(tile_size),
+        'tiles': len(paths),
+        'seconds': round(elapsed, 3),
+        'ms_per_tile': round(elapsed * 1000 / len(paths), 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1)
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=12)
+    parser.add_argument('--width', type=int, default=4000)
+    parser.add_argument('--height', type=int, default=3000)
+    parser.add_argument('--mode', choices=['full', 'draft'])
+    parser.add_argument('--tile', type=int, nargs=2)
+    parser.add_argument('paths', nargs='*')
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, tuple(args.tile), args.paths)
+        return
+
+    with tempfile.TemporaryDirectory() as folder:
+        paths = make_corpus(folder, args.count, args.width, args.height)
+        print(f'코퍼스: {args.width}×{args.height} JPEG {args.count}장, 타일 {TILE_SIZES}')
+        for tile_size in TILE_SIZES:
+            results = {}
+            for mode in ['full', 'draft']:
+                output = subprocess.check_output(
+                    [sys.executable, __file__, '--mode', mode, '--tile', *map(str, tile_size)] + paths,
+                    cwd=ROOT
+                )
+                results[mode] = json.loads(output.decode().strip().splitlines()[-1])
+
+            full, draft = results['full'], results['draft']
+            print(f"타일 {tile_size[0]}×{tile_size[1]}: "
+                  f"{full['ms_per_tile']}ms → {draft['ms_per_tile']}ms/타일 "
+                  f"({full['seconds'] / draft['seconds']:.1f}배), "
+                  f"최대 RSS {full['peak_rss_mb']}MB → {draft['peak_rss_mb']}MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+"""혼합 배치(create_optimized_mixed_layout) 전체/단계별 시간 벤치마크
+
+사용법:
+    python benchmarks/bench_layout.py [--sizes 1 10 50 200] [--repeat 3] [--format jpeg]
+                                      [--orientation landscape] [--output 결과.json] [--compare 이전.json]
+
+합성 사진 코퍼스(여러 해상도, EXIF 방향, JPEG/PNG/WebP)를 만들어 사진 수별로 배치를 실행하고
+- 전체 시간(create_optimized_mixed_layout)과 단계별 시간(decode, tile_resize, packing, paste)
+- 만든 페이지를 --format 인코더로 저장하는 시간(encode)과 출력 크기
+  (기본 jpeg - 노이즈가 많은 합성 사진 페이지는 png 인코딩이 페이지당 수 초라 다른 단계가 묻힘)
+- 처리량(사진/초), 페이지 수, 최대 RSS(요청 프로세스, 타일 프로세스 풀)
+을 JSON으로 저장합니다 (기본 benchmarks/results/layout_<커밋>.json).
+--compare로 다른 커밋의 결과 파일을 주면 사진 수별 변화율을 함께 출력합니다.
+
+사진 수마다 별도 프로세스에서 실행하고, 타일 캐시는 끄고(TILE_CACHE_MAX_BYTES=0) 측정하므로
+코퍼스 파일을 돌려 써도 매번 디코딩/리사이징합니다. 타일 프로세스 풀 크기는 TILE_WORKERS를 따릅니다.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PIL import Image, features
+
+BATCH_SIZES = [1, 10, 50, 200]
+CONSTRUCTION_RATIO = 0.7  # 배치 중 시공사진 비율 (나머지는 대문사진)
+CORPUS_SIZE = 24  # 종류별 원본 파일 수 (배치가 더 크면 돌려 씀)
+
+# 원본 해상도 (가로, 세로) - 스마트폰/카메라 사진과 축소 전송된 사진
+RESOLUTIONS = [(4000, 3000), (4032, 3024), (1600, 1200), (2048, 1536)]
+# EXIF Orientation 값 (1: 정방향, 3: 180도, 6: 시계 90도, 8: 반시계 90도)
+EXIF_ORIENTATIONS = [1, 1, 3, 6, 8]
+# (형식, 확장자, 가중치) - 대부분 JPEG, PNG는 파일이 커서 작은 해상도만
+FORMATS = [('JPEG', 'jpg', 8), ('PNG', 'png', 1)]
+if features.check('webp'):
+    FORMATS.append(('WEBP', 'webp', 1))
+
+STAGES = ['decode', 'tile_resize', 'packing', 'paste', 'encode']
+
+
+def make_photo(rng, width, height):
+    """현장 사진과 비슷하게 압축되는 RGB 이미지 (노이즈 + 그라디언트)"""
+    noise = Image.effect_noise((width, height), rng.randint(20, 60))
+    gradient = Image.linear_gradient('L').resize((width, height))
+    return Image.merge('RGB', (noise, gradient, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+
+
+def make_corpus(folder, seed, count=CORPUS_SIZE):
+    """시공사진(가로)/대문사진(세로) 원본 파일 생성 → {'construction': [정보...], 'document': [...]}"""
+    rng = random.Random(seed)
+    corpus = {'construction': [], 'document': []}
+    for photo_type in corpus:
+        for i in range(count):
+            format_name, extension, _ = rng.choices(FORMATS, weights=[f[2] for f in FORMATS])[0]
+            width, height = rng.choice(RESOLUTIONS)
+            if format_name == 'PNG':
+                width, height = width // 2, height // 2
+            if photo_type == 'document':
+                width, height = height, width
+            orientation = rng.choice(EXIF_ORIENTATIONS)
+            # EXIF 방향이 90도 회전이면 화면에 보이는 방향이 유지되도록 저장 픽셀은 가로/세로를 바꿈
+            if orientation in (6, 8):
+                width, height = height, width
+
+            image = make_photo(rng, width, height)
+            exif = Image.Exif()
+            exif[0x0112] = orientation
+            path = os.path.join(folder, f'{photo_type}_{i}.{extension}')
+            options = {'quality': 90} if format_name in ('JPEG', 'WEBP') else {}
+            image.save(path, format_name, exif=exif, **options)
+            corpus[photo_type].append({
+                'path': path,
+                'format': format_name,
+                'size': [width, height],
+                'orientation': orientation
+            })
+    return corpus
+
+
+def peak_rss_mb():
+    """현재 프로세스의 최대 RSS (MB) - 리눅스는 fork 이전 값을 물려받지 않는 VmHWM 사용"""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_uploads(entries):
+    """코퍼스 파일을 업로드 스풀과 같은 UploadRef로 변환"""
+    from app import UploadRef
+
+    uploads = []
+    for entry in entries:
+        with open(entry['path'], 'rb') as f:
+            data = f.read()
+        uploads.append(UploadRef(entry['path'], hashlib.sha256(data).hexdigest(), len(data),
+                                 os.path.basename(entry['path'])))
+    return uploads
+
+
+def run_size(corpus_path, size, repeat, output_format, orientation):
+    """사진 수 하나를 repeat번 실행하고 결과를 JSON 한 줄로 출력 (하위 프로세스)"""
+    import app
+
+    with open(corpus_path) as f:
+        corpus = json.load(f)
+    construction_count = max(1, round(size * CONSTRUCTION_RATIO))
+    document_count = size - construction_count
+    construction = load_uploads([corpus['construction'][i % len(corpus['construction'])]
+                                 for i in range(construction_count)])
+    document = load_uploads([corpus['document'][i % len(corpus['document'])]
+                             for i in range(document_count)])
+
+    runs = []
+    with tempfile.TemporaryDirectory() as output_folder:
+        for run in range(repeat):
+            with app.metrics.job_timings() as timings:
+                start = time.perf_counter()
+                pages, message, construction_placed, document_placed, total_pages = \
+                    app.create_optimized_mixed_layout(construction, document, orientation)
+                elapsed = time.perf_counter() - start
+                if pages is None:
+                    raise RuntimeError(message)
+
+                encoder = app.PAGE_ENCODERS[output_format](output_folder, f'bench_{run}')
+                for page_number, page_image in enumerate(pages, 1):
+                    encoder.add_page(page_image, page_number)
+                    page_image.close()
+                encoder.close()
+
+            encoding = encoder.stats()
+            runs.append({
+                'seconds': elapsed,
+                'stages': {stage: timings.get(stage, 0.0) for stage in STAGES},
+                'pages': total_pages,
+                'placed': construction_placed + document_placed,
+                'output_bytes': encoding['total_bytes']
+            })
+            for filename in os.listdir(output_folder):
+                os.remove(os.path.join(output_folder, filename))
+
+    # 타일 프로세스 풀 자식 프로세스가 끝나야 최대 RSS가 RUSAGE_CHILDREN에 집계됨
+    if app._tile_executor is not None:
+        app._tile_executor.shutdown(wait=True)
+    seconds = statistics.median(run['seconds'] for run in runs)
+    print(json.dumps({
+        'size': size,
+        'construction': construction_count,
+        'document': document_count,
+        'runs': len(runs),
+        'seconds': round(seconds, 3),
+        'seconds_min': round(min(run['seconds'] for run in runs), 3),
+        'stages': {stage: round(statistics.median(run['stages'][stage] for run in runs), 3) for stage in STAGES},
+        'photos_per_second': round(size / seconds, 2),
+        'pages': runs[0]['pages'],
+        'placed': runs[0]['placed'],
+        'output_bytes': runs[0]['output_bytes'],
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'pool_peak_rss_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+    }))
+
+
+def git_commit():
+    """현재 커밋 (작업 트리에 변경이 있으면 -dirty)"""
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                         stderr=subprocess.DEVNULL).decode().strip()
+        dirty = subprocess.call(['git', 'diff', '--quiet', 'HEAD', '--', '.'], cwd=ROOT) != 0
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+
+def percent_change(old, new):
+    if not old:
+        return '   -  '
+    return f'{(new - old) * 100 / old:+5.0f}%'
+
+
+def print_comparison(results, baseline_path):
+    """이전 결과 파일과 사진 수별 전체 시간/처리량/RSS 비교"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {result['size']: result for result in baseline['results']}
+    print(f"\n비교 기준: {baseline['commit']} ({baseline_path})")
+    for result in results:
+        old = previous.get(result['size'])
+        if old is None:
+            continue
+        stage_changes = '  '.join(f"{stage} {percent_change(old['stages'][stage], result['stages'][stage])}"
+                                  for stage in STAGES if stage in old['stages'])
+        print(f"사진 {result['size']:>3}장  전체 {percent_change(old['seconds'], result['seconds'])}  "
+              f"RSS {percent_change(old['peak_rss_mb'], result['peak_rss_mb'])}  "
+              f"페이지 {old['pages']}→{result['pages']}  {stage_changes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=BATCH_SIZES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--format', default='jpeg', help='페이지 인코더 (png, jpeg, webp, pdf)')
+    parser.add_argument('--orientation', choices=['landscape', 'portrait'], default='landscape')
+    parser.add_argument('--output', help='결과 JSON 경로 (기본 benchmarks/results/layout_<커밋>.json)')
+    parser.add_argument('--compare', help='비교할 이전 결과 JSON')
+    parser.add_argument('--run-size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--corpus', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_size is not None:
+        run_size(args.corpus, args.run_size, args.repeat, args.format, args.orientation)
+        return
+
+    commit = git_commit()
+    output_path = args.output or os.path.join(ROOT, 'benchmarks', 'results', f'layout_{commit}.json')
+    with tempfile.TemporaryDirectory() as folder:
+        corpus = make_corpus(folder, args.seed)
+        corpus_path = os.path.join(folder, 'corpus.json')
+        with open(corpus_path, 'w') as f:
+            json.dump(corpus, f)
+
+        # 하위 프로세스는 저장소/계측 파일을 임시 폴더에 두고 타일 캐시 없이 실행
+        env = dict(os.environ, TILE_CACHE_MAX_BYTES='0', LAYOUT_STORE='memory',
+                   METRICS_FOLDER=os.path.join(folder, 'metrics'), LOG_LEVEL='WARNING')
+        print(f"커밋 {commit}, 코퍼스 종류별 {CORPUS_SIZE}장 "
+              f"({', '.join(f[0] for f in FORMATS)}), {args.orientation}, {args.format}, 반복 {args.repeat}")
+        results = []
+        for size in args.sizes:
+            output = subprocess.check_output(
+                [sys.executable, __file__, '--run-size', str(size), '--corpus', corpus_path,
+                 '--repeat', str(args.repeat), '--format', args.format, '--orientation', args.orientation],
+                cwd=folder, env=env
+            )
+            result = json.loads(output.decode().strip().splitlines()[-1])
+            results.append(result)
+            stages = '  '.join(f"{stage} {result['stages'][stage]:.2f}" for stage in STAGES)
+            print(f"사진 {size:>3}장  {result['seconds']:7.2f}초  {result['photos_per_second']:6.2f}장/초  "
+                  f"{result['pages']:>3}페이지  RSS {result['peak_rss_mb']:7.1f}MB "
+                  f"(풀 {result['pool_peak_rss_mb']:.1f}MB)  [{stages}]")
+
+    report = {
+        'benchmark': 'layout',
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pillow': Image.__version__,
+        'cpu_count': os.cpu_count(),
+        'tile_workers': os.environ.get('TILE_WORKERS', '2'),
+        'layout_optimizer': os.environ.get('LAYOUT_OPTIMIZER', 'global'),
+        'orientation': args.orientation,
+        'format': args.format,
+        'repeat': args.repeat,
+        'seed': args.seed,
+        'results': results
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"결과 저장: {output_path}")
+
+    if args.compare:
+        print_comparison(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
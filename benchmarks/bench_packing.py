@@ -0,0 +1,97 @@
+"""기존 BinPacker(길로틴 분할) vs MaxRectsPacker 페이지 수 / 배치 시간 비교 벤치마크
+
+사용법:
+    python benchmarks/bench_packing.py [--batches 20] [--seed 1]
+
+시공사진/대문사진이 섞인 배치를 가로 A4에 페이지가 빌 때까지 반복해서 채우고
+(create_optimized_mixed_layout의 빈패킹 경로와 같은 방식) 페이지 수와 배치 시간을 비교합니다.
+렌더링은 하지 않습니다.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import BinPacker, MaxRectsPacker, Photo, cm_to_px
+
+# 배치 크기 (시공사진 수, 대문사진 수)
+BATCH_SIZES = [10, 30, 100]
+
+
+def make_batch(rng, size):
+    """시공사진/대문사진이 무작위로 섞인 사진 목록 (시공사진 비율 30~90%)"""
+    construction_ratio = rng.uniform(0.3, 0.9)
+    construction_count = sum(1 for _ in range(size) if rng.random() < construction_ratio)
+    photos = [Photo(f"construction_{i}", 9.0, 11.0, 'construction') for i in range(construction_count)]
+    photos += [Photo(f"document_{i}", 11.4, 15.2, 'document') for i in range(size - construction_count)]
+    rng.shuffle(photos)
+    return photos
+
+
+def check_page(placed_photos, bin_width, bin_height):
+    """배치 결과가 용지 안에 있고 서로 겹치지 않는지 확인"""
+    rects = []
+    for photo in placed_photos:
+        w, h = cm_to_px(photo.width_cm), cm_to_px(photo.height_cm)
+        if photo.rotated:
+            w, h = h, w
+        x, y = photo.placed_x, photo.placed_y
+        assert 0 <= x and 0 <= y and x + w <= bin_width and y + h <= bin_height, photo.photo_id
+        for ox, oy, ow, oh in rects:
+            assert x >= ox + ow or x + w <= ox or y >= oy + oh or y + h <= oy, photo.photo_id
+        rects.append((x, y, w, h))
+
+
+def pack_all(make_packer, photos):
+    """사진이 모두 배치될 때까지 페이지를 채우고 (페이지 수, 배치 시간) 반환"""
+    bin_width, bin_height = cm_to_px(29.7), cm_to_px(21.0)
+    remaining = [Photo(p.photo_id, p.width_cm, p.height_cm, p.photo_type) for p in photos]
+    pages = 0
+    elapsed = 0.0
+    while remaining:
+        start = time.perf_counter()
+        packer = make_packer(bin_width, bin_height)
+        placed_count, placed_photos = packer.pack_photos(list(remaining))
+        elapsed += time.perf_counter() - start
+        if placed_count == 0:
+            raise RuntimeError('배치할 수 없는 사진이 남음')
+        check_page(placed_photos, bin_width, bin_height)
+        placed_ids = {photo.photo_id for photo in placed_photos}
+        remaining = [p for p in remaining if p.photo_id not in placed_ids]
+        pages += 1
+    return pages, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batches', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    engines = [('guillotine', lambda w, h: BinPacker(w, h, margin_cm=0.2))]
+    engines += [
+        (f'maxrects-{heuristic}', lambda w, h, heuristic=heuristic: MaxRectsPacker(w, h, 0.2, heuristic))
+        for heuristic in MaxRectsPacker.HEURISTICS
+    ]
+
+    print(f"가로 A4, 배치 {args.batches}개 × 크기 {BATCH_SIZES}")
+    for size in BATCH_SIZES:
+        rng = random.Random(args.seed * 1000 + size)
+        batches = [make_batch(rng, size) for _ in range(args.batches)]
+        for name, make_packer in engines:
+            total_pages = 0
+            total_seconds = 0.0
+            for photos in batches:
+                pages, seconds = pack_all(make_packer, photos)
+                total_pages += pages
+                total_seconds += seconds
+            print(f"사진 {size:>3}장  {name:<15} 평균 {total_pages / len(batches):6.2f}페이지  "
+                  f"배치 {total_seconds * 1000 / len(batches):8.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
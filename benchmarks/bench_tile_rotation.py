@@ -0,0 +1,86 @@
+"""타일 90도 회전 방식별 비용 비교 벤치마크
+
+사용법:
+    python benchmarks/bench_tile_rotation.py [--repeat 30]
+
+시공사진(1063×1299)/대문사진(1346×1795) 크기 RGB 타일 한 장을 회전하는 시간을 비교합니다.
+- rotate: Image.rotate(90, expand=True) (Pillow는 90도 배수면 내부에서 transpose로 처리)
+- affine: rotate가 90도 배수가 아닐 때 쓰는 일반 아핀 변환 경로
+- transpose: Image.transpose(ROTATE_90) (rotate_tile이 사용하는 방식)
+참고로 원본(4000×3000 JPEG)에서 타일을 만드는 resize_to_exact_size 시간도 함께 출력합니다.
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PIL import Image
+
+from app import resize_to_exact_size
+
+# (이름, 너비, 높이) - 300 DPI 시공사진/대문사진 타일
+TILE_SIZES = [('construction', 1063, 1299), ('document', 1346, 1795)]
+
+
+def make_tile(width, height):
+    """그라데이션 RGB 타일 (단색이면 일부 연산이 지나치게 빨라지므로)"""
+    gradient = Image.linear_gradient('L').resize((width, height))
+    return Image.merge('RGB', (gradient, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT), gradient))
+
+
+def make_jpeg(width, height):
+    """원본 사진 대용 JPEG 바이트"""
+    buffer = io.BytesIO()
+    make_tile(width, height).save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def rotate_affine(tile):
+    """rotate(90)의 일반 아핀 변환 경로 (90도 배수 빠른 경로를 거치지 않음)"""
+    width, height = tile.size
+    return tile.transform((height, width), Image.Transform.AFFINE,
+                          (0, -1, width, 1, 0, 0), Image.Resampling.NEAREST)
+
+
+METHODS = [
+    ('rotate', lambda tile: tile.rotate(90, expand=True)),
+    ('affine', rotate_affine),
+    ('transpose', lambda tile: tile.transpose(Image.Transpose.ROTATE_90)),
+]
+
+
+def measure(func, repeat):
+    """한 번 실행 시간의 중앙값 (ms)"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - start)
+        result.close()
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    source = make_jpeg(4000, 3000)
+    for name, width, height in TILE_SIZES:
+        tile = make_tile(width, height)
+        expected = tile.transpose(Image.Transpose.ROTATE_90).tobytes()
+        print(f"{name} 타일 {width}×{height}")
+        for method, rotate in METHODS:
+            assert rotate(tile).tobytes() == expected, method
+            print(f"   {method:<10} {measure(lambda: rotate(tile), args.repeat):8.2f}ms")
+        print(f"   {'(resize)':<10} "
+              f"{measure(lambda: resize_to_exact_size(Image.open(io.BytesIO(source)), width, height), args.repeat):8.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
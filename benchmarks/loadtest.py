@@ -0,0 +1,429 @@
+"""업로드 엔드포인트 HTTP 부하 테스트 + 워커/스레드 설정 권장값
+
+사용법:
+    python benchmarks/loadtest.py [--scenario optimized] [--concurrency 1 2 4 8] [--rounds 3]
+                                  [--workers 4] [--threads 1] [--memory-limit-mb 2048]
+    python benchmarks/loadtest.py --url http://localhost:5001 --pid <gunicorn 마스터 PID>
+
+기본은 Dockerfile과 같은 gunicorn 설정(--workers 4 --timeout 120)으로 임시 폴더에서 앱을 띄우고,
+실제와 비슷한 멀티파트 업로드(4000×3000 JPEG)를 동시 요청 수를 늘려가며 보냅니다.
+동시 요청 수별로 지연 시간 p50/p95/p99(성공한 요청 기준), 오류율, 처리량,
+서버 프로세스 트리(gunicorn 마스터 + 워커 + 타일 프로세스 풀) 최대 메모리를 기록하고
+--memory-limit-mb(기본: cgroup 메모리 한도) 안에서 쓸 수 있는 워커/스레드 수를 권장합니다.
+
+시나리오:
+- optimized: /upload_optimized (시공사진 7장 + 대문사진 3장, --photos로 변경)
+- multiple: /upload_multiple (시공사진 6장)
+- single: /upload (사진 1장)
+
+요청마다 JPEG 끝(EOI) 뒤에 임의 바이트를 붙여 내용 해시를 바꾸므로 타일 캐시에 적중하지 않습니다.
+메모리는 공유 페이지를 나눠 계산하는 PSS(/proc/<pid>/smaps_rollup)를 쓰고, 없으면 RSS를 씁니다.
+"""
+import argparse
+import http.client
+import io
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_layout import git_commit, make_photo
+
+CONCURRENCY_LEVELS = [1, 2, 4, 8]
+SOURCE_PHOTOS = 4  # 종류별 원본 JPEG 수 (요청마다 꼬리 바이트만 바꿔서 재사용)
+GUNICORN_TIMEOUT = 120  # Dockerfile의 --timeout
+MEMORY_HEADROOM = 0.8  # 메모리 한도 중 요청 처리에 쓸 비율 (나머지는 페이지 캐시/단편화 여유)
+LATENCY_TARGET_RATIO = 0.5  # p99가 gunicorn timeout의 이 비율 아래여야 안정적인 동시 요청 수로 봄
+
+
+def make_sources(seed=1):
+    """시공사진(가로)/대문사진(세로) 원본 JPEG 바이트"""
+    import random
+
+    rng = random.Random(seed)
+    sources = {'construction': [], 'document': []}
+    for photo_type, size in (('construction', (4000, 3000)), ('document', (3000, 4000))):
+        for _ in range(SOURCE_PHOTOS):
+            buffer = io.BytesIO()
+            make_photo(rng, *size).save(buffer, 'JPEG', quality=90)
+            sources[photo_type].append(buffer.getvalue())
+    return sources
+
+
+class Scenario:
+    """엔드포인트와 요청마다 보낼 폼 필드/파일 목록"""
+
+    def __init__(self, name, path, fields, files):
+        self.name = name
+        self.path = path
+        self.fields = fields
+        self.files = files  # [(필드 이름, 사진 종류), ...]
+
+    def build_body(self, sources, counter):
+        """멀티파트 본문 → (content-type, 바이트)"""
+        boundary = uuid.uuid4().hex
+        parts = []
+        for name, value in self.fields.items():
+            parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+        for i, (field, photo_type) in enumerate(self.files):
+            photos = sources[photo_type]
+            data = photos[(counter + i) % len(photos)] + os.urandom(16)  # EOI 뒤 꼬리 바이트 → 캐시 미적중
+            parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; '
+                         f'filename="{photo_type}_{counter}_{i}.jpg"\r\nContent-Type: image/jpeg\r\n\r\n'.encode())
+            parts.append(data)
+            parts.append(b'\r\n')
+        parts.append(f'--{boundary}--\r\n'.encode())
+        return f'multipart/form-data; boundary={boundary}', b''.join(parts)
+
+
+def make_scenario(name, photos):
+    if name == 'optimized':
+        construction = photos - photos * 3 // 10
+        files = ([('construction_files', 'construction')] * construction
+                 + [('document_files', 'document')] * (photos - construction))
+        return Scenario(name, '/upload_optimized', {'paper_orientation': 'landscape', 'output_format': 'jpeg'}, files)
+    if name == 'multiple':
+        return Scenario(name, '/upload_multiple', {'photo_type': 'construction', 'paper_orientation': 'portrait'},
+                        [('files', 'construction')] * photos)
+    return Scenario(name, '/upload', {'photo_type': 'construction'}, [('file', 'construction')])
+
+
+def process_tree(root_pid):
+    """root_pid와 모든 하위 프로세스 PID"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # comm에 공백/괄호가 있을 수 있으므로 마지막 ')' 뒤에서 ppid를 읽음
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    pids = [root_pid]
+    for pid in pids:
+        pids.extend(children.get(pid, []))
+    return pids
+
+
+def process_memory_kb(pid):
+    """프로세스 PSS(없으면 RSS) kB"""
+    for path, key in ((f'/proc/{pid}/smaps_rollup', 'Pss:'), (f'/proc/{pid}/status', 'VmRSS:')):
+        try:
+            with open(path) as f:
+                for line in f:
+                    if line.startswith(key):
+                        return int(line.split()[1])
+        except OSError:
+            continue
+    return 0
+
+
+def tree_memory_mb(root_pid):
+    return sum(process_memory_kb(pid) for pid in process_tree(root_pid)) / 1024
+
+
+class MemorySampler:
+    """측정 구간 동안 서버 프로세스 트리 메모리 최대값을 주기적으로 기록"""
+
+    def __init__(self, root_pid, interval=0.2):
+        self.root_pid = root_pid
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if self.root_pid:
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+        return self
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, tree_memory_mb(self.root_pid))
+            self._stop.wait(self.interval)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir, workers, threads, port):
+    """임시 작업 폴더에서 gunicorn으로 앱 실행 (업로드/출력/저장소 파일은 모두 workdir 아래)"""
+    command = [
+        sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+        '--workers', str(workers), '--threads', str(threads), '--timeout', str(GUNICORN_TIMEOUT),
+        '--chdir', workdir, '--pythonpath', ROOT, 'app:app'
+    ]
+    env = dict(os.environ, LOG_LEVEL=os.environ.get('LOG_LEVEL', 'WARNING'),
+               TILE_SLOTS_FOLDER=os.path.join(workdir, 'tile_slots'),
+               ADMISSION_STATE_PATH=os.path.join(workdir, 'admission.json'))
+    log_path = os.path.join(workdir, 'gunicorn.log')
+    with open(log_path, 'wb') as log:
+        server = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if server.poll() is not None:
+            with open(log_path, errors='replace') as log:
+                raise RuntimeError('gunicorn이 시작되지 않았습니다:\n' + log.read()[-2000:])
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            connection.request('GET', '/health')
+            if connection.getresponse().status == 200:
+                return server
+        except OSError:
+            pass
+        time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError('gunicorn 시작 대기 시간 초과')
+
+
+def send_request(host, port, scenario, sources, counter, timeout):
+    """요청 하나 → (성공 여부, 지연 시간, 상태 코드 또는 예외 이름)"""
+    content_type, body = scenario.build_body(sources, counter)
+    start = time.perf_counter()
+    try:
+        connection = http.client.HTTPConnection(host, port, timeout=timeout)
+        try:
+            connection.request('POST', scenario.path, body, {'Content-Type': content_type})
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+        finally:
+            connection.close()
+    except (OSError, http.client.HTTPException) as e:
+        return False, time.perf_counter() - start, type(e).__name__
+    return 200 <= status < 300, time.perf_counter() - start, str(status)
+
+
+def percentile(sorted_values, fraction):
+    """최근접 순위 백분위수 (값이 없으면 None)"""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def run_level(host, port, scenario, sources, concurrency, rounds, timeout, server_pid):
+    """동시 요청 concurrency개로 스레드마다 rounds번씩 요청 (닫힌 루프)"""
+    results = []
+    lock = threading.Lock()
+
+    def client(index):
+        for round_number in range(rounds):
+            result = send_request(host, port, scenario, sources, index * rounds + round_number, timeout)
+            with lock:
+                results.append(result)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    with MemorySampler(server_pid) as sampler:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for ok, latency, _ in results if ok)
+    statuses = {}
+    for _, _, status in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    errors = sum(1 for ok, _, _ in results if not ok)
+    return {
+        'concurrency': concurrency,
+        'requests': len(results),
+        'errors': errors,
+        'error_rate': round(errors / len(results), 3),
+        'statuses': statuses,
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'throughput_rps': round(len(latencies) / elapsed, 3),
+        'peak_memory_mb': round(sampler.peak_mb, 1) if server_pid else None
+    }
+
+
+def cgroup_memory_limit_mb():
+    """컨테이너(cgroup v2/v1) 메모리 한도 MB (제한이 없으면 None)"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value) / 1024 / 1024
+    return None
+
+
+def recommend(levels, idle_mb, workers, threads, memory_limit_mb, cpus):
+    """측정값으로 메모리 한도 안에서 쓸 워커/스레드 수 계산
+
+    - 요청당 메모리: 동시 처리 중인 요청 수(동시 요청 수와 워커×스레드 중 작은 값)로 나눈 (최대 - 유휴) 메모리의 최대값
+    - 안정적인 동시 요청 수: 오류가 없고 p99가 timeout의 절반 아래인 가장 큰 동시 요청 수
+      (처리량이 더 늘지 않는 지점을 넘으면 지연 시간만 늘어나므로 그 지점까지만)
+    """
+    per_worker_idle_mb = idle_mb / workers
+    per_request_mb = max(
+        ((level['peak_memory_mb'] - idle_mb) / min(level['concurrency'], workers * threads)
+         for level in levels if level['peak_memory_mb']),
+        default=None
+    )
+
+    stable = [level for level in levels
+              if level['errors'] == 0 and level['p99'] is not None
+              and level['p99'] < GUNICORN_TIMEOUT * LATENCY_TARGET_RATIO]
+    target = 1
+    best_throughput = 0.0
+    for level in stable:
+        if level['throughput_rps'] > best_throughput * 1.1:
+            target = level['concurrency']
+            best_throughput = level['throughput_rps']
+
+    reasons = [f"오류 없이 처리량이 늘어나는 마지막 동시 요청 수 {target}"]
+    # 워커 수는 CPU 수 이하 (디코딩/리사이징이 CPU 작업이라 그 이상은 메모리만 씀)
+    recommended_workers = max(1, min(cpus, target))
+    in_flight = target
+    if memory_limit_mb and per_request_mb:
+        def memory_in_flight(worker_count):
+            budget = memory_limit_mb * MEMORY_HEADROOM - per_worker_idle_mb * worker_count
+            return int(budget // per_request_mb)
+
+        while recommended_workers > 1 and memory_in_flight(recommended_workers) < recommended_workers:
+            recommended_workers -= 1
+        fits = memory_in_flight(recommended_workers)
+        reasons.append(f"메모리 한도 {memory_limit_mb:.0f}MB의 {MEMORY_HEADROOM:.0%}로 동시 처리 최대 {max(fits, 0)}건 "
+                       f"(워커당 유휴 {per_worker_idle_mb:.0f}MB, 요청당 {per_request_mb:.0f}MB)")
+        if fits < 1:
+            reasons.append("메모리 한도가 요청 1건에도 부족함 - 한도를 늘리거나 요청당 사진 수를 줄여야 함")
+        in_flight = max(1, min(target, fits))
+    else:
+        reasons.append("메모리 한도를 모르므로(--memory-limit-mb) 메모리 제약은 반영하지 않음")
+
+    recommended_workers = min(recommended_workers, in_flight)
+    recommended_threads = math.ceil(in_flight / recommended_workers)
+    expected_mb = None
+    if per_request_mb:
+        expected_mb = round(per_worker_idle_mb * recommended_workers + per_request_mb * in_flight, 1)
+    return {
+        'workers': recommended_workers,
+        'threads': recommended_threads,
+        'concurrent_requests': in_flight,
+        'expected_peak_memory_mb': expected_mb,
+        'per_worker_idle_mb': round(per_worker_idle_mb, 1),
+        'per_request_mb': round(per_request_mb, 1) if per_request_mb else None,
+        'memory_limit_mb': memory_limit_mb,
+        'reasons': reasons
+    }
+
+
+def format_seconds(value):
+    return '     -' if value is None else f'{value:6.2f}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenario', choices=['optimized', 'multiple', 'single'], default='optimized')
+    parser.add_argument('--photos', type=int, default=None, help='요청당 사진 수 (optimized 10, multiple 6)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=CONCURRENCY_LEVELS)
+    parser.add_argument('--rounds', type=int, default=3, help='동시 요청(스레드)마다 보낼 요청 수')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--timeout', type=float, default=GUNICORN_TIMEOUT + 30, help='클라이언트 요청 제한 시간(초)')
+    parser.add_argument('--memory-limit-mb', type=float, default=None)
+    parser.add_argument('--url', help='이미 실행 중인 서버 (지정하면 gunicorn을 띄우지 않음)')
+    parser.add_argument('--pid', type=int, help='--url 서버의 gunicorn 마스터 PID (메모리 측정용)')
+    parser.add_argument('--output', help='결과 JSON 경로 (기본 benchmarks/results/loadtest_<커밋>_<시나리오>.json)')
+    args = parser.parse_args()
+
+    photos = args.photos or {'optimized': 10, 'multiple': 6, 'single': 1}[args.scenario]
+    scenario = make_scenario(args.scenario, photos)
+    memory_limit_mb = args.memory_limit_mb or cgroup_memory_limit_mb()
+    commit = git_commit()
+    sources = make_sources()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        server = None
+        if args.url:
+            parts = urlsplit(args.url)
+            host, port, server_pid = parts.hostname, parts.port or 80, args.pid
+        else:
+            host, port = '127.0.0.1', free_port()
+            server = start_server(workdir, args.workers, args.threads, port)
+            server_pid = server.pid
+        try:
+            # 가벼운 요청으로 워커를 데운 뒤의 메모리를 유휴 값으로 사용
+            # (타일 프로세스 풀은 배치 요청에서 처음 만들어지므로 요청당 메모리 쪽에 포함됨)
+            for i in range(args.workers):
+                send_request(host, port, make_scenario('single', 1), sources, i, args.timeout)
+            idle_mb = tree_memory_mb(server_pid) if server_pid else None
+            print(f"커밋 {commit}, {scenario.path} 사진 {photos}장/요청, "
+                  f"gunicorn --workers {args.workers} --threads {args.threads}"
+                  + (f", 유휴 메모리 {idle_mb:.0f}MB" if idle_mb else ''))
+            print(" 동시  요청  오류율     p50     p95     p99  처리량(건/초)  최대 메모리")
+            levels = []
+            for concurrency in args.concurrency:
+                level = run_level(host, port, scenario, sources, concurrency, args.rounds, args.timeout, server_pid)
+                levels.append(level)
+                memory = f"{level['peak_memory_mb']:8.0f}MB" if level['peak_memory_mb'] else '        -'
+                print(f"{concurrency:>5} {level['requests']:>5}  {level['error_rate']:6.1%}  "
+                      f"{format_seconds(level['p50'])}  {format_seconds(level['p95'])}  {format_seconds(level['p99'])}  "
+                      f"{level['throughput_rps']:12.3f}  {memory}"
+                      + ('' if level['errors'] == 0 else f"  {level['statuses']}"))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=30)
+
+    recommendation = None
+    if idle_mb:
+        recommendation = recommend(levels, idle_mb, args.workers, args.threads, memory_limit_mb, os.cpu_count() or 1)
+        print(f"\n권장: gunicorn --workers {recommendation['workers']} --threads {recommendation['threads']} "
+              f"(동시 처리 {recommendation['concurrent_requests']}건"
+              + (f", 예상 최대 메모리 {recommendation['expected_peak_memory_mb']:.0f}MB"
+                 if recommendation['expected_peak_memory_mb'] else '') + ")")
+        for reason in recommendation['reasons']:
+            print(f"  - {reason}")
+    else:
+        print("\n서버 PID를 모르므로(--pid) 메모리 기반 권장값은 계산하지 않았습니다.")
+
+    output_path = args.output or os.path.join(ROOT, 'benchmarks', 'results', f'loadtest_{commit}_{args.scenario}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump({
+            'benchmark': 'loadtest',
+            'commit': commit,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'scenario': args.scenario,
+            'path': scenario.path,
+            'photos': photos,
+            'workers': args.workers,
+            'threads': args.threads,
+            'cpu_count': os.cpu_count(),
+            'idle_memory_mb': round(idle_mb, 1) if idle_mb else None,
+            'levels': levels,
+            'recommendation': recommendation
+        }, f, indent=2, ensure_ascii=False)
+    print(f"결과 저장: {output_path}")
+
+
+if __name__ == '__main__':
+    main()
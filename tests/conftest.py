@@ -0,0 +1,26 @@
+"""테스트 공통 설정 - app을 import하기 전에 임시 작업 폴더와 프로세스 내부 저장소로 환경 변수 설정
+
+app은 temp_uploads 등 상대 경로 폴더를 만들므로 임시 폴더로 이동한 뒤 import
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORK_DIR = tempfile.mkdtemp(prefix='printlh_test_')
+atexit.register(shutil.rmtree, WORK_DIR, ignore_errors=True)
+os.environ.update({
+    'LAYOUT_STORE': 'memory',
+    'LAYOUT_TEMPLATES_PATH': os.path.join(WORK_DIR, 'layout_templates.json'),
+    'METRICS_FOLDER': os.path.join(WORK_DIR, 'metrics'),
+    'ADMISSION_STATE_PATH': os.path.join(WORK_DIR, 'admission.json'),
+    'TILE_SLOTS_FOLDER': os.path.join(WORK_DIR, 'tile_slots'),
+    'TILE_WORKERS': '0',
+    'PACKING_MEMO_WARMUP': 'false',
+    'LOG_LEVEL': 'WARNING',
+})
+os.chdir(WORK_DIR)
@@ -0,0 +1,131 @@
+"""요청 수락 제어 (user-023)"""
+import threading
+
+import pytest
+
+import app
+
+MB = 1024 * 1024
+
+
+@pytest.fixture(autouse=True)
+def fast_poll(monkeypatch):
+    monkeypatch.setattr(app, 'ADMISSION_POLL_SECONDS', 0.01)
+
+
+def test_waiting_request_survives_a_reset_ledger(tmp_path):
+    state_path = tmp_path / 'admission.json'
+    controller = app.AdmissionController(str(state_path), 100 * MB, max_queue=4, queue_timeout=5)
+    running = controller.acquire(80 * MB)
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(controller.acquire(50 * MB)))
+    waiter.start()
+    while controller.stats()['queue_depth'] == 0:
+        pass
+
+    # 읽을 수 없는 장부는 빈 상태로 초기화됨 - 대기 중이던 요청은 다시 대기열에 들어가서 수락되어야 함
+    with controller._lock:
+        state_path.write_text('{not json')
+    waiter.join(timeout=5)
+
+    assert len(results) == 1
+    assert controller.stats()['running'] == 1
+    controller.release(running)
+    controller.release(results[0])
+
+
+@pytest.fixture
+def controller(tmp_path):
+    return app.AdmissionController(str(tmp_path / 'admission.json'), 100 * MB, max_queue=2, queue_timeout=5)
+
+
+def start_waiter(controller, name, estimated_bytes, admitted, background=False):
+    depth = controller.stats()['queue_depth']
+    thread = threading.Thread(
+        target=lambda: admitted.append((name, controller.acquire(estimated_bytes, background))), daemon=True
+    )
+    thread.start()
+    while controller.stats()['queue_depth'] == depth:
+        pass
+    return thread
+
+
+def test_queued_requests_are_admitted_in_arrival_order(controller):
+    running = controller.acquire(80 * MB)
+    admitted = []
+    # 두 번째 요청은 지금 예산에 들어가지만 앞선 요청보다 먼저 실행되지 않음
+    waiters = [start_waiter(controller, 'first', 50 * MB, admitted),
+               start_waiter(controller, 'second', 10 * MB, admitted)]
+    assert admitted == []
+
+    controller.release(running)
+    for waiter in waiters:
+        waiter.join(timeout=5)
+
+    assert [name for name, _ in admitted] == ['first', 'second']
+    assert controller.stats()['reserved_bytes'] == 60 * MB
+    for _, token in admitted:
+        controller.release(token)
+
+
+def test_full_queue_rejects_immediately(controller):
+    running = controller.acquire(80 * MB)
+    admitted = []
+    waiters = [start_waiter(controller, name, 50 * MB, admitted) for name in ('a', 'b')]
+
+    with pytest.raises(app.AdmissionRejected) as rejected:
+        controller.acquire(50 * MB)
+    assert rejected.value.queue_depth == 2
+    assert rejected.value.retry_after >= 1
+    # 비동기 작업(background)은 이미 접수된 작업이라 대기열이 차도 기다림
+    background = start_waiter(controller, 'background', 10 * MB, admitted, background=True)
+
+    controller.release(running)
+    for waiter in waiters:
+        waiter.join(timeout=5)
+    for _, token in list(admitted):
+        controller.release(token)
+    background.join(timeout=5)
+    assert [name for name, _ in admitted] == ['a', 'b', 'background']
+    controller.release(admitted[-1][1])
+
+
+def test_waiting_past_the_timeout_is_rejected(tmp_path):
+    controller = app.AdmissionController(str(tmp_path / 'admission.json'), 100 * MB, max_queue=2,
+                                         queue_timeout=0.05)
+    running = controller.acquire(80 * MB)
+
+    with pytest.raises(app.AdmissionRejected):
+        controller.acquire(50 * MB)
+    assert controller.stats()['queue_depth'] == 0
+    controller.release(running)
+
+
+def test_request_larger_than_the_budget_runs_alone(controller):
+    token = controller.acquire(500 * MB)
+
+    assert controller.stats()['running'] == 1
+    controller.release(token)
+    assert controller.stats()['reserved_bytes'] == 0
+
+
+def test_rejection_response_sets_retry_after():
+    with app.app.test_request_context():
+        response, status, headers = app.admission_rejected_response(app.AdmissionRejected(7, 3))
+
+    assert status == 429
+    assert headers == {'Retry-After': '7'}
+    assert response.get_json()['queue_depth'] == 3
+
+
+def test_arrange_estimate_follows_page_capacity_per_orientation():
+    probes = [app.ImageProbe('PNG', 800, 600, 'RGB') for _ in range(5)]
+    canvas = app.A4_WIDTH * app.A4_HEIGHT * 3
+
+    landscape = app.estimate_arrange_memory(probes, 'construction', 'landscape')
+    portrait = app.estimate_arrange_memory(probes, 'construction', 'portrait')
+
+    # 가로는 5장이 한 페이지, 세로는 4장씩이라 두 페이지
+    assert portrait - landscape == canvas
+    assert app.estimate_arrange_memory(probes, 'document', 'landscape') == \
+        app.estimate_arrange_memory(probes, 'document', 'portrait')
@@ -0,0 +1,60 @@
+"""결과 파일 인덱스 (user-006)"""
+import os
+import time
+
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize('filename, expected', [
+    ('abc_processed.jpg', ('abc', 'processed', 'resized_photo_abc.jpg', {'kind': 'single'})),
+    ('abc_thumb.jpg', ('abc', 'thumbnail', 'abc_thumb.jpg', {})),
+    ('abc_construction_landscape_layout.jpg',
+     ('abc', 'processed', 'A4_시공사진_가로_abc.jpg',
+      {'kind': 'batch', 'photo_type': 'construction', 'paper_orientation': 'landscape'})),
+    ('abc_document_portrait_layout_3.jpg',
+     ('abc', 'page_3', 'A4_대문사진_세로_abc_3.jpg',
+      {'kind': 'batch', 'photo_type': 'document', 'paper_orientation': 'portrait'})),
+    ('abc_processed.png', None),
+    ('abc_original.jpg', None),
+    ('notes.txt', None),
+])
+def test_parse_legacy_artifact(filename, expected):
+    assert app.parse_legacy_artifact(filename) == expected
+
+
+@pytest.fixture
+def processed_folder(tmp_path, monkeypatch):
+    monkeypatch.setitem(app.app.config, 'PROCESSED_FOLDER', str(tmp_path))
+    monkeypatch.setattr(app, 'layout_store', app.MemoryLayoutStore(ttl=3600))
+    monkeypatch.setitem(app.app.config, 'LAYOUT_TTL_SECONDS', 3600)
+    return tmp_path
+
+
+def test_rebuild_registers_legacy_files_once(processed_folder):
+    for filename in ('new_processed.jpg', 'new_thumb.jpg', 'old_processed.jpg', 'notes.txt'):
+        (processed_folder / filename).write_bytes(b'jpeg')
+    expired = time.time() - 2 * 3600
+    os.utime(processed_folder / 'old_processed.jpg', (expired, expired))
+
+    assert app.rebuild_artifact_index() == 1
+
+    processed = app.find_artifact('new', 'processed')
+    assert processed['download_name'] == 'resized_photo_new.jpg'
+    assert processed['path'] == os.path.abspath(processed_folder / 'new_processed.jpg')
+    assert app.find_artifact('new', 'thumbnail')['size'] == 4
+    assert app.find_artifact('old', 'processed') is None
+    # 한 번 재구성한 뒤에는 다시 스캔하지 않음
+    (processed_folder / 'later_processed.jpg').write_bytes(b'jpeg')
+    assert app.rebuild_artifact_index() == 0
+    assert app.find_artifact('later', 'processed') is None
+
+
+def test_find_artifact_ignores_deleted_files(processed_folder):
+    (processed_folder / 'gone_processed.jpg').write_bytes(b'jpeg')
+    app.register_artifacts('gone', {'kind': 'single'},
+                           {'processed': app.artifact_entry('gone_processed.jpg')})
+    os.remove(processed_folder / 'gone_processed.jpg')
+
+    assert app.find_artifact('gone', 'processed') is None
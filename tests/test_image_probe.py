@@ -0,0 +1,65 @@
+"""업로드 헤더 검사 (user-024)"""
+import io
+
+import pytest
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+import app
+
+
+def image_bytes(size=(64, 48), image_format='JPEG', mode='RGB'):
+    buffer = io.BytesIO()
+    Image.new(mode, size).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def upload(data, filename='photo.jpg'):
+    return FileStorage(io.BytesIO(data), filename=filename)
+
+
+def test_probe_reads_the_header_and_rewinds_the_stream():
+    file = upload(image_bytes((640, 480), 'PNG', 'RGBA'), 'photo.png')
+    file.stream.seek(3)
+
+    probe = app.probe_image(file)
+
+    assert (probe.format, probe.width, probe.height, probe.mode) == ('PNG', 640, 480, 'RGBA')
+    assert file.stream.tell() == 3
+    assert probe.decoded_bytes() == 640 * 480 * 4
+
+
+@pytest.mark.parametrize('data, message', [
+    (b'not an image at all', '이미지 파일이 아니거나'),
+    (image_bytes(image_format='WEBP'), '이미지 파일이 아니거나'),
+])
+def test_probe_rejects_non_images(data, message):
+    with pytest.raises(app.ImageProbeError, match=message):
+        app.probe_image(upload(data))
+
+
+def test_probe_rejects_oversized_images(monkeypatch):
+    monkeypatch.setitem(app.app.config, 'MAX_IMAGE_PIXELS', 100 * 100)
+
+    with pytest.raises(app.ImageProbeError, match='너무 큽니다'):
+        app.probe_image(upload(image_bytes((200, 100))))
+    assert app.probe_image(upload(image_bytes((100, 100)))).pixels == 100 * 100
+
+
+def test_probe_uploads_skips_disallowed_names_and_reports_rejections():
+    good = upload(image_bytes())
+    files = [good, upload(b'junk', 'bad.jpg'), upload(image_bytes(), 'notes.txt'), upload(b'', '')]
+
+    accepted, rejected = app.probe_uploads(files)
+
+    assert [file for file, _ in accepted] == [good]
+    assert [entry['filename'] for entry in rejected] == ['bad.jpg']
+
+
+def test_upload_multiple_rejects_when_no_file_passes_the_probe():
+    response = app.app.test_client().post('/upload_multiple', data={
+        'files': [(io.BytesIO(b'junk'), 'bad.jpg')],
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 400
+    assert response.get_json()['rejected_files'][0]['filename'] == 'bad.jpg'
@@ -0,0 +1,93 @@
+"""백그라운드 파일 정리와 원본 저장소 (user-007)"""
+import io
+import os
+import time
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+import app
+
+HOUR = 60 * 60
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    blobs = tmp_path / 'blobs'
+    blobs.mkdir()
+    monkeypatch.setattr(app, 'blob_store', app.BlobStore(str(blobs)))
+    monkeypatch.setattr(app, 'layout_store', app.MemoryLayoutStore(ttl=3600))
+    return tmp_path
+
+
+def make_janitor(folder, max_bytes=0):
+    return app.ArtifactJanitor([str(folder)], max_age_seconds=HOUR, max_bytes=max_bytes, interval=60,
+                               lock_path=str(folder / 'janitor.lock'))
+
+
+def write_file(path, size, age_seconds=0):
+    path.write_bytes(b'x' * size)
+    set_age(path, age_seconds)
+
+
+def set_age(path, age_seconds):
+    mtime = time.time() - age_seconds
+    os.utime(path, (mtime, mtime))
+
+
+def test_files_older_than_max_age_are_removed(uploads):
+    write_file(uploads / 'old.jpg', 10, age_seconds=2 * HOUR)
+    write_file(uploads / 'new.jpg', 10)
+
+    stats = make_janitor(uploads).run_once()
+
+    assert not (uploads / 'old.jpg').exists()
+    assert (uploads / 'new.jpg').exists()
+    assert stats['last_run_files_removed'] == 1
+    assert stats['last_run_bytes_reclaimed'] == 10
+
+
+def test_quota_evicts_oldest_files_first(uploads):
+    for age, name in enumerate(['newest.jpg', 'middle.jpg', 'oldest.jpg']):
+        write_file(uploads / name, 100, age_seconds=age * 60)
+
+    stats = make_janitor(uploads, max_bytes=250).run_once()
+
+    assert sorted(os.listdir(uploads)) == ['blobs', 'janitor.lock', 'middle.jpg', 'newest.jpg']
+    assert stats['bytes_in_use'] == 200
+
+
+def put_blob(folder, name, data):
+    return app.blob_store.put(FileStorage(io.BytesIO(data), filename=name), str(folder / name))
+
+
+def test_hard_linked_uploads_count_once_toward_the_quota(uploads):
+    first = put_blob(uploads, 'a_original.jpg', b'x' * 100)
+    second = put_blob(uploads, 'b_original.jpg', b'x' * 100)
+    assert first.sha256 == second.sha256
+    set_age(uploads / 'a_original.jpg', 60)  # 같은 inode라 두 참조 모두 오래된 파일
+    write_file(uploads / 'c.jpg', 100)
+
+    stats = make_janitor(uploads, max_bytes=150).run_once()
+
+    # 첫 참조를 지워도 blob이 남아 있으므로 두 번째 참조까지 지워야 한도 아래로 내려감
+    assert stats['last_run_files_removed'] == 2
+    assert stats['last_run_bytes_reclaimed'] == 100
+    assert (uploads / 'c.jpg').exists()
+
+
+def test_blobs_are_collected_once_every_reference_is_gone(uploads):
+    upload = put_blob(uploads, 'a_original.jpg', b'photo')
+    put_blob(uploads, 'b_original.jpg', b'photo')
+    blob_path = app.blob_store.blob_path(upload.sha256)
+    assert os.stat(blob_path).st_nlink == 3
+
+    os.remove(uploads / 'a_original.jpg')
+    assert app.blob_store.collect(grace_seconds=0) == {'removed': 0, 'blobs': 1, 'bytes': 5, 'references': 1}
+
+    set_age(uploads / 'b_original.jpg', 2 * HOUR)
+    stats = make_janitor(uploads).run_once()
+
+    assert stats['blobs_removed'] == 1
+    assert stats['blobs'] == 0
+    assert not os.path.exists(blob_path)
@@ -0,0 +1,69 @@
+"""전체 사진 기준 페이지 계획 (user-012)"""
+import functools
+
+import pytest
+
+import app
+from app import plan_layout_pages
+
+# A4 가로의 최대 조합 (시공사진 수, 대문사진 수)
+PATTERNS = [
+    {'construction': 5, 'document': 0},
+    {'construction': 3, 'document': 1},
+    {'construction': 1, 'document': 2},
+]
+
+
+def minimum_pages(construction, document):
+    """모든 페이지 조합을 시도해서 구한 최소 페이지 수"""
+    @functools.lru_cache(maxsize=None)
+    def solve(c, d):
+        if c == 0 and d == 0:
+            return 0
+        return 1 + min(solve(max(c - p['construction'], 0), max(d - p['document'], 0))
+                       for p in PATTERNS
+                       if (p['construction'] and c) or (p['document'] and d))
+    return solve(construction, document)
+
+
+def assert_covers(plan, construction, document):
+    assert sum(c for c, _ in plan) == construction
+    assert sum(d for _, d in plan) == document
+    for c, d in plan:
+        assert (c, d) != (0, 0)
+        assert any(c <= p['construction'] and d <= p['document'] for p in PATTERNS)
+
+
+@pytest.mark.parametrize('construction, document', [(1, 0), (0, 1), (7, 3), (12, 7), (5, 10), (23, 4)])
+def test_optimal_plan_uses_minimum_pages(construction, document):
+    plan, method = plan_layout_pages(construction, document, PATTERNS, budget_seconds=10)
+
+    assert method == 'optimal'
+    assert_covers(plan, construction, document)
+    assert len(plan) == minimum_pages(construction, document)
+
+
+def test_no_photos_means_no_pages():
+    assert plan_layout_pages(0, 0, PATTERNS, budget_seconds=10) == ([], 'optimal')
+
+
+def test_exhausted_budget_falls_back_to_approximate_plan():
+    plan, method = plan_layout_pages(40, 25, PATTERNS, budget_seconds=0)
+
+    assert method == 'approximate'
+    assert_covers(plan, 40, 25)
+    assert len(plan) >= minimum_pages(40, 25)
+
+
+def test_custom_paper_templates_do_not_touch_packing_memo_stats():
+    paper = app.resolve_paper_profile('custom', 20.0, 25.0)
+    bin_width, bin_height = paper.size_px('landscape', 150)
+    before = app.packing_memo.stats()
+
+    first = app.get_layout_templates(bin_width, bin_height, 150)
+    second = app.get_layout_templates(bin_width, bin_height, 150)
+
+    assert first is not None and first is second
+    assert app.layout_template_cache.get((bin_width, bin_height, 0.2, 150)) is first
+    after = app.packing_memo.stats()
+    assert (after['hits'], after['misses'], after['entries']) == (before['hits'], before['misses'], before['entries'])
@@ -0,0 +1,126 @@
+"""배치 레코드 저장소 (user-005)"""
+import io
+import threading
+
+import pytest
+from PIL import Image
+
+import app
+
+
+@pytest.fixture
+def sqlite_store(tmp_path, monkeypatch):
+    store = app.SQLiteLayoutStore(str(tmp_path / 'layouts.db'), ttl=3600)
+    monkeypatch.setattr(app, 'layout_store', store)
+    return store
+
+
+def jpeg_upload(name, size=(240, 180)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'gray').save(buffer, format='JPEG')
+    buffer.seek(0)
+    return buffer, name
+
+
+def test_compare_and_set_lets_one_worker_claim_a_preview(tmp_path):
+    path = str(tmp_path / 'layouts.db')
+    workers = [app.SQLiteLayoutStore(path, ttl=3600) for _ in range(8)]
+    workers[0].put('job', {'status': 'preview'})
+    barrier = threading.Barrier(len(workers))
+    claimed = []
+
+    def confirm(store):
+        barrier.wait()
+        claimed.append(store.compare_and_set('job', 'preview', {'status': 'running'}))
+
+    threads = [threading.Thread(target=confirm, args=(store,)) for store in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(record is not None for record in claimed) == 1
+    assert workers[0].get('job') == {'status': 'running'}
+
+
+def test_confirming_the_same_preview_twice_renders_once(sqlite_store):
+    client = app.app.test_client()
+    response = client.post('/upload_optimized', data={
+        'construction_files': [jpeg_upload('a.jpg'), jpeg_upload('b.jpg')],
+        'preview': 'true',
+        'output_format': 'jpeg',
+    }, content_type='multipart/form-data')
+    assert response.status_code == 200
+    job_id = response.get_json()['job_id']
+    assert sqlite_store.get(job_id)['status'] == 'preview'
+
+    first = client.post(f'/jobs/{job_id}/confirm')
+    second = client.post(f'/jobs/{job_id}/confirm')
+
+    assert first.status_code == 200
+    assert second.status_code == 409
+    assert second.get_json()['status'] == 'done'
+    assert sqlite_store.get(job_id)['status'] == 'done'
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return app.MemoryLayoutStore(ttl=3600)
+    return app.SQLiteLayoutStore(str(tmp_path / 'layouts.db'), ttl=3600)
+
+
+def test_records_expire_after_their_ttl(store, monkeypatch):
+    now = 1_000_000.0
+    monkeypatch.setattr(app.time, 'time', lambda: now)
+    store.put('short', {'status': 'done'}, ttl=10)
+    store.put('long', {'status': 'done'})
+
+    now += 11
+    assert store.get('short') is None
+    assert store.get('long') == {'status': 'done'}
+    assert store.count() == 1
+    assert store.purge_expired() == 1
+    assert store.count() == 1
+
+
+def test_compare_and_set_only_applies_to_the_expected_status(store):
+    store.put('job', {'status': 'preview', 'stage': 'preview'})
+
+    assert store.compare_and_set('job', 'running', {'status': 'done'}) is None
+    assert store.compare_and_set('missing', 'preview', {'status': 'running'}) is None
+    assert store.compare_and_set('job', 'preview', {'status': 'running'}) == {'status': 'running', 'stage': 'preview'}
+    assert store.get('job') == {'status': 'running', 'stage': 'preview'}
+
+
+def test_compare_and_set_ignores_expired_records(store, monkeypatch):
+    now = 1_000_000.0
+    monkeypatch.setattr(app.time, 'time', lambda: now)
+    store.put('job', {'status': 'preview'}, ttl=10)
+
+    now += 11
+    assert store.compare_and_set('job', 'preview', {'status': 'running'}) is None
+
+
+def test_count_excludes_artifact_and_internal_records(store):
+    store.put('job', {'kind': 'optimized', 'status': 'done'})
+    store.put(app.artifact_key('upload'), {'kind': 'single'})
+    store.put(app.internal_key('janitor_stats'), {'runs': 1})
+
+    assert store.count() == 1
+
+
+@pytest.mark.parametrize('record_id, record', [
+    ('upload', None),
+    ('legacy', {'kind': 'single', 'artifacts': {}}),
+    (app.internal_key('janitor_stats'), {'runs': 1}),
+])
+def test_job_endpoints_only_serve_layout_jobs(sqlite_store, record_id, record):
+    app.register_artifacts('upload', {'kind': 'single'}, {})
+    if record is not None:
+        sqlite_store.put(record_id, record)
+    client = app.app.test_client()
+
+    assert client.get(f'/jobs/{record_id}').status_code == 404
+    assert client.get(f'/jobs/{record_id}/pages').status_code == 404
+    assert client.post(f'/jobs/{record_id}/confirm').status_code == 404
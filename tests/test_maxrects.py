@@ -0,0 +1,64 @@
+"""MaxRects 빈패킹 (user-011)"""
+import pytest
+
+import app
+from app import BinPacker, CONSTRUCTION_CM, DOCUMENT_CM, MaxRectsPacker, Photo
+
+A4_LANDSCAPE = app.PAPER_PROFILES['A4'].size_px('landscape')
+
+
+def make_photos(construction, document):
+    return ([Photo(i, *CONSTRUCTION_CM, 'construction') for i in range(construction)] +
+            [Photo(100 + i, *DOCUMENT_CM, 'document') for i in range(document)])
+
+
+def occupied(packer, photo):
+    """배치된 사진이 차지하는 영역 (여백 포함, x0, y0, x1, y1)"""
+    width, height = packer.photo_size_px(photo)
+    if photo.rotated:
+        width, height = height, width
+    return (photo.placed_x, photo.placed_y,
+            photo.placed_x + width + packer.margin_px, photo.placed_y + height + packer.margin_px)
+
+
+@pytest.mark.parametrize('heuristic', MaxRectsPacker.HEURISTICS)
+@pytest.mark.parametrize('construction, document', [(6, 0), (0, 3), (3, 2), (4, 1), (12, 7)])
+def test_placements_stay_inside_bin_without_overlap(heuristic, construction, document):
+    packer = MaxRectsPacker(*A4_LANDSCAPE, margin_cm=0.2, heuristic=heuristic)
+    placed_count, placed = packer.pack_photos(make_photos(construction, document))
+
+    assert placed_count == len(placed) > 0
+    boxes = [occupied(packer, photo) for photo in placed]
+    for x0, y0, x1, y1 in boxes:
+        assert 0 <= x0 and 0 <= y0 and x1 <= A4_LANDSCAPE[0] and y1 <= A4_LANDSCAPE[1]
+    for i, a in enumerate(boxes):
+        for b in boxes[i + 1:]:
+            assert a[2] <= b[0] or b[2] <= a[0] or a[3] <= b[1] or b[3] <= a[1]
+
+
+def test_fits_more_construction_photos_than_guillotine():
+    maxrects_count, _ = MaxRectsPacker(*A4_LANDSCAPE, heuristic='bssf').pack_photos(make_photos(6, 0))
+    guillotine_count, _ = BinPacker(*A4_LANDSCAPE).pack_photos(make_photos(6, 0))
+
+    assert maxrects_count == 5
+    assert guillotine_count == 4
+
+
+def test_rotates_photo_that_only_fits_sideways():
+    packer = MaxRectsPacker(1400, 1100)
+    placed_count, placed = packer.pack_photos(make_photos(1, 0))
+
+    assert placed_count == 1
+    assert placed[0].rotated
+
+
+def test_photo_too_large_for_bin_is_not_placed():
+    placed_count, placed = MaxRectsPacker(500, 500).pack_photos(make_photos(1, 1))
+
+    assert placed_count == 0
+    assert placed == []
+
+
+def test_unknown_heuristic_is_rejected():
+    with pytest.raises(ValueError):
+        MaxRectsPacker(*A4_LANDSCAPE, heuristic='worst')
@@ -0,0 +1,55 @@
+"""워커별 계측 스냅샷 합산 (user-020)"""
+import os
+import time
+
+import app
+
+
+def test_stale_worker_snapshots_are_retired_without_losing_totals(tmp_path):
+    old_worker = app.Metrics(str(tmp_path), flush_interval=2, stale_seconds=60)
+    old_worker.inc('printlh_pages_total', 3)
+    old_worker.flush()
+    stale = time.time() - 120
+    os.utime(old_worker._path, (stale, stale))
+    time.sleep(0.01)
+
+    worker = app.Metrics(str(tmp_path), flush_interval=2, stale_seconds=60)
+    worker.inc('printlh_pages_total', 2)
+    counters, _ = worker.collect()
+
+    assert counters[('printlh_pages_total', ())] == 5
+    assert not os.path.exists(old_worker._path)
+    assert sorted(os.listdir(tmp_path)) == sorted(['retired.json', 'retired.lock', os.path.basename(worker._path)])
+    # 다시 합산해도 종료된 워커의 값을 두 번 더하지 않음
+    assert worker.collect()[0][('printlh_pages_total', ())] == 5
+
+
+def test_snapshot_names_differ_between_boots_with_the_same_pid(tmp_path):
+    first = app.Metrics(str(tmp_path), flush_interval=2)
+    time.sleep(0.01)
+    second = app.Metrics(str(tmp_path), flush_interval=2)
+
+    assert first._path != second._path
+
+
+def test_janitor_evictions_are_exported_as_counters(tmp_path, monkeypatch):
+    worker = app.Metrics(str(tmp_path / 'metrics'), flush_interval=2)
+    monkeypatch.setattr(app, 'metrics', worker)
+    monkeypatch.setattr(app, 'blob_store', app.BlobStore(str(tmp_path / 'blobs')))
+    monkeypatch.setattr(app, 'layout_store', app.MemoryLayoutStore(ttl=3600))
+    folder = tmp_path / 'uploads'
+    folder.mkdir()
+    for age, name in [(0, 'new.jpg'), (60, 'older.jpg'), (2 * 3600, 'expired.jpg')]:
+        (folder / name).write_bytes(b'x' * 100)
+        mtime = time.time() - age
+        os.utime(folder / name, (mtime, mtime))
+    janitor = app.ArtifactJanitor([str(folder)], max_age_seconds=3600, max_bytes=150, interval=60,
+                                  lock_path=str(tmp_path / 'janitor.lock'))
+
+    janitor.run_once()
+    counters, _ = worker.collect()
+
+    assert counters[('printlh_janitor_evicted_total', (('reason', 'age'),))] == 1
+    assert counters[('printlh_janitor_evicted_total', (('reason', 'quota'),))] == 1
+    assert counters[('printlh_janitor_bytes_reclaimed_total', ())] == 200
+    assert 'printlh_janitor_bytes_reclaimed_total 200' in worker.render()
@@ -0,0 +1,66 @@
+"""페이지 인코더와 출력 옵션 (user-019)"""
+import pytest
+from PIL import Image
+
+import app
+
+A4 = app.PAPER_PROFILES['A4']
+
+
+@pytest.mark.parametrize('output_format, encoder', [
+    ('png', app.PngPageEncoder),
+    ('jpeg', app.JpegPageEncoder),
+    ('pdf', app.PdfPageEncoder),
+])
+def test_registry_maps_formats_to_encoders(output_format, encoder):
+    assert app.PAGE_ENCODERS[output_format] is encoder
+
+
+def test_webp_is_registered_only_when_pillow_supports_it():
+    assert ('webp' in app.PAGE_ENCODERS) == app.features.check('webp')
+
+
+@pytest.mark.parametrize('form, expected', [
+    ({}, ('png', None)),
+    ({'output_format': 'JPG'}, ('jpeg', None)),
+    ({'output_format': 'jpeg', 'quality': '75'}, ('jpeg', 75)),
+    ({'output_format': 'pdf'}, ('pdf', None)),
+])
+def test_read_output_options(form, expected):
+    assert app.read_output_options(form, A4, 300) == expected
+
+
+@pytest.mark.parametrize('form, message', [
+    ({'output_format': 'gif'}, '지원하지 않는 출력 형식'),
+    ({'quality': 'high'}, 'quality는 정수'),
+    ({'quality': '0'}, 'quality는 1~100'),
+    ({'quality': '101'}, 'quality는 1~100'),
+])
+def test_read_output_options_rejects_bad_values(form, message):
+    with pytest.raises(ValueError, match=message):
+        app.read_output_options(form, A4, 300)
+
+
+def test_formats_reject_pages_over_their_max_side():
+    # 120cm 한 변은 600 DPI에서 28346픽셀 - WebP 한도(16383) 초과, JPEG 한도(65500) 이내
+    paper = app.resolve_paper_profile('custom', 50, 120)
+    assert app.read_output_options({'output_format': 'jpeg'}, paper, 600) == ('jpeg', None)
+    if 'webp' in app.PAGE_ENCODERS:
+        with pytest.raises(ValueError, match='16383픽셀'):
+            app.read_output_options({'output_format': 'webp'}, paper, 600)
+
+
+def test_encoder_writes_pages_and_records_stats(tmp_path):
+    encoder = app.JpegPageEncoder(str(tmp_path), 'layout', dpi=72, quality=80)
+    page = Image.new('RGB', (200, 100), 'white')
+
+    filename = encoder.add_page(page, 1)
+    encoder.close()
+
+    assert filename == 'layout_page_1.jpg'
+    with Image.open(tmp_path / filename) as saved:
+        assert (saved.format, saved.size) == ('JPEG', (200, 100))
+    stats = encoder.stats()
+    assert (stats['format'], stats['quality']) == ('jpg', 80)
+    assert stats['total_bytes'] == (tmp_path / filename).stat().st_size
+    assert [entry['page'] for entry in stats['pages']] == [1]
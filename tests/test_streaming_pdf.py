@@ -0,0 +1,101 @@
+"""스트리밍 다중 페이지 PDF (user-008)"""
+import io
+import re
+
+import pytest
+from PIL import Image
+
+import app
+
+
+def write_pdf(path, sizes, dpi=150):
+    with app.StreamingPdfWriter(str(path), dpi=dpi) as writer:
+        for size in sizes:
+            page = Image.new('RGB', size, 'white')
+            writer.add_page(page)
+            page.close()
+    return path.read_bytes()
+
+
+def xref_entries(data):
+    startxref = int(re.search(rb'startxref\n(\d+)\n%%EOF\n$', data).group(1))
+    assert data[startxref:].startswith(b'xref\n')
+    header, *lines = data[startxref:].split(b'trailer')[0].splitlines()[1:]
+    first, count = map(int, header.split())
+    assert first == 0
+    assert len(lines) == count
+    return [int(line.split()[0]) for line in lines[1:]]
+
+
+def test_xref_offsets_point_at_their_objects(tmp_path):
+    data = write_pdf(tmp_path / 'out.pdf', [(300, 200), (200, 300)])
+
+    offsets = xref_entries(data)
+    for obj_id, offset in enumerate(offsets, 1):
+        assert data[offset:].startswith(f'{obj_id} 0 obj\n'.encode())
+
+
+def test_object_count_matches_pages(tmp_path):
+    pages = 3
+    data = write_pdf(tmp_path / 'out.pdf', [(300, 200)] * pages)
+
+    # 카탈로그, 페이지 트리 + 페이지마다 이미지, 길이, 내용, 페이지 객체
+    objects = 2 + 4 * pages
+    assert len(xref_entries(data)) == objects
+    assert f'/Size {objects + 1} '.encode() in data
+    assert f'/Count {pages} '.encode() in data
+    assert len(re.findall(rb'/Type /Page ', data)) == pages
+
+
+def test_image_streams_are_the_recorded_length_of_jpeg(tmp_path):
+    data = write_pdf(tmp_path / 'out.pdf', [(320, 240)], dpi=72)
+
+    length_id = int(re.search(rb'/Length (\d+) 0 R >>\nstream\n', data).group(1))
+    length = int(re.search(rf'\n{length_id} 0 obj\n(\d+)\nendobj'.encode(), data).group(1))
+    stream_start = data.index(b'stream\n') + len(b'stream\n')
+    assert data[stream_start + length:].startswith(b'\nendstream')
+    with Image.open(io.BytesIO(data[stream_start:stream_start + length])) as image:
+        assert (image.format, image.size) == ('JPEG', (320, 240))
+    assert b'/MediaBox [0 0 320.00 240.00]' in data
+
+
+def failing_page(size=(300, 200)):
+    page = Image.new('RGB', size, 'white')
+
+    def save(*args, **kwargs):
+        raise MemoryError
+    page.save = save
+    return page
+
+
+def test_failed_page_removes_the_partial_pdf(tmp_path):
+    path = tmp_path / 'out.pdf'
+
+    with pytest.raises(MemoryError):
+        with app.StreamingPdfWriter(str(path)) as writer:
+            writer.add_page(Image.new('RGB', (300, 200), 'white'))
+            writer.add_page(failing_page())
+
+    assert not path.exists()
+
+
+def test_close_after_a_failed_page_does_not_write_a_broken_xref(tmp_path):
+    path = tmp_path / 'out.pdf'
+    writer = app.StreamingPdfWriter(str(path))
+    with pytest.raises(MemoryError):
+        writer.add_page(failing_page())
+
+    with pytest.raises(app.LayoutError):
+        writer.close()
+    assert not path.exists()
+
+
+def test_layout_failure_surfaces_the_original_error(tmp_path, monkeypatch):
+    monkeypatch.setitem(app.app.config, 'OUTPUTS_FOLDER', str(tmp_path))
+    monkeypatch.setattr(app.StreamingPdfWriter, '_add_page', failing_page().save)
+    photo = io.BytesIO()
+    Image.new('RGB', (240, 180), 'gray').save(photo, format='JPEG')
+
+    with pytest.raises(MemoryError):
+        app.run_optimized_layout('job', [photo.getvalue()] * 2, [], 'landscape', output_format='pdf')
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,14 @@
+"""타일 렌더링 프로세스 풀 (user-003)"""
+from concurrent.futures import ProcessPoolExecutor
+
+import app
+
+
+def test_pool_children_skip_startup_work():
+    with ProcessPoolExecutor(max_workers=1, mp_context=app.tile_process_context()) as executor:
+        child_state = executor.submit(eval, "[getattr(__import__('app'), name) for name in "
+                                            "('TILE_POOL_CHILD', 'layout_store', 'admission', "
+                                            "'layout_templates', 'tile_slots')]").result()
+
+    assert child_state == [True, None, None, None, None]
+    assert not app.TILE_POOL_CHILD
@@ -0,0 +1,39 @@
+"""업로드 원본 저장과 배치 (user-025)"""
+import io
+import os
+
+from PIL import Image
+
+import app
+
+
+def jpeg_bytes(size=(240, 180), color='gray'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def test_duplicate_uploads_share_a_blob_but_not_a_decoded_image(monkeypatch):
+    opened = []
+    original_open = Image.open
+
+    def recording_open(*args, **kwargs):
+        image = original_open(*args, **kwargs)
+        opened.append(image)
+        return image
+
+    monkeypatch.setattr(app.Image, 'open', recording_open)
+    data = jpeg_bytes(color='teal')
+    response = app.app.test_client().post('/upload_multiple', data={
+        'files': [(io.BytesIO(data), f'same_{i}.jpg') for i in range(3)],
+        'photo_type': 'construction',
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    assert response.get_json()['file_count'] == 3
+    record = app.get_artifact_record(response.get_json()['file_id'])
+    assert len(set(record['original_sha256'])) == 1
+    assert os.path.exists(app.blob_store.blob_path(record['original_sha256'][0]))
+    placements = [image for image in opened if getattr(image, 'filename', '').endswith('_original.jpg')]
+    assert len(placements) == 3
+    assert all(image.fp is None for image in placements)